@@ -0,0 +1,104 @@
+"""
+Memoized CBAC decisions.
+
+The currently and soon-to-be valid CBAC entries of a user are loaded in one query and kept in the
+Django cache until a CBACEntry of that user changes (see the signal handlers in models/cbac_entry.py).
+Decisions are evaluated in Python and memoized for the duration of the request by
+access.middleware.CBACCacheMiddleware, keyed by the frozen claims.
+"""
+
+from contextvars import ContextVar
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.core.cache import cache
+from django.utils.timezone import now
+
+from .models.cbac_entry import CBACEntry, Claims
+
+CBAC_CACHE_TIMEOUT_SECONDS = 5 * 60
+
+
+class CachedCBACEntry(NamedTuple):
+    mode: str
+    claims: Claims
+    valid_from: datetime
+    valid_until: datetime
+
+    def is_valid_at(self, t: datetime) -> bool:
+        return self.valid_from <= t < self.valid_until
+
+    def is_contained_by(self, claims: Claims) -> bool:
+        """
+        Python equivalent of claims__contained_by: every claim of the entry must be present in claims.
+        """
+        return all(claims.get(key) == value for key, value in self.claims.items())
+
+
+class UserDecisions:
+    def __init__(self, entries: list[CachedCBACEntry]):
+        self.entries = entries
+        self.decisions: dict[frozenset[tuple[str, str]], bool] = {}
+
+    def is_allowed(self, claims: Claims, t: datetime) -> bool:
+        key = frozenset(claims.items())
+
+        allowed = self.decisions.get(key)
+        if allowed is None:
+            modes = {entry.mode for entry in self.entries if entry.is_valid_at(t) and entry.is_contained_by(claims)}
+            allowed = "+" in modes and "-" not in modes
+            self.decisions[key] = allowed
+
+        return allowed
+
+
+# user id -> UserDecisions, set for the duration of a request by CBACCacheMiddleware
+request_decisions: ContextVar[Optional[dict[int, UserDecisions]]] = ContextVar("cbac_request_decisions", default=None)
+
+
+def get_cache_key(user_id: int) -> str:
+    return f"access.cbac:entries:{user_id}"
+
+
+def load_entries(user_id: int) -> list[CachedCBACEntry]:
+    cache_key = get_cache_key(user_id)
+    entries = cache.get(cache_key)
+
+    if entries is None:
+        # Entries that become valid later are included as well; validity is checked at decision time
+        entries = [
+            CachedCBACEntry(mode, claims, valid_from, valid_until)
+            for mode, claims, valid_from, valid_until in CBACEntry.objects.filter(
+                user_id=user_id,
+                mode__in=["+", "-"],
+                valid_until__gt=now(),
+            ).values_list("mode", "claims", "valid_from", "valid_until")
+        ]
+        cache.set(cache_key, entries, CBAC_CACHE_TIMEOUT_SECONDS)
+
+    return entries
+
+
+def get_user_decisions(user_id: int) -> UserDecisions:
+    decisions_by_user = request_decisions.get()
+
+    if decisions_by_user is not None and (user_decisions := decisions_by_user.get(user_id)) is not None:
+        return user_decisions
+
+    user_decisions = UserDecisions(load_entries(user_id))
+
+    if decisions_by_user is not None:
+        decisions_by_user[user_id] = user_decisions
+
+    return user_decisions
+
+
+def is_allowed(user_id: int, claims: Claims) -> bool:
+    return get_user_decisions(user_id).is_allowed(claims, now())
+
+
+def invalidate(user_id: int):
+    cache.delete(get_cache_key(user_id))
+
+    if (decisions_by_user := request_decisions.get()) is not None:
+        decisions_by_user.pop(user_id, None)
@@ -16,6 +16,7 @@ registry.register(
 registry.register(
     name="access.cbac.denied",
     message=_("{entry.created_by} was denied permission by CBAC: {entry.cbac_claims}"),
+    retention_days=180,
 )
 
 registry.register(
@@ -0,0 +1,17 @@
+from .cbac_cache import request_decisions
+
+
+class CBACCacheMiddleware:
+    """
+    Memoizes CBAC decisions for the duration of the request. See access.cbac_cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_decisions.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            request_decisions.reset(token)
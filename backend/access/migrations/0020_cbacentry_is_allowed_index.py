@@ -0,0 +1,22 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("access", "0019_auto_20211013_1702"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cbacentry",
+            index=models.Index(
+                fields=["user", "valid_until"],
+                include=("valid_from", "mode", "claims"),
+                name="access_cbacentry_is_allowed",
+            ),
+        ),
+    ]
@@ -4,8 +4,11 @@ from typing import Any, Optional
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.aggregates import BoolOr
 from django.contrib.postgres.fields import HStoreField
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 
 from core.utils import get_objects_within_period, log_get_or_create
@@ -46,6 +49,15 @@ class CBACEntry(models.Model):
 
     class Meta:
         index_together = [("user", "mode", "valid_until")]
+        indexes = [
+            # Covers is_allowed so that it can be answered with an index-only scan.
+            # NOTE: GIN hstore_ops cannot serve claims__contained_by (<@), hence a covering B-tree.
+            models.Index(
+                fields=["user", "valid_until"],
+                include=["valid_from", "mode", "claims"],
+                name="access_cbacentry_is_allowed",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.valid_from:
@@ -91,8 +103,22 @@ class CBACEntry(models.Model):
 
     @classmethod
     def is_allowed(cls, user: AbstractUser, claims: Claims, t: Optional[datetime] = None):
-        entries = cls.get_entries(user, claims, t=t)
-        return bool(entries.filter(mode="+").exists()) and not entries.filter(mode="-").exists()
+        """
+        Decisions at the current time are served from access.cbac_cache.
+        Pass t to query the database directly.
+        """
+        if t is None and user.is_authenticated:
+            from ..cbac_cache import is_allowed
+
+            return is_allowed(user.id, claims)
+
+        result = cls.get_entries(user, claims, t=t).aggregate(
+            any_allow=BoolOr(models.ExpressionWrapper(models.Q(mode="+"), output_field=models.BooleanField())),
+            any_deny=BoolOr(models.ExpressionWrapper(models.Q(mode="-"), output_field=models.BooleanField())),
+        )
+
+        # bool_or over no rows is NULL
+        return bool(result["any_allow"]) and not result["any_deny"]
 
     @classmethod
     def ensure_admin_group_privileges(cls, t: Optional[datetime] = None):
@@ -175,3 +201,12 @@ class CBACEntry(models.Model):
             )
 
         expired_entries.delete()
+
+
+@receiver([post_save, post_delete], sender=CBACEntry)
+def cbac_entry_invalidate_cache(sender, instance: CBACEntry, **kwargs):
+    from ..cbac_cache import invalidate
+
+    # invalidating before commit would let a concurrent request cache the old entries again
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate(user_id))
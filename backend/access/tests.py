@@ -1,11 +1,15 @@
+from datetime import timedelta
 from unittest import TestCase as NonDatabaseTestCase
 
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils.timezone import now
 
 from core.models import Person
 from core.models.event import Event
 from labour.models import LabourEventMeta
 
+from .cbac_cache import request_decisions
 from .email_aliases import firstname_surname
 from .models import CBACEntry, Claims, EmailAlias, EmailAliasType, GroupEmailAliasGrant
 from .utils import emailify
@@ -105,3 +109,78 @@ def test_ensure_admin_group_privileges(db):
 
     assert not CBACEntry.is_allowed(person.user, get_claims(event, "labour"))
     assert not CBACEntry.is_allowed(person.user, get_claims(event, "programme"))
+
+
+def test_cbac_decision_cache(db, django_assert_num_queries, django_capture_on_commit_callbacks):
+    """
+    Given a person with labour admin privileges
+    When their privileges are checked many times during a request
+    Then their CBAC entries are only loaded once
+    And a change to their CBAC entries is reflected as soon as it is committed
+    """
+    meta, unused = LabourEventMeta.get_or_create_dummy()
+    event = meta.event
+    person, unused = Person.get_or_create_dummy()
+
+    meta.admin_group.user_set.add(person.user)
+    CBACEntry.ensure_admin_group_privileges_for_event(event)
+
+    token = request_decisions.set({})
+    try:
+        with django_assert_num_queries(1):
+            for _ in range(10):
+                assert CBACEntry.is_allowed(person.user, get_claims(event, "labour"))
+                assert not CBACEntry.is_allowed(person.user, get_claims(event, "programme"))
+
+        with django_capture_on_commit_callbacks(execute=True):
+            meta.admin_group.user_set.remove(person.user)
+            CBACEntry.ensure_admin_group_privileges_for_event(event)
+
+        assert not CBACEntry.is_allowed(person.user, get_claims(event, "labour"))
+    finally:
+        request_decisions.reset(token)
+
+
+def test_cbac_is_allowed_benchmark(db, django_assert_num_queries):
+    """
+    Given 10 000 CBAC entries spread across 500 users
+    When allow, deny and no-match decisions are queried from the database
+    Then each decision takes a single query
+    """
+    num_users = 500
+    entries_per_user = 20
+    t = now()
+
+    users = User.objects.bulk_create(User(username=f"cbac_benchmark_{i}") for i in range(num_users))
+    CBACEntry.objects.bulk_create(
+        CBACEntry(
+            user=user,
+            mode="+",
+            valid_from=t - timedelta(days=1),
+            valid_until=t + timedelta(days=1),
+            claims={"organization": f"org{i}", "app": "labour"},
+        )
+        for user in users
+        for i in range(entries_per_user - 1)
+    )
+    CBACEntry.objects.bulk_create(
+        CBACEntry(
+            user=user,
+            mode="-",
+            valid_from=t - timedelta(days=1),
+            valid_until=t + timedelta(days=1),
+            claims={"organization": "org0", "event": "denied"},
+        )
+        for user in users
+    )
+
+    user = users[0]
+    cases = [
+        ({"organization": "org0", "app": "labour", "event": "allowed"}, True),  # allow
+        ({"organization": "org0", "app": "labour", "event": "denied"}, False),  # deny
+        ({"organization": "nonexistent", "app": "labour", "event": "allowed"}, False),  # no match
+    ]
+
+    for claims, expected in cases:
+        with django_assert_num_queries(1):
+            assert CBACEntry.is_allowed(user, claims, t=t) == expected
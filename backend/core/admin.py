@@ -14,7 +14,7 @@ from payments.admin import InlinePaymentsOrganizationMetaAdmin
 from programme.admin import InlineProgrammeEventMetaAdmin
 from tickets.admin import InlineTicketsEventMetaAdmin
 
-from .models import CarouselSlide, Event, Organization, Person, Venue
+from .models import CarouselSlide, Event, ExportJob, Organization, Person, Venue
 
 
 class OrganizationAdmin(admin.ModelAdmin):
@@ -100,6 +100,13 @@ class EventAdmin(admin.ModelAdmin):
         return self.readonly_fields
 
 
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("filename", "event", "requested_by", "state", "rows_done", "rows_total", "created_at", "expires_at")
+    list_filter = ("state", "event")
+    ordering = ("-created_at",)
+    readonly_fields = ("dedup_key", "parameters")
+
+
 # http://stackoverflow.com/a/19932127
 class GroupForm(forms.ModelForm):
     users = forms.ModelMultipleChoiceField(
@@ -139,6 +146,7 @@ admin.site.register(Event, EventAdmin)
 admin.site.register(Person, PersonAdmin)
 admin.site.register(Venue)
 admin.site.register(CarouselSlide)
+admin.site.register(ExportJob, ExportJobAdmin)
 
 
 # override GroupAdmin for users of group support in admin
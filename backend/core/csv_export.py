@@ -1,11 +1,19 @@
-from collections import namedtuple
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from itertools import islice
 
 import unicodecsv as csv
+from django.apps import apps
 from django.db import models
-from django.http import HttpResponse
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, StreamingHttpResponse
 
 ENCODING = "ISO-8859-15"
 
+# How many rows to fetch per round trip when iterating querysets with a server-side cursor
+EXPORT_CHUNK_SIZE = 500
+
 
 ExportFormat = namedtuple(
     "ExportFormat",
@@ -32,6 +40,10 @@ CSV_EXPORT_FORMATS = dict(
 
 
 class CsvExportMixin:
+    # Applied to the exported queryset so that get_csv_related does not hit the database once per row
+    csv_select_related: tuple[str, ...] = ()
+    csv_prefetch_related: tuple[str, ...] = ()
+
     @classmethod
     def get_csv_fields(cls, event):
         fields = []
@@ -44,6 +56,14 @@ class CsvExportMixin:
 
         return fields
 
+    @classmethod
+    def prepare_csv_related(cls, event, model_instances):
+        """
+        Called with each chunk of exported instances before get_csv_related. Override to fetch for the whole
+        chunk at once what get_csv_related would otherwise look up once per row.
+        """
+        pass
+
     def get_csv_related(self):
         return dict()
 
@@ -65,7 +85,7 @@ class CsvExportMixin:
             if field_type == models.ManyToManyField:
                 if m2m_mode == "separate_columns":
                     choices = get_m2m_choices(event, field)
-                    header_row.extend(f"{field_name}: {choice.__str__()}" for choice in choices)
+                    header_row.extend(f"{field_name}: {choice.label}" for choice in choices)
                 elif m2m_mode == "comma_separated":
                     header_row.append(field_name)
                 else:
@@ -75,9 +95,15 @@ class CsvExportMixin:
 
         return header_row
 
-    def get_csv_row(self, event, fields, m2m_mode="separate_columns"):
+    def get_csv_row(self, event, fields, m2m_mode="separate_columns", related=None, m2m_index=None):
+        """
+        If m2m_index (see build_m2m_index) is given, it is used to fill in separate_columns
+        instead of querying the through table once per choice.
+        """
         result_row = []
-        related = self.get_csv_related()
+
+        if related is None:
+            related = self.get_csv_related()
 
         for model, field in fields:
             if isinstance(field, str):
@@ -98,7 +124,12 @@ class CsvExportMixin:
                 if m2m_mode == "separate_columns":
                     choices = get_m2m_choices(event, field)
 
-                    result_row.extend(field_value.filter(pk=choice.pk).exists() for choice in choices)
+                    if m2m_index is not None:
+                        chosen = m2m_index[model, field_name].get(source_instance.pk, ())
+                    else:
+                        chosen = set(field_value.values_list("pk", flat=True))
+
+                    result_row.extend(choice.pk in chosen for choice in choices)
                 elif m2m_mode == "comma_separated":
                     result_row.append(", ".join(item.__str__() for item in field_value.all()))
                 else:
@@ -117,27 +148,140 @@ class CsvExportMixin:
         return result_row
 
 
-def get_m2m_choices(event, field):
-    target_model = field.related_model
-    cache_key = (event.id, target_model._meta.app_label, target_model._meta.model_name)
+M2MChoice = namedtuple("M2MChoice", ["pk", "label"])
+
+
+class M2MChoicesCache:
+    """
+    A bounded LRU cache of materialized many-to-many choice lists with a TTL.
+
+    Entries for a target model are dropped on post_save/post_delete of that model. The signal
+    handlers are connected lazily on first use. Signals only reach the current process, so other
+    workers will see the change once the TTL has passed.
+    """
 
-    if cache_key not in get_m2m_choices.cache:
+    def __init__(self, max_size=256, ttl_seconds=300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.connected_models = set()
+        self.lock = threading.Lock()
+
+    def get(self, event, target_model):
+        cache_key = (event.id, target_model._meta.label_lower)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                expires_at, choices = entry
+                if expires_at > now:
+                    self.entries.move_to_end(cache_key)
+                    return choices
+
+                del self.entries[cache_key]
+
+        self.connect(target_model)
+        choices = self.load(event, target_model)
+
+        with self.lock:
+            self.entries[cache_key] = (now + self.ttl_seconds, choices)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return choices
+
+    def load(self, event, target_model):
         if any(f.name == "event" for f in target_model._meta.fields):
             choices = target_model.objects.filter(event=event)
         else:
             choices = target_model.objects.all()
 
-        get_m2m_choices.cache[cache_key] = choices.order_by("pk")
+        return [M2MChoice(choice.pk, str(choice)) for choice in choices.order_by("pk")]
+
+    def connect(self, target_model):
+        if target_model in self.connected_models:
+            return
 
-    return get_m2m_choices.cache[cache_key]
+        dispatch_uid = f"core.csv_export.M2MChoicesCache:{id(self)}:{target_model._meta.label_lower}"
+        post_save.connect(self.on_change, sender=target_model, weak=False, dispatch_uid=dispatch_uid)
+        post_delete.connect(self.on_change, sender=target_model, weak=False, dispatch_uid=dispatch_uid)
+        self.connected_models.add(target_model)
 
+    def on_change(self, sender, **kwargs):
+        self.invalidate(sender)
 
-get_m2m_choices.cache = {}
+    def invalidate(self, target_model=None):
+        """
+        Drops the cached choices of target_model, or everything if target_model is None.
+        """
+        with self.lock:
+            if target_model is None:
+                self.entries.clear()
+                return
 
+            label_lower = target_model._meta.label_lower
+            for cache_key in [key for key in self.entries if key[1] == label_lower]:
+                del self.entries[cache_key]
 
-def write_row(event, writer, fields, model_instance, m2m_mode):
-    result_row = model_instance.get_csv_row(event, fields, m2m_mode)
-    writer.writerow(result_row)
+
+m2m_choices_cache = M2MChoicesCache()
+
+
+def get_m2m_choices(event, field) -> list[M2MChoice]:
+    return m2m_choices_cache.get(event, field.related_model)
+
+
+def build_m2m_index(fields, related_by_instance):
+    """
+    For each many-to-many field in fields, fetches the through table rows of all source instances
+    in one query and returns {(model, field_name): {source_pk: set(target_pks)}}.
+
+    related_by_instance is a list of (model_instance, related) pairs where related is the return value
+    of model_instance.get_csv_related().
+    """
+    m2m_index = {}
+
+    for model, field in fields:
+        if isinstance(field, str) or type(field) is not models.ManyToManyField:
+            continue
+
+        source_pks = set()
+        for model_instance, related in related_by_instance:
+            source_instance = related[model] if model in related else model_instance
+            if source_instance is not None and source_instance.pk is not None:
+                source_pks.add(source_instance.pk)
+
+        through = field.remote_field.through
+        source_field_name = field.m2m_field_name()
+        target_field_name = field.m2m_reverse_field_name()
+
+        field_index = defaultdict(set)
+        if source_pks:
+            for source_pk, target_pk in through.objects.filter(**{f"{source_field_name}__in": source_pks}).values_list(
+                source_field_name, target_field_name
+            ):
+                field_index[source_pk].add(target_pk)
+
+        m2m_index[model, field.name] = field_index
+
+    return m2m_index
+
+
+def iter_rows(event, fields, model_instances, m2m_mode, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields get_csv_row for each model instance. Works in chunks of chunk_size instances so that
+    many-to-many columns cost one query per field per chunk instead of one per choice per row.
+    """
+    model_instances = iter(model_instances)
+
+    while chunk := list(islice(model_instances, chunk_size)):
+        chunk[0].prepare_csv_related(event, chunk)
+        related_by_instance = [(model_instance, model_instance.get_csv_related()) for model_instance in chunk]
+        m2m_index = build_m2m_index(fields, related_by_instance) if m2m_mode == "separate_columns" else None
+
+        for model_instance, related in related_by_instance:
+            yield model_instance.get_csv_row(event, fields, m2m_mode, related=related, m2m_index=m2m_index)
 
 
 def make_writer(output_stream, dialect):
@@ -149,27 +293,95 @@ def make_writer(output_stream, dialect):
         return csv.writer(output_stream, encoding=ENCODING, dialect=dialect, errors="ignore")
 
 
-def export_csv(event, model, model_instances, output_file, m2m_mode="separate_columns", dialect="excel-tab"):
+def get_export_fields(event, model, model_instances):
     # XXX Horrible hack.
     try:
         # EventSurveys force us to get this from an instance instead of the model class because they may differ
-        fields = model_instances[0].get_csv_fields(event)
+        return model_instances[0].get_csv_fields(event)
     except IndexError:
         # empty set, use the old way
-        fields = model.get_csv_fields(event)
-    writer = make_writer(output_file, dialect)
-    writer.writerow(model.get_csv_header(event, fields, m2m_mode))
+        return model.get_csv_fields(event)
+
+
+def iter_model_instances(model, model_instances, chunk_size=None):
+    """
+    Applies the select_related/prefetch_related plan declared on the model. If chunk_size is given
+    and model_instances is a QuerySet, iterate it using a server-side cursor instead of loading
+    the whole result set into memory.
+    """
+    if isinstance(model_instances, models.QuerySet):
+        if select_related := getattr(model, "csv_select_related", ()):
+            model_instances = model_instances.select_related(*select_related)
+        if prefetch_related := getattr(model, "csv_prefetch_related", ()):
+            model_instances = model_instances.prefetch_related(*prefetch_related)
+        if chunk_size is not None:
+            model_instances = model_instances.iterator(chunk_size=chunk_size)
 
     for model_instance in model_instances:
         if isinstance(model_instance, (str, int)):
-            model_instance = model.objects.get(pk=int(model_instances))
+            model_instance = model.objects.get(pk=int(model_instance))
+
+        yield model_instance
 
-        write_row(event, writer, fields, model_instance, m2m_mode)
+
+def export_csv(event, model, model_instances, output_file, m2m_mode="separate_columns", dialect="excel-tab"):
+    fields = get_export_fields(event, model, model_instances)
+    writer = make_writer(output_file, dialect)
+    writer.writerow(model.get_csv_header(event, fields, m2m_mode))
+
+    for result_row in iter_rows(event, fields, iter_model_instances(model, model_instances), m2m_mode):
+        writer.writerow(result_row)
 
     if getattr(writer, "must_close", False):
         writer.close()
 
 
+class Echo:
+    """
+    A file-like object that hands back whatever is written to it so that csv.writer.writerow
+    returns the encoded row instead of buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_export(
+    event,
+    model,
+    model_instances,
+    m2m_mode="separate_columns",
+    dialect="excel-tab",
+    chunk_size=EXPORT_CHUNK_SIZE,
+):
+    """
+    Generator version of export_csv. Yields the export as chunks of bytes while iterating model_instances
+    with a server-side cursor, so memory use does not grow with the number of rows.
+
+    For XLSX, the workbook is written in xlsxwriter's constant_memory mode into a temporary file
+    which is then streamed out.
+    """
+    fields = get_export_fields(event, model, model_instances)
+    header_row = model.get_csv_header(event, fields, m2m_mode)
+    instances = iter_model_instances(model, model_instances, chunk_size=chunk_size)
+
+    if dialect == "xlsx":
+        from .excel_export import StreamingXlsxWriter
+
+        writer = StreamingXlsxWriter()
+        writer.writerow(header_row)
+        for result_row in iter_rows(event, fields, instances, m2m_mode, chunk_size):
+            writer.writerow(result_row)
+        writer.close()
+
+        yield from writer.iter_chunks()
+    else:
+        writer = csv.writer(Echo(), encoding=ENCODING, dialect=dialect, errors="ignore")
+        yield writer.writerow(header_row)
+        for result_row in iter_rows(event, fields, instances, m2m_mode, chunk_size):
+            yield writer.writerow(result_row)
+
+
 CONTENT_TYPES = dict(
     xlsx="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 )
@@ -187,3 +399,81 @@ def csv_response(*args, **kwargs):
     export_csv(*args, **kwargs)
 
     return response
+
+
+ExportSource = namedtuple(
+    "ExportSource",
+    [
+        "header_row",
+        "rows",
+        "rows_total",  # None if not known in advance
+    ],
+)
+
+
+def iter_model_instances_by_pk(model, pks, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the instances of model with the given primary keys in the order given.
+    """
+    queryset = model.objects.all()
+    if select_related := getattr(model, "csv_select_related", ()):
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related := getattr(model, "csv_prefetch_related", ()):
+        queryset = queryset.prefetch_related(*prefetch_related)
+
+    for i in range(0, len(pks), chunk_size):
+        chunk = pks[i : i + chunk_size]
+        instances = queryset.in_bulk(chunk)
+        yield from (instances[pk] for pk in chunk if pk in instances)
+
+
+def get_model_export_parameters(model, model_instances, m2m_mode="separate_columns"):
+    """
+    Snapshots a CsvExportMixin export for export_model_instances (see core.models.ExportJob).
+    """
+    if isinstance(model_instances, models.QuerySet):
+        pks = list(model_instances.values_list("pk", flat=True))
+    else:
+        pks = [model_instance.pk for model_instance in model_instances]
+
+    return dict(
+        model=model._meta.label_lower,
+        pks=pks,
+        m2m_mode=m2m_mode,
+    )
+
+
+def export_model_instances(event, parameters) -> ExportSource:
+    """
+    Exporter for ExportJob. Parameters come from get_model_export_parameters.
+    """
+    model = apps.get_model(parameters["model"])
+    pks = parameters["pks"]
+    m2m_mode = parameters.get("m2m_mode", "separate_columns")
+
+    model_instances = iter_model_instances_by_pk(model, pks)
+    first_instance = next(iter_model_instances_by_pk(model, pks[:1]), None)
+    fields = (first_instance or model).get_csv_fields(event)
+
+    return ExportSource(
+        header_row=model.get_csv_header(event, fields, m2m_mode),
+        rows=iter_rows(event, fields, model_instances, m2m_mode),
+        rows_total=len(pks),
+    )
+
+
+def streaming_csv_response(*args, **kwargs):
+    """
+    Like csv_response, but streams the export instead of building it in memory first.
+    Use this for exports that may grow large (signups, ticket sales etc.)
+    """
+    filename = kwargs.pop("filename")
+    dialect = kwargs.get("dialect", "excel")
+
+    response = StreamingHttpResponse(
+        iter_export(*args, **kwargs),
+        content_type=CONTENT_TYPES.get(dialect, "text/csv"),
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    return response
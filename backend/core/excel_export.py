@@ -1,7 +1,10 @@
 import io
+import tempfile
 
 import xlsxwriter
 
+STREAMING_CHUNK_SIZE = 64 * 1024
+
 
 class XlsxWriter:
     """
@@ -37,3 +40,31 @@ class XlsxWriter:
         self.buf.seek(0)
         self.output_stream.write(self.buf.read())
         self.buf.close()
+
+
+class StreamingXlsxWriter(XlsxWriter):
+    """
+    XlsxWriter in constant_memory mode. Each row is flushed to disk once the next one is started,
+    so memory use stays flat regardless of row count. Rows must be written in order.
+
+    The workbook is assembled into output_stream, by default an anonymous temporary file. After .close(),
+    use .iter_chunks() to read it back in STREAMING_CHUNK_SIZE pieces; output_stream is closed when exhausted.
+    """
+
+    def __init__(self, output_stream=None):
+        self.row = 0
+        self.output_stream = output_stream if output_stream is not None else tempfile.TemporaryFile(suffix=".xlsx")
+        self.workbook = xlsxwriter.Workbook(self.output_stream, {"constant_memory": True})
+        self.worksheet = self.workbook.add_worksheet()
+        self.must_close = True
+
+    def close(self):
+        self.workbook.close()
+        self.output_stream.seek(0)
+
+    def iter_chunks(self, chunk_size=STREAMING_CHUNK_SIZE):
+        try:
+            while chunk := self.output_stream.read(chunk_size):
+                yield chunk
+        finally:
+            self.output_stream.close()
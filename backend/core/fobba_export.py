@@ -0,0 +1,94 @@
+from paikkala.models import Ticket
+
+from badges.models import Badge
+from tickets.models import Order
+
+from .csv_export import ExportSource
+
+FOBBA_HEADER_ROW = [
+    "surname",
+    "first_name",
+    "email",
+    "phone_number",
+    "role",
+    "role_extra",
+]
+
+
+def iter_fobba_rows(event):
+    seen = set()
+
+    for badge in Badge.objects.filter(personnel_class__event=event, revoked_at__isnull=True):
+        id_fields = (
+            badge.surname,
+            badge.first_name,
+            badge.person.email if badge.person else "",
+            badge.person.normalized_phone_number if badge.person else "",
+        )
+
+        if id_fields in seen:
+            continue
+
+        seen.add(id_fields)
+        yield [
+            *id_fields,
+            badge.personnel_class_name,
+            badge.job_title,
+        ]
+
+    for order in Order.objects.filter(
+        event=event,
+        confirm_time__isnull=False,
+        payment_date__isnull=False,
+        cancellation_time__isnull=True,
+    ):
+        customer = order.customer
+        assert customer
+
+        id_fields = (
+            customer.last_name,
+            customer.first_name,
+            customer.email,
+            customer.normalized_phone_number,
+        )
+
+        if id_fields in seen:
+            continue
+
+        seen.add(id_fields)
+        yield [
+            *id_fields,
+            "Lipun ostaja",
+            order.formatted_order_products,
+        ]
+
+    for ticket in Ticket.objects.filter(program__kompassi_programme__category__event=event):
+        person = ticket.user.person  # type: ignore
+
+        id_fields = (
+            person.surname,
+            person.first_name,
+            person.email,
+            person.normalized_phone_number,
+        )
+
+        if id_fields in seen:
+            continue
+
+        seen.add(id_fields)
+        yield [
+            *id_fields,
+            "Paikkalipun varaaja",
+            "",
+        ]
+
+
+def export_fobba(event, parameters) -> ExportSource:
+    """
+    Exporter for ExportJob. Lists everyone who has a badge, a ticket or a seat reservation for the event.
+    """
+    return ExportSource(
+        header_row=FOBBA_HEADER_ROW,
+        rows=iter_fobba_rows(event),
+        rows_total=None,
+    )
@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core.models import ExportJob
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Delete export jobs whose artifacts have expired"
+
+    def handle(self, *args, **options):
+        num_deleted = ExportJob.delete_expired()
+        logger.info("Deleted %d expired export jobs", num_deleted)
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    """
+    Only the newest pending or running job of an export is kept active.
+    """
+    ExportJob = apps.get_model("core", "ExportJob")
+
+    seen_dedup_keys = set()
+    for job in ExportJob.objects.filter(state__in=["pending", "running"]).order_by("-created_at"):
+        if job.dedup_key in seen_dedup_keys:
+            ExportJob.objects.filter(id=job.id).update(state="failed", finished_at=django.utils.timezone.now())
+        else:
+            seen_dedup_keys.add(job.dedup_key)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0040_exportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop, elidable=True),
+        migrations.AddConstraint(
+            model_name="exportjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("state__in", ["pending", "running"])),
+                fields=("dedup_key",),
+                name="exportjob_one_active_per_dedup_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, models, transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+logger = logging.getLogger("kompassi")
+
+EXPORT_JOB_ARTIFACT_TTL = timedelta(hours=24)
+
+# A finished export is handed out again for identical requests made within this window
+EXPORT_JOB_DEDUP_WINDOW = timedelta(minutes=10)
+
+# Write progress to the database every this many rows
+EXPORT_JOB_PROGRESS_INTERVAL = 500
+
+# A pending or running job that has not made progress in this long is assumed to have died with its worker
+EXPORT_JOB_STALE_AFTER = timedelta(minutes=30)
+
+
+class ExportJob(models.Model):
+    """
+    A CSV/TSV/XLSX export generated in the background into storage.
+
+    exporter is the dotted path of a function that takes (event, parameters) and returns an
+    core.csv_export.ExportSource. Requesting the same export with the same parameters again
+    returns the existing job while it is pending or running, or if it finished recently.
+    A partial unique constraint allows only one pending or running job per export. Jobs that have
+    made no progress in EXPORT_JOB_STALE_AFTER are failed so that the export can be requested again.
+    """
+
+    class State(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        RUNNING = "running", _("Running")
+        FINISHED = "finished", _("Finished")
+        FAILED = "failed", _("Failed")
+
+    event = models.ForeignKey(
+        "core.Event",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="export_jobs",
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+    )
+
+    exporter = models.CharField(max_length=255)
+    parameters = models.JSONField(default=dict, blank=True)
+    format = models.CharField(max_length=4, default="xlsx")
+    filename = models.CharField(max_length=255)
+    dedup_key = models.CharField(max_length=64)
+
+    state = models.CharField(max_length=8, choices=State.choices, default=State.PENDING)
+    rows_done = models.PositiveIntegerField(default=0)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    artifact = models.FileField(upload_to="export_jobs", blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= now()
+
+    @property
+    def is_done(self):
+        return self.state in (self.State.FINISHED, self.State.FAILED)
+
+    @property
+    def progress_percent(self):
+        if self.state == self.State.FINISHED:
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(100, 100 * self.rows_done // self.rows_total)
+
+    def get_absolute_url(self):
+        return reverse("core_export_job_view", args=(self.id,))
+
+    def get_download_url(self):
+        return reverse("core_export_job_download_view", args=(self.id,))
+
+    def is_visible_to(self, user):
+        return user.is_superuser or self.requested_by_id == user.id
+
+    @staticmethod
+    def get_dedup_key(user, event, exporter, format, parameters):
+        payload = json.dumps(
+            [user.id, event.id if event else None, exporter, format, parameters],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("UTF-8")).hexdigest()
+
+    @classmethod
+    def get_stale_jobs(cls, t=None):
+        if t is None:
+            t = now()
+
+        return cls.objects.filter(
+            state__in=[cls.State.PENDING, cls.State.RUNNING],
+            updated_at__lt=t - EXPORT_JOB_STALE_AFTER,
+        )
+
+    @classmethod
+    def fail_stale_jobs(cls, t=None, **filters) -> int:
+        """
+        Fails pending or running jobs that have made no progress in EXPORT_JOB_STALE_AFTER.
+        """
+        if t is None:
+            t = now()
+
+        return (
+            cls.get_stale_jobs(t)
+            .filter(**filters)
+            .update(
+                state=cls.State.FAILED,
+                finished_at=t,
+                updated_at=t,
+                error="The export job stopped making progress.",
+            )
+        )
+
+    @classmethod
+    def request(cls, user, event, exporter, parameters, filename, format="xlsx"):
+        """
+        Returns an existing job for the same export or creates and enqueues a new one.
+        """
+        dedup_key = cls.get_dedup_key(user, event, exporter, format, parameters)
+        t = now()
+
+        def get_existing_job():
+            return (
+                cls.objects.filter(
+                    models.Q(state__in=[cls.State.PENDING, cls.State.RUNNING])
+                    | models.Q(
+                        state=cls.State.FINISHED,
+                        expires_at__gt=t,
+                        created_at__gt=t - EXPORT_JOB_DEDUP_WINDOW,
+                    ),
+                    dedup_key=dedup_key,
+                )
+                .order_by("-created_at")
+                .first()
+            )
+
+        with transaction.atomic():
+            cls.fail_stale_jobs(t, dedup_key=dedup_key)
+
+            existing_job = get_existing_job()
+            if existing_job:
+                return existing_job
+
+            try:
+                with transaction.atomic():
+                    job = cls.objects.create(
+                        event=event,
+                        requested_by=user,
+                        exporter=exporter,
+                        parameters=parameters,
+                        format=format,
+                        filename=filename,
+                        dedup_key=dedup_key,
+                    )
+            except IntegrityError:
+                # a concurrent request created the job first (exportjob_one_active_per_dedup_key)
+                return get_existing_job()
+
+            transaction.on_commit(job.enqueue)
+
+        return job
+
+    def enqueue(self):
+        if "background_tasks" in settings.INSTALLED_APPS:
+            from ..tasks import run_export_job
+
+            run_export_job.delay(self.pk)
+        else:
+            self.run()
+
+    def run(self):
+        from ..csv_export import CSV_EXPORT_FORMATS, make_writer
+        from ..excel_export import StreamingXlsxWriter
+
+        self.state = self.State.RUNNING
+        self.started_at = now()
+        self.save(update_fields=["state", "started_at", "updated_at"])
+
+        try:
+            exporter = import_string(self.exporter)
+            source = exporter(self.event, self.parameters)
+
+            if source.rows_total is not None:
+                self.rows_total = source.rows_total
+                self.save(update_fields=["rows_total", "updated_at"])
+
+            with tempfile.TemporaryFile() as output_file:
+                dialect = CSV_EXPORT_FORMATS[self.format]
+                if dialect == "xlsx":
+                    writer = StreamingXlsxWriter(output_file)
+                else:
+                    writer = make_writer(output_file, dialect)
+
+                writer.writerow(source.header_row)
+                rows_done = 0
+                for row in source.rows:
+                    writer.writerow(row)
+                    rows_done += 1
+                    if rows_done % EXPORT_JOB_PROGRESS_INTERVAL == 0:
+                        ExportJob.objects.filter(pk=self.pk).update(rows_done=rows_done, updated_at=now())
+
+                if getattr(writer, "must_close", False):
+                    writer.close()
+
+                output_file.seek(0)
+                self.artifact.save(self.filename, File(output_file), save=False)
+
+            t = now()
+            self.rows_done = rows_done
+            self.state = self.State.FINISHED
+            self.finished_at = t
+            self.expires_at = t + EXPORT_JOB_ARTIFACT_TTL
+            self.save()
+        except Exception as e:
+            logger.exception("Export job %s failed", self.pk)
+
+            self.state = self.State.FAILED
+            self.finished_at = now()
+            self.error = str(e)
+            self.save(update_fields=["state", "finished_at", "error", "updated_at"])
+
+    def as_dict(self):
+        return dict(
+            id=self.id,
+            filename=self.filename,
+            state=self.state,
+            rows_done=self.rows_done,
+            rows_total=self.rows_total,
+            progress_percent=self.progress_percent,
+            download_url=self.get_download_url() if self.state == self.State.FINISHED else None,
+            expires_at=self.expires_at.isoformat() if self.expires_at else None,
+        )
+
+    @classmethod
+    def delete_expired(cls):
+        """
+        Deletes jobs whose artifacts have expired along with the artifacts themselves.
+        Failed jobs, including those that died with their worker, are kept around for
+        EXPORT_JOB_ARTIFACT_TTL for debugging.
+        """
+        t = now()
+        cls.fail_stale_jobs(t)
+
+        expired_jobs = cls.objects.filter(
+            models.Q(expires_at__lte=t) | models.Q(state=cls.State.FAILED, finished_at__lte=t - EXPORT_JOB_ARTIFACT_TTL)
+        )
+
+        num_deleted = 0
+        for job in expired_jobs:
+            if job.artifact:
+                job.artifact.delete(save=False)
+            job.delete()
+            num_deleted += 1
+
+        return num_deleted
+
+    class Meta:
+        verbose_name = _("export job")
+        verbose_name_plural = _("export jobs")
+        indexes = [
+            models.Index(fields=["dedup_key", "state"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(state__in=["pending", "running"]),
+                name="exportjob_one_active_per_dedup_key",
+            ),
+        ]
@@ -19,3 +19,11 @@ def send_email(**opts):
 @shared_task(ignore_result=True)
 def run_admin_command(*args, **kwargs):
     call_command(*args, **kwargs)
+
+
+@shared_task(ignore_result=True)
+def run_export_job(export_job_pk):
+    from .models import ExportJob
+
+    export_job = ExportJob.objects.get(pk=export_job_pk)
+    export_job.run()
@@ -140,3 +140,73 @@ class UtilsTestCase(TestCase):
             format_interval(d0, d2, locale=locale),
             "ke 27.4. 21.00 – to 28.4. 1.00",
         )
+
+
+class ExportJobTestCase(TestCase):
+    def test_stale_job_is_replaced(self):
+        from django.utils.timezone import now
+
+        from core.models import ExportJob, Person
+        from core.models.export_job import EXPORT_JOB_STALE_AFTER
+
+        person, unused = Person.get_or_create_dummy()
+        args = (person.user, None, "core.fobba_export.export_fobba", {}, "export.xlsx")
+
+        job = ExportJob.request(*args)
+        assert ExportJob.request(*args) == job
+
+        ExportJob.objects.filter(id=job.id).update(
+            state=ExportJob.State.RUNNING, updated_at=now() - EXPORT_JOB_STALE_AFTER
+        )
+
+        new_job = ExportJob.request(*args)
+        assert new_job != job
+
+        job.refresh_from_db()
+        assert job.state == ExportJob.State.FAILED
+
+    def test_run_signup_export(self):
+        from unittest import mock
+
+        from django.core.files.storage import InMemoryStorage
+        from django.utils.timezone import now
+
+        from core.csv_export import ENCODING, get_model_export_parameters
+        from core.models import ExportJob
+        from labour.models import Signup
+
+        signup, unused = Signup.get_or_create_dummy()
+        job = ExportJob.objects.create(
+            event=signup.event,
+            requested_by=signup.person.user,
+            exporter="core.csv_export.export_model_instances",
+            parameters=get_model_export_parameters(Signup, Signup.objects.filter(id=signup.id)),
+            format="tsv",
+            filename="signups.tsv",
+            dedup_key="test",
+        )
+
+        with mock.patch.object(ExportJob._meta.get_field("artifact"), "storage", InMemoryStorage()):
+            job.run()
+
+            job.refresh_from_db()
+            assert job.state == ExportJob.State.FINISHED, job.error
+            assert (job.rows_done, job.rows_total) == (1, 1)
+            assert job.expires_at > now()
+
+            with job.artifact.open("rb") as artifact_file:
+                lines = artifact_file.read().decode(ENCODING).splitlines()
+            assert len(lines) == 2
+            assert signup.person.surname in lines[1]
+
+            self.client.force_login(signup.person.user)
+            response = self.client.get(job.get_download_url())
+            assert response.status_code == 200
+            assert b"".join(response.streaming_content).decode(ENCODING).splitlines() == lines
+
+            # expired artifacts are not handed out even before they are deleted
+            ExportJob.objects.filter(id=job.id).update(expires_at=now())
+            assert self.client.get(job.get_download_url()).status_code == 404
+
+            assert ExportJob.delete_expired() == 1
+            assert not ExportJob.objects.filter(id=job.id).exists()
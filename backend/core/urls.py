@@ -5,6 +5,9 @@ from .views import (
     core_email_verification_request_view,
     core_email_verification_view,
     core_event_view,
+    core_export_job_download_view,
+    core_export_job_status_view,
+    core_export_job_view,
     core_fobba_export_view,
     core_frontpage_view,
     core_login_view,
@@ -72,4 +75,7 @@ urlpatterns = [
         name="core_admin_impersonate_view",
     ),
     path("stats", core_stats_view, name="core_stats_view"),
+    path("exports/<int:job_id>", core_export_job_view, name="core_export_job_view"),
+    path("exports/<int:job_id>/status.json", core_export_job_status_view, name="core_export_job_status_view"),
+    path("exports/<int:job_id>/download", core_export_job_download_view, name="core_export_job_download_view"),
 ]
@@ -16,6 +16,7 @@ from .misc_utils import (
     class_property,
     create_temporary_password,
     ensure_groups_exist,
+    ensure_user_group_ids,
     ensure_user_group_membership,
     ensure_user_is_member_of_group,
     get_code,
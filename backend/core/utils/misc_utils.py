@@ -26,11 +26,38 @@ def ensure_user_group_membership(user, groups_to_add=[], groups_to_remove=[]):
     if not isinstance(user, User):
         user = user.user
 
-    for group in groups_to_add:
-        group.user_set.add(user)
+    ensure_user_group_ids(
+        user,
+        group_ids_to_add=[group.id for group in groups_to_add],
+        group_ids_to_remove=[group.id for group in groups_to_remove],
+    )
 
-    for group in groups_to_remove:
-        group.user_set.remove(user)
+
+def ensure_user_group_ids(user, group_ids_to_add=(), group_ids_to_remove=()):
+    """
+    Adds the user to and removes the user from groups given by id. The current memberships are read in one
+    query and the difference is applied with at most one INSERT and one DELETE on the through table.
+    Note that this bypasses the m2m_changed signal of User.groups.
+    """
+    group_ids_to_add = set(group_ids_to_add)
+    group_ids_to_remove = set(group_ids_to_remove) - group_ids_to_add
+
+    Membership = User.groups.through
+    current_group_ids = set(
+        Membership.objects.filter(
+            user=user,
+            group_id__in=group_ids_to_add | group_ids_to_remove,
+        ).values_list("group_id", flat=True)
+    )
+
+    if missing_group_ids := group_ids_to_add - current_group_ids:
+        Membership.objects.bulk_create(
+            [Membership(user=user, group_id=group_id) for group_id in sorted(missing_group_ids)],
+            ignore_conflicts=True,
+        )
+
+    if extra_group_ids := group_ids_to_remove & current_group_ids:
+        Membership.objects.filter(user=user, group_id__in=extra_group_ids).delete()
 
 
 def ensure_user_is_member_of_group(user, group, should_belong_to_group=True):
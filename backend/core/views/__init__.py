@@ -9,6 +9,11 @@ from .email_verification_views import (
     core_email_verification_request_view,
     core_email_verification_view,
 )
+from .export_job_views import (
+    core_export_job_download_view,
+    core_export_job_status_view,
+    core_export_job_view,
+)
 from .login_views import (
     core_login_view,
     core_logout_view,
@@ -1,14 +1,10 @@
 from django.contrib.auth.decorators import user_passes_test
-from django.http import HttpResponse
+from django.shortcuts import redirect
 from django.utils.timezone import now
 from django.views.decorators.http import require_safe
-from paikkala.models import Ticket
 
-from badges.models import Badge
-from core.excel_export import XlsxWriter
-from core.models import Event
+from core.models import Event, ExportJob
 from event_log.utils import emit
-from tickets.models import Order
 
 
 @require_safe
@@ -25,92 +21,12 @@ def core_fobba_export_view(request, event_slug, format="xlsx"):
         other_fields=dict(filename=filename),
     )
 
-    response = HttpResponse()
-    response["content-type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    writer = XlsxWriter(response)
-    writer.writerow(
-        [
-            "surname",
-            "first_name",
-            "email",
-            "phone_number",
-            "role",
-            "role_extra",
-        ]
-    )
-
-    seen = set()
-
-    for badge in Badge.objects.filter(personnel_class__event=event, revoked_at__isnull=True):
-        id_fields = (
-            badge.surname,
-            badge.first_name,
-            badge.person.email if badge.person else "",
-            badge.person.normalized_phone_number if badge.person else "",
-        )
-
-        if id_fields in seen:
-            continue
-
-        seen.add(id_fields)
-        writer.writerow(
-            [
-                *id_fields,
-                badge.personnel_class_name,
-                badge.job_title,
-            ]
-        )
-
-    for order in Order.objects.filter(
+    job = ExportJob.request(
+        user=request.user,
         event=event,
-        confirm_time__isnull=False,
-        payment_date__isnull=False,
-        cancellation_time__isnull=True,
-    ):
-        customer = order.customer
-        assert customer
-
-        id_fields = (
-            customer.last_name,
-            customer.first_name,
-            customer.email,
-            customer.normalized_phone_number,
-        )
-
-        if id_fields in seen:
-            continue
-
-        seen.add(id_fields)
-        writer.writerow(
-            [
-                *id_fields,
-                "Lipun ostaja",
-                order.formatted_order_products,
-            ]
-        )
-
-    for ticket in Ticket.objects.filter(program__kompassi_programme__category__event=event):
-        person = ticket.user.person  # type: ignore
-
-        id_fields = (
-            person.surname,
-            person.first_name,
-            person.email,
-            person.normalized_phone_number,
-        )
-
-        if id_fields in seen:
-            continue
-
-        seen.add(id_fields)
-        writer.writerow(
-            [
-                *id_fields,
-                "Paikkalipun varaaja",
-                "",
-            ]
-        )
+        exporter="core.fobba_export.export_fobba",
+        parameters=dict(),
+        filename=filename,
+    )
 
-    writer.close()
-    return response
+    return redirect(job.get_absolute_url())
@@ -0,0 +1,45 @@
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_safe
+
+from ..models import ExportJob
+
+
+def get_export_job_or_404(request, job_id) -> ExportJob:
+    job = get_object_or_404(ExportJob, id=int(job_id))
+
+    if not job.is_visible_to(request.user):
+        raise Http404()
+
+    return job
+
+
+@require_safe
+@login_required
+def core_export_job_view(request, job_id):
+    job = get_export_job_or_404(request, job_id)
+
+    vars = dict(
+        job=job,
+    )
+
+    return render(request, "core_export_job_view.pug", vars)
+
+
+@require_safe
+@login_required
+def core_export_job_status_view(request, job_id):
+    job = get_export_job_or_404(request, job_id)
+    return JsonResponse(job.as_dict())
+
+
+@require_safe
+@login_required
+def core_export_job_download_view(request, job_id):
+    job = get_export_job_or_404(request, job_id)
+
+    if job.state != ExportJob.State.FINISHED or not job.artifact or job.is_expired:
+        raise Http404()
+
+    return FileResponse(job.artifact.open("rb"), as_attachment=True, filename=job.filename)
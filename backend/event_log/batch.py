@@ -0,0 +1,141 @@
+"""
+Asynchronous, batched emission of event log entries.
+
+When settings.KOMPASSI_EVENT_LOG_ASYNC_EMIT is set (and Celery is not eager), `emit` does not save the
+Entry on the spot. Instead it turns its arguments into a JSON serializable record. Records emitted during
+a request are collected by EventLogBufferMiddleware and handed to a Celery worker as one batch; records
+emitted elsewhere are sent as batches of one. Records only count once the transaction they were emitted in
+commits, so that entries never refer to rows that were rolled back, and the records of a failed request are
+thrown away. The worker resolves the foreign keys the `pre_save` handler
+would have looked up (see handlers/entry.py) in bulk, `bulk_create`s the entries and then fans out
+subscriptions.
+"""
+
+import logging
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils.timezone import now
+
+logger = logging.getLogger("kompassi")
+
+ENTRY_BATCH_SIZE = 500
+
+EntryRecord = dict[str, Any]
+
+# set for the duration of a request by EventLogBufferMiddleware
+entry_buffer: ContextVar[Optional[list[EntryRecord]]] = ContextVar("event_log_entry_buffer", default=None)
+
+
+def is_async_emit_enabled() -> bool:
+    return (
+        getattr(settings, "KOMPASSI_EVENT_LOG_ASYNC_EMIT", False)
+        and "background_tasks" in settings.INSTALLED_APPS
+        and not getattr(settings, "CELERY_TASK_ALWAYS_EAGER", False)
+    )
+
+
+def make_entry_record(entry_type_name: str, **kwargs) -> EntryRecord:
+    """
+    Model instances passed as kwargs are replaced with their primary keys, eg. event=event becomes event_id=1.
+    """
+    record: EntryRecord = dict(
+        entry_type=entry_type_name,
+        created_at=now().isoformat(),
+    )
+
+    for key, value in kwargs.items():
+        if isinstance(value, models.Model):
+            record[f"{key}_id"] = value.pk
+        else:
+            record[key] = value
+
+    return record
+
+
+def enqueue_entry_record(record: EntryRecord):
+    if (buffer := entry_buffer.get()) is not None:
+        transaction.on_commit(lambda: buffer.append(record))
+    else:
+        flush_entry_records([record])
+
+
+def flush_entry_records(records: list[EntryRecord]):
+    """
+    Hands the records to a background worker once the current transaction (if any) commits.
+    """
+    if not records:
+        return
+
+    from .tasks import event_log_create_entries
+
+    transaction.on_commit(lambda: event_log_create_entries.delay(records))
+
+
+def create_entries(records: list[EntryRecord]):
+    """
+    Bulk equivalent of saving an Entry for each record and running the handlers in handlers/entry.py.
+    """
+    from core.models import Event, Organization, Person
+
+    from .models import Entry
+
+    entries = []
+    for record in records:
+        record = dict(record)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        entries.append(Entry(**record))
+
+    def get_claim(entry, claim_name):
+        return entry.other_fields.get("claims", {}).get(claim_name)
+
+    # event and organization from claims
+    if event_slugs := {
+        event_slug for entry in entries if entry.event_id is None and (event_slug := get_claim(entry, "event"))
+    }:
+        event_ids_by_slug = dict(Event.objects.filter(slug__in=event_slugs).values_list("slug", "id"))
+        for entry in entries:
+            if entry.event_id is None and (event_slug := get_claim(entry, "event")):
+                entry.event_id = event_ids_by_slug.get(event_slug)
+
+    if organization_slugs := {
+        organization_slug
+        for entry in entries
+        if entry.organization_id is None and (organization_slug := get_claim(entry, "organization"))
+    }:
+        organization_ids_by_slug = dict(
+            Organization.objects.filter(slug__in=organization_slugs).values_list("slug", "id")
+        )
+        for entry in entries:
+            if entry.organization_id is None and (organization_slug := get_claim(entry, "organization")):
+                entry.organization_id = organization_ids_by_slug.get(organization_slug)
+
+    # organization from event
+    if event_ids := {entry.event_id for entry in entries if entry.organization_id is None and entry.event_id}:
+        organization_ids_by_event_id = dict(Event.objects.filter(id__in=event_ids).values_list("id", "organization_id"))
+        for entry in entries:
+            if entry.organization_id is None and entry.event_id:
+                entry.organization_id = organization_ids_by_event_id.get(entry.event_id)
+
+    # person from other_fields.user
+    if usernames := {
+        username for entry in entries if entry.person_id is None and (username := entry.other_fields.get("user"))
+    }:
+        person_ids_by_username = dict(
+            Person.objects.filter(user__username__in=usernames).values_list("user__username", "id")
+        )
+        # users without a Person are skipped like in the pre_save handler
+        for entry in entries:
+            if entry.person_id is None and (username := entry.other_fields.get("user")):
+                entry.person_id = person_ids_by_username.get(username)
+
+    entries = Entry.objects.bulk_create(entries, batch_size=ENTRY_BATCH_SIZE)
+    logger.debug("event_log.batch.create_entries created %d entries", len(entries))
+
+    for entry in entries:
+        entry.send_updates()
+
+    return entries
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import Subscription
+from ..subscription_routing import routing_table
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def on_subscription_changed(sender, instance, **kwargs):
+    # this process sees the change right away, even before commit
+    routing_table.version = None
+
+    # bumping the shared version before commit would let other processes load the old subscriptions again
+    transaction.on_commit(routing_table.invalidate)
@@ -0,0 +1,76 @@
+import logging
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from event_log.retention import (
+    ARCHIVE_BATCH_SIZE,
+    archive_and_drop_partition,
+    archive_expired_entries,
+    get_detached_partitions,
+    get_droppable_partitions,
+    is_partitioned,
+    open_archive_file,
+)
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Archive and delete event log entries whose retention period has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=".",
+            help="Directory into which the gzipped JSONL archive is written",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report how many entries would be archived",
+        )
+        parser.add_argument(
+            "--drop-partitions",
+            action="store_true",
+            default=False,
+            help="Archive and drop whole monthly partitions whose every entry has expired",
+        )
+
+    def handle(self, *args, **options):
+        t = now()
+        dry_run = options["dry_run"]
+        output_path = os.path.join(options["output_dir"], f"event_log_{t:%Y%m%d%H%M%S}.jsonl.gz")
+
+        if dry_run:
+            output_file = None
+        else:
+            output_file = open_archive_file(output_path)
+
+        try:
+            if options["drop_partitions"] and is_partitioned():
+                for partition_name in get_detached_partitions() + get_droppable_partitions(t):
+                    num_entries = archive_and_drop_partition(partition_name, output_file, dry_run=dry_run)  # type: ignore
+                    logger.info("Partition %s: %d entries", partition_name, num_entries)
+
+            num_entries = archive_expired_entries(
+                output_file,  # type: ignore
+                t=t,
+                batch_size=options["batch_size"],
+                dry_run=dry_run,
+            )
+        finally:
+            if output_file is not None:
+                output_file.close()
+
+        if dry_run:
+            logger.info("Would archive %d expired entries", num_entries)
+        else:
+            logger.info("Archived %d expired entries to %s", num_entries, output_path)
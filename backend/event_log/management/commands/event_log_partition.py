@@ -0,0 +1,41 @@
+import logging
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from event_log.retention import convert_to_partitioned, ensure_partitions, get_next_month_start, is_partitioned
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly partitions of the event log, optionally converting it to a partitioned table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            default=False,
+            help="Convert the unpartitioned event_log_entry table (copies all entries; run during a maintenance break)",
+        )
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+        )
+
+    def handle(self, *args, **options):
+        months_ahead = options["months_ahead"]
+
+        if not is_partitioned():
+            if not options["convert"]:
+                raise CommandError("event_log_entry is not partitioned. Use --convert to convert it.")
+
+            logger.info("Converting event_log_entry into a partitioned table...")
+            convert_to_partitioned(months_ahead=months_ahead)
+            return
+
+        t = now()
+        ensure_partitions(t, get_next_month_start(t + timedelta(days=31 * months_ahead)))
+        logger.info("Ensured event log partitions for %d months ahead", months_ahead)
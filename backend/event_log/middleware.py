@@ -0,0 +1,26 @@
+from .batch import entry_buffer, flush_entry_records
+
+
+class EventLogBufferMiddleware:
+    """
+    Collects event log entries emitted during the request and hands them to a background worker
+    as one batch when the request is done. Entries of a request that failed are thrown away.
+    Only used when asynchronous emission is enabled, see event_log.batch.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        buffer = []
+        token = entry_buffer.set(buffer)
+        try:
+            response = self.get_response(request)
+        finally:
+            # an exception propagating from here means the request failed and the entries are thrown away
+            entry_buffer.reset(token)
+
+        if response.status_code < 500:
+            flush_entry_records(buffer)
+
+        return response
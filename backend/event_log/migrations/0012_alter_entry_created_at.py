@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("event_log", "0011_remove_entry_event_survey_result_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="entry",
+            name="created_at",
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.db import models
-from django.db.models import JSONField, Q
+from django.db.models import JSONField
 from django.template.loader import render_to_string
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 TARGET_FKEY_ATTRS = dict(
@@ -12,7 +13,8 @@ TARGET_FKEY_ATTRS = dict(
 
 
 class Entry(models.Model):
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # not auto_now_add because entries emitted asynchronously carry their original creation time
+    created_at = models.DateTimeField(default=now, db_index=True)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -64,36 +66,9 @@ class Entry(models.Model):
             return None
 
     def send_updates(self):
-        from .subscription import Subscription
-
-        q = Q(entry_type=self.entry_type, active=True)
-
-        # TODO need a more flexible filter solution that does not hard-code these
-        # One option would be to specify filter = JSONField in Subscription.
-        # Implementing this filter would require a client-side check or one SQL query
-        # per Subscription, however, as we query Subscriptions by Entry and not vice versa.
-
-        if self.event:
-            # Implement the event filter. Subscriptions without event_filter receive updates from
-            # all events. Subscriptions with event_filter receive only updates from that event.
-            q &= Q(event_filter=self.event) | Q(event_filter__isnull=True)
-
-        if self.event and self.person:
-            # Implement job category filter
-            from labour.models import Signup
-
-            try:
-                signup = Signup.objects.get(event=self.event, person=self.person)
-            except Signup.DoesNotExist:
-                pass
-            else:
-                q &= (
-                    Q(job_category_filter__in=signup.job_categories.all())
-                    | Q(job_category_filter__in=signup.job_categories_accepted.all())
-                    | Q(job_category_filter__isnull=True)
-                )
-
-        for subscription in Subscription.objects.filter(q):
+        from ..subscription_routing import routing_table
+
+        for subscription in routing_table.get_subscriptions_for_entry(self):
             subscription.send_update_for_entry(self)
 
     @property
@@ -7,6 +7,7 @@ class EntryTypeMetadata:
         "message",
         "email_body_template",
         "email_reply_to",
+        "retention_days",
     ]
 
     def __init__(
@@ -16,12 +17,17 @@ class EntryTypeMetadata:
         email_body_template="event_log_default.eml",
         email_reply_to=None,
         get_event=lambda instance: instance.event,
+        retention_days=None,
     ):
         self.name = name
         self.message = message
         self.email_body_template = email_body_template
         self.email_reply_to = email_reply_to
 
+        # Entries of this type older than this are archived and deleted by event_log_archive.
+        # None means keep forever.
+        self.retention_days = retention_days
+
     @classmethod
     def get_or_create_dummy(self, name="eventlog.dummy", **attrs):
         from ..registry import get, register
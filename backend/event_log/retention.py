@@ -0,0 +1,391 @@
+"""
+Retention and archival of event log entries.
+
+Each entry type may declare `retention_days` when registered (see registry.register). Entries older than
+that are written to gzip compressed JSONL files and deleted in bounded batches by the `event_log_archive`
+management command.
+
+Optionally the `event_log_entry` table can be converted into a table partitioned by month on `created_at`
+using the `event_log_partition` management command. Partitions whose every entry has expired are then
+archived and dropped as a whole instead of being deleted row by row.
+"""
+
+import gzip
+import json
+import logging
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import Optional, TextIO
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from . import registry
+from .models import Entry
+
+logger = logging.getLogger("kompassi")
+
+ARCHIVE_BATCH_SIZE = 1000
+ENTRY_TABLE = Entry._meta.db_table
+ARCHIVED_FIELDS = [field.attname for field in Entry._meta.concrete_fields]
+
+
+def get_expired_entries_q(t: Optional[datetime] = None) -> Optional[Q]:
+    """
+    Returns a Q matching entries whose retention period has passed at `t`, or None if no entry type
+    has a retention period.
+    """
+    if t is None:
+        t = now()
+
+    q = None
+    for entry_type in registry.entry_types.values():
+        if entry_type.retention_days is None:
+            continue
+
+        type_q = Q(entry_type=entry_type.name, created_at__lt=t - timedelta(days=entry_type.retention_days))
+        q = type_q if q is None else q | type_q
+
+    return q
+
+
+def write_entries_as_jsonl(entries: Iterable[dict], output_file: TextIO) -> int:
+    num_entries = 0
+    for entry in entries:
+        output_file.write(json.dumps(entry, cls=DjangoJSONEncoder))
+        output_file.write("\n")
+        num_entries += 1
+    return num_entries
+
+
+def archive_expired_entries(
+    output_file: TextIO,
+    t: Optional[datetime] = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    dry_run: bool = False,
+) -> int:
+    """
+    Writes expired entries into `output_file` as JSONL and deletes them, one batch of `batch_size` entries
+    per transaction so that locks are not held for long. Returns the number of entries archived.
+    """
+    q = get_expired_entries_q(t)
+    if q is None:
+        return 0
+
+    expired_entries = Entry.objects.filter(q).order_by("id")
+
+    if dry_run:
+        return expired_entries.count()
+
+    num_archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(expired_entries.filter(id__gt=last_id).values(*ARCHIVED_FIELDS)[:batch_size])
+            if not batch:
+                break
+
+            write_entries_as_jsonl(batch, output_file)
+            last_id = batch[-1]["id"]
+            Entry.objects.filter(id__in=[entry["id"] for entry in batch]).delete()
+
+        num_archived += len(batch)
+        logger.info("event_log.retention: archived %d entries", num_archived)
+
+    return num_archived
+
+
+def open_archive_file(path: str) -> TextIO:
+    return gzip.open(path, "at", encoding="UTF-8")  # type: ignore
+
+
+# Partitioning
+
+
+def is_partitioned() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [ENTRY_TABLE])
+        row = cursor.fetchone()
+
+    return row is not None and row[0] == "p"
+
+
+def get_month_start(t: datetime) -> datetime:
+    return t.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_next_month_start(t: datetime) -> datetime:
+    return get_month_start(get_month_start(t) + timedelta(days=32))
+
+
+def get_partition_name(month_start: datetime) -> str:
+    return f"{ENTRY_TABLE}_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def parse_partition_name(name: str) -> Optional[datetime]:
+    """
+    Returns the start of the month of a monthly partition name, or None if the name is not one.
+    """
+    suffix = name.removeprefix(f"{ENTRY_TABLE}_")
+    if not (len(suffix) == 8 and suffix[0] == "y" and suffix[5] == "m" and suffix[1:5].isdigit()):
+        return None
+
+    return now().replace(
+        year=int(suffix[1:5]),
+        month=int(suffix[6:8]),
+        day=1,
+        hour=0,
+        minute=0,
+        second=0,
+        microsecond=0,
+    )
+
+
+def get_partitions() -> list[tuple[str, datetime, datetime]]:
+    """
+    Returns (name, start, end) of each monthly partition, oldest first. The default partition is not included.
+    """
+    partitions = []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            [ENTRY_TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            if (start := parse_partition_name(name)) is not None:
+                partitions.append((name, start, get_next_month_start(start)))
+
+    return partitions
+
+
+def get_detached_partitions() -> list[str]:
+    """
+    Returns the names of monthly partitions that have been detached but not dropped, eg. because writing
+    the archive failed. They are archived and dropped on the next run.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT relname
+            FROM pg_class
+            WHERE relname LIKE %s
+            AND relkind = 'r'
+            AND NOT relispartition
+            ORDER BY relname
+            """,
+            [f"{ENTRY_TABLE}\\_y%"],
+        )
+        return [name for (name,) in cursor.fetchall() if parse_partition_name(name) is not None]
+
+
+def table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    (exists,) = cursor.fetchone()
+    return exists
+
+
+def ensure_partitions(start: datetime, end: datetime):
+    """
+    Creates the monthly partitions needed to cover [start, end) if they do not exist yet.
+
+    Entries of a month that has no partition go into the default partition, and a partition cannot be created
+    for a month that already has entries there. In that case the entries are moved out of the default partition
+    into the new one before it is attached.
+    """
+    month_start = get_month_start(start)
+    default_partition = f"{ENTRY_TABLE}_default"
+
+    while month_start < end:
+        month_end = get_next_month_start(month_start)
+        name = get_partition_name(month_start)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if table_exists(cursor, name):
+                month_start = month_end
+                continue
+
+            has_default_entries = False
+            if table_exists(cursor, default_partition):
+                # keep new entries of the month from going into the default partition while they are moved
+                cursor.execute(f"LOCK TABLE {default_partition} IN EXCLUSIVE MODE")
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {default_partition} WHERE created_at >= %s AND created_at < %s)",
+                    [month_start, month_end],
+                )
+                (has_default_entries,) = cursor.fetchone()
+
+            if has_default_entries:
+                cursor.execute(f"CREATE TABLE {name} (LIKE {ENTRY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                cursor.execute(
+                    f"""
+                    WITH moved AS (
+                        DELETE FROM {default_partition}
+                        WHERE created_at >= %s AND created_at < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                    """,
+                    [month_start, month_end],
+                )
+                logger.info(
+                    "event_log.retention: moved %d entries from the default partition into %s",
+                    cursor.rowcount,
+                    name,
+                )
+                cursor.execute(
+                    f"ALTER TABLE {ENTRY_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    [month_start, month_end],
+                )
+            else:
+                cursor.execute(
+                    f"CREATE TABLE {name} PARTITION OF {ENTRY_TABLE} FOR VALUES FROM (%s) TO (%s)",
+                    [month_start, month_end],
+                )
+
+        month_start = month_end
+
+
+def convert_to_partitioned(months_ahead: int = 3):
+    """
+    Converts the event_log_entry table into one partitioned by month on created_at.
+
+    This copies all entries and should be run during a maintenance break. As the primary key of a partitioned
+    table must include the partition key, it becomes (id, created_at).
+
+    Databases created by Django 4.1 or later have an identity id column, older ones a serial one. An identity
+    column gets a new identity that continues after the largest copied id. A serial column keeps using the
+    sequence of the old table.
+    """
+    assert not is_partitioned()
+
+    fk_fields = [field for field in Entry._meta.concrete_fields if field.is_relation]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+            [ENTRY_TABLE],
+        )
+        (attidentity,) = cursor.fetchone()
+        is_identity = attidentity != ""
+
+        cursor.execute(f"ALTER TABLE {ENTRY_TABLE} RENAME TO {ENTRY_TABLE}_unpartitioned")
+        cursor.execute(
+            f"""
+            CREATE TABLE {ENTRY_TABLE} (
+                LIKE {ENTRY_TABLE}_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+                {"INCLUDING IDENTITY" if is_identity else ""}
+            ) PARTITION BY RANGE (created_at)
+            """
+        )
+        cursor.execute(f"ALTER TABLE {ENTRY_TABLE} ADD PRIMARY KEY (id, created_at)")
+        if not is_identity:
+            cursor.execute(f"ALTER SEQUENCE {ENTRY_TABLE}_id_seq OWNED BY {ENTRY_TABLE}.id")
+        cursor.execute(f"CREATE INDEX {ENTRY_TABLE}_created_at_part ON {ENTRY_TABLE} (created_at)")
+
+        for field in fk_fields:
+            column = field.column
+            target = field.related_model._meta
+            cursor.execute(f"CREATE INDEX {ENTRY_TABLE}_{column}_part ON {ENTRY_TABLE} ({column})")
+            cursor.execute(
+                f"""
+                ALTER TABLE {ENTRY_TABLE}
+                ADD CONSTRAINT {ENTRY_TABLE}_{column}_fk_part
+                FOREIGN KEY ({column}) REFERENCES {target.db_table} ({target.pk.column})
+                DEFERRABLE INITIALLY DEFERRED
+                """
+            )
+
+        cursor.execute(f"SELECT min(created_at) FROM {ENTRY_TABLE}_unpartitioned")
+        (oldest,) = cursor.fetchone()
+        t = now()
+        ensure_partitions(oldest or t, get_next_month_start(t + timedelta(days=31 * months_ahead)))
+        cursor.execute(f"CREATE TABLE {ENTRY_TABLE}_default PARTITION OF {ENTRY_TABLE} DEFAULT")
+
+        if is_identity:
+            cursor.execute(
+                f"INSERT INTO {ENTRY_TABLE} OVERRIDING SYSTEM VALUE SELECT * FROM {ENTRY_TABLE}_unpartitioned"
+            )
+            cursor.execute(
+                f"""
+                SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(max(id), 0) + 1, false)
+                FROM {ENTRY_TABLE}
+                """,
+                [ENTRY_TABLE],
+            )
+        else:
+            cursor.execute(f"INSERT INTO {ENTRY_TABLE} SELECT * FROM {ENTRY_TABLE}_unpartitioned")
+
+        cursor.execute(f"DROP TABLE {ENTRY_TABLE}_unpartitioned")
+
+
+def get_droppable_partitions(t: Optional[datetime] = None) -> list[str]:
+    """
+    Returns the names of partitions in which every entry has passed its retention period.
+    """
+    if t is None:
+        t = now()
+
+    droppable = []
+    for name, start, end in get_partitions():
+        if end > t:
+            break
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT DISTINCT entry_type FROM {name}")
+            entry_types = [registry.get(entry_type) for (entry_type,) in cursor.fetchall()]
+
+        if all(
+            entry_type.retention_days is not None and end <= t - timedelta(days=entry_type.retention_days)
+            for entry_type in entry_types
+        ):
+            droppable.append(name)
+
+    return droppable
+
+
+def archive_and_drop_partition(name: str, output_file: TextIO, dry_run: bool = False) -> int:
+    """
+    Detaches the partition, writes its entries into `output_file` as JSONL and drops it. Also accepts a partition
+    that has already been detached (see get_detached_partitions).
+
+    DETACH PARTITION takes an ACCESS EXCLUSIVE lock on the entry table, so it is done in a transaction of its
+    own that commits right away instead of holding the lock while the archive is written. DETACH PARTITION
+    CONCURRENTLY cannot be used because the entry table has a default partition.
+    """
+    columns = ", ".join(field.column for field in Entry._meta.concrete_fields)
+
+    with connection.cursor() as cursor:
+        if dry_run:
+            cursor.execute(f"SELECT count(*) FROM {name}")
+            (num_entries,) = cursor.fetchone()
+            return num_entries
+
+        with transaction.atomic():
+            cursor.execute("SELECT relispartition FROM pg_class WHERE relname = %s", [name])
+            (is_attached,) = cursor.fetchone()
+            if is_attached:
+                cursor.execute(f"ALTER TABLE {ENTRY_TABLE} DETACH PARTITION {name}")
+
+        # the detached table is no longer visible through the entry table, so no lock on it is held here
+        cursor.execute(f"SELECT {columns} FROM {name} ORDER BY id")
+
+        num_entries = 0
+        while rows := cursor.fetchmany(ARCHIVE_BATCH_SIZE):
+            num_entries += write_entries_as_jsonl((dict(zip(ARCHIVED_FIELDS, row)) for row in rows), output_file)
+
+        # if writing the archive failed, the detached table is kept for the next run
+        output_file.flush()
+        cursor.execute(f"DROP TABLE {name}")
+
+    logger.info("event_log.retention: archived and dropped partition %s with %d entries", name, num_entries)
+    return num_entries
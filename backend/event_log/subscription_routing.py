@@ -0,0 +1,108 @@
+"""
+In-memory routing table from entries to the subscriptions that should receive them.
+
+Active subscriptions are loaded once per process, grouped by entry type. A version number in the Django
+cache is bumped whenever a change to a Subscription is committed (see handlers/subscription.py) so that every
+process reloads its table on the next lookup. The process making the change drops its own table right away.
+Matching an entry of a type nobody subscribes to costs no queries.
+
+Other processes only see the bump if the cache is shared between them (eg. Redis). With the default local
+memory cache, other processes keep their table until they are restarted.
+"""
+
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.cache import cache
+
+if TYPE_CHECKING:
+    from .models import Entry, Subscription
+
+
+VERSION_CACHE_KEY = "event_log.subscription_routing:version"
+
+
+class SubscriptionRoutingTable:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.routes: dict[str, list["Subscription"]] = {}
+
+    def get_version(self) -> int:
+        version = cache.get(VERSION_CACHE_KEY)
+        if version is None:
+            version = 0
+            cache.add(VERSION_CACHE_KEY, version, timeout=None)
+        return version
+
+    def invalidate(self):
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+
+    def get_routes(self, entry_type: str) -> list["Subscription"]:
+        from .models import Subscription
+
+        version = self.get_version()
+
+        with self.lock:
+            if version != self.version:
+                routes = defaultdict(list)
+                for subscription in Subscription.objects.filter(active=True):
+                    routes[subscription.entry_type].append(subscription)
+
+                self.routes = dict(routes)
+                self.version = version
+
+            return self.routes.get(entry_type, [])
+
+    def get_subscriptions_for_entry(self, entry: "Entry") -> list["Subscription"]:
+        """
+        Subscriptions without event_filter receive updates from all events. Subscriptions with event_filter
+        receive only updates from that event. The job category filter applies if the person of the entry
+        has a signup in the event of the entry.
+        """
+        candidates = self.get_routes(entry.entry_type)
+
+        if entry.event_id:
+            candidates = [s for s in candidates if s.event_filter_id in (None, entry.event_id)]
+
+        if entry.event_id and entry.person_id and any(s.job_category_filter_id for s in candidates):
+            job_category_ids = get_signup_job_category_ids(entry.event_id, entry.person_id)
+            if job_category_ids is not None:
+                candidates = [
+                    s
+                    for s in candidates
+                    if s.job_category_filter_id is None or s.job_category_filter_id in job_category_ids
+                ]
+
+        return candidates
+
+
+def get_signup_job_category_ids(event_id: int, person_id: int) -> Optional[set[int]]:
+    """
+    Returns the IDs of the job categories applied for or accepted into, or None if there is no signup.
+    """
+    from labour.models import Signup
+
+    row = (
+        Signup.objects.filter(event_id=event_id, person_id=person_id)
+        .annotate(
+            job_category_ids=ArrayAgg("job_categories", distinct=True),
+            accepted_job_category_ids=ArrayAgg("job_categories_accepted", distinct=True),
+        )
+        .values_list("job_category_ids", "accepted_job_category_ids")
+        .first()
+    )
+
+    if row is None:
+        return None
+
+    job_category_ids, accepted_job_category_ids = row
+    return {id for id in (*job_category_ids, *accepted_job_category_ids) if id is not None}
+
+
+routing_table = SubscriptionRoutingTable()
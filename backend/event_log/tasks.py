@@ -9,3 +9,10 @@ def subscription_send_update_for_entry(subscription_id, entry_id):
     entry = Entry.objects.get(id=entry_id)
 
     subscription._send_update_for_entry(entry)
+
+
+@shared_task(ignore_result=True)
+def event_log_create_entries(records):
+    from .batch import create_entries
+
+    create_entries(records)
@@ -1,8 +1,26 @@
+import io
+import json
+from datetime import timedelta
+
+from django.db import connection, transaction
 from django.test import TestCase
+from django.utils.timezone import now
 
 from core.models import Event
 
-from .models import Subscription
+from .batch import create_entries, enqueue_entry_record, entry_buffer, make_entry_record
+from .models import Entry, Subscription
+from .retention import (
+    archive_and_drop_partition,
+    archive_expired_entries,
+    convert_to_partitioned,
+    ensure_partitions,
+    get_month_start,
+    get_next_month_start,
+    get_partition_name,
+    get_partitions,
+)
+from .subscription_routing import routing_table
 from .utils import emit
 
 notifications = []
@@ -26,8 +44,9 @@ class EventFilterTestCase(TestCase):
             callback_code=f"{__name__}:notification_callback",
         )
 
-        subscription_with_event_filter, unused = Subscription.get_or_create_dummy(event_filter=event, **kwargs)
-        subscription_without_event_filter, unused = Subscription.get_or_create_dummy(event_filter=None, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription_with_event_filter, unused = Subscription.get_or_create_dummy(event_filter=event, **kwargs)
+            subscription_without_event_filter, unused = Subscription.get_or_create_dummy(event_filter=None, **kwargs)
 
         entry_type = subscription_with_event_filter.entry_type
 
@@ -35,3 +54,112 @@ class EventFilterTestCase(TestCase):
         emit(entry_type, event=event2)
 
         assert len(notifications) == 3
+
+
+class BatchEmitTestCase(TestCase):
+    def setUp(self):
+        global notifications
+        notifications = []
+
+    def test_create_entries(self):
+        event, unused = Event.get_or_create_dummy()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription, unused = Subscription.get_or_create_dummy(
+                event_filter=event,
+                channel="callback",
+                callback_code=f"{__name__}:notification_callback",
+            )
+
+        records = [
+            make_entry_record(subscription.entry_type, event=event),
+            make_entry_record(subscription.entry_type, other_fields={"claims": {"event": event.slug}}),
+            make_entry_record(subscription.entry_type),
+        ]
+
+        entries = create_entries(records)
+
+        assert all(entry.pk for entry in entries)
+        assert entries[1].event_id == event.id
+        assert entries[1].organization_id == event.organization_id
+        assert entries[2].event_id is None
+        assert len(notifications) == 2
+
+    def test_rolled_back_records_are_dropped(self):
+        buffer = []
+        token = entry_buffer.set(buffer)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        enqueue_entry_record(make_entry_record("rolled.back"))
+                        raise RuntimeError()
+                except RuntimeError:
+                    pass
+
+                with transaction.atomic():
+                    enqueue_entry_record(make_entry_record("committed"))
+        finally:
+            entry_buffer.reset(token)
+
+        assert [record["entry_type"] for record in buffer] == ["committed"]
+
+
+class SubscriptionRoutingTestCase(TestCase):
+    def test_unsubscribed_entry_type_costs_no_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.get_or_create_dummy()
+        routing_table.get_routes("event_log.warm.up")
+
+        entry = Entry(entry_type="event_log.nobody.subscribes")
+        with self.assertNumQueries(0):
+            entry.send_updates()
+
+    def test_subscription_change_refreshes_routes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription, unused = Subscription.get_or_create_dummy()
+        assert subscription in routing_table.get_routes(subscription.entry_type)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription.active = False
+            subscription.save()
+        assert subscription not in routing_table.get_routes(subscription.entry_type)
+
+
+class RetentionTestCase(TestCase):
+    def test_archive_expired_entries(self):
+        t = now()
+        expired_entry = Entry.objects.create(entry_type="access.cbac.denied", created_at=t - timedelta(days=181))
+        fresh_entry = Entry.objects.create(entry_type="access.cbac.denied", created_at=t - timedelta(days=179))
+        kept_entry = Entry.objects.create(entry_type="core.person.viewed", created_at=t - timedelta(days=3650))
+
+        assert archive_expired_entries(io.StringIO(), t=t, dry_run=True) == 1
+
+        output_file = io.StringIO()
+        assert archive_expired_entries(output_file, t=t, batch_size=1) == 1
+
+        archived = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        assert [entry["id"] for entry in archived] == [expired_entry.id]
+        assert set(Entry.objects.values_list("id", flat=True)) >= {fresh_entry.id, kept_entry.id}
+        assert not Entry.objects.filter(id=expired_entry.id).exists()
+
+    def test_partitions(self):
+        convert_to_partitioned(months_ahead=1)
+
+        # an entry of a month that has no partition goes into the default partition
+        old_entry = Entry.objects.create(entry_type="access.cbac.denied", created_at=now() - timedelta(days=400))
+        month_start = get_month_start(old_entry.created_at)
+        name = get_partition_name(month_start)
+
+        ensure_partitions(month_start, get_next_month_start(month_start))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {name}")
+            assert cursor.fetchall() == [(old_entry.id,)]
+
+        output_file = io.StringIO()
+        assert archive_and_drop_partition(name, output_file) == 1
+
+        archived = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        assert [entry["id"] for entry in archived] == [old_entry.id]
+        assert not Entry.objects.filter(id=old_entry.id).exists()
+        assert name not in [partition_name for partition_name, start, end in get_partitions()]
@@ -62,7 +62,11 @@ def emit(entry_type_name, **kwargs):
     `kwargs` are passed to the Entry constructor with the exception of the following special kwargs:
 
     * `request`: If present, sets fields that can be deduced from the request.
+
+    If asynchronous emission is enabled, the entry is saved later by a background worker.
+    See `event_log.batch`.
     """
+    from .batch import enqueue_entry_record, is_async_emit_enabled, make_entry_record
     from .models import Entry
 
     if request := kwargs.pop("request", None):
@@ -70,5 +74,31 @@ def emit(entry_type_name, **kwargs):
 
     logger.debug("event_log.utils.emit %s", entry_type_name)
 
+    if is_async_emit_enabled():
+        enqueue_entry_record(make_entry_record(entry_type_name, **kwargs))
+        return
+
     entry = Entry(entry_type=entry_type_name, **kwargs)
     entry.save()
+
+
+def emit_many(entry_type_name, entries_kwargs, **common_kwargs):
+    """
+    Records many log entries of the same type at once. Each item of `entries_kwargs` is a dict of kwargs
+    for one entry as in `emit`; `common_kwargs` (including `request`) apply to all of them.
+
+    Entries are created with one `bulk_create`, or handed to a background worker as one batch if
+    asynchronous emission is enabled.
+    """
+    from .batch import create_entries, flush_entry_records, is_async_emit_enabled, make_entry_record
+
+    if request := common_kwargs.pop("request", None):
+        common_kwargs = dict(attrs_from_request(request), **common_kwargs)
+
+    records = [make_entry_record(entry_type_name, **dict(common_kwargs, **kwargs)) for kwargs in entries_kwargs]
+    logger.debug("event_log.utils.emit_many %s (%d entries)", entry_type_name, len(records))
+
+    if is_async_emit_enabled():
+        flush_entry_records(records)
+    else:
+        create_entries(records)
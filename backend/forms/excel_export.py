@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Iterable, Iterator, Sequence
 from typing import Any, BinaryIO
 
 from django.db import models
@@ -51,6 +51,22 @@ def get_response_cells(field: Field, values: dict[str, Any]) -> list[Any]:
     return cells
 
 
+def get_header_row(fields: Sequence[Field]) -> list[str]:
+    header_row = ["created_at", "language"]
+    header_row.extend(cell for field in fields for cell in get_header_cells(field))
+    return header_row
+
+
+def iter_response_rows(fields: Sequence[Field], responses: Iterable[Response]) -> Iterator[list[Any]]:
+    for response in responses:
+        response_row = [
+            localtime(response.created_at).replace(tzinfo=None),
+            response.form.language,
+        ]
+        response_row.extend(cell for field in fields for cell in get_response_cells(field, response.values))
+        yield response_row
+
+
 def write_responses_as_excel(
     fields: Sequence[Field],
     responses: models.QuerySet[Response],
@@ -60,16 +76,36 @@ def write_responses_as_excel(
 
     output = XlsxWriter(output_stream)
 
-    header_row = ["created_at", "language"]
-    header_row.extend(cell for field in fields for cell in get_header_cells(field))
-    output.writerow(header_row)
+    output.writerow(get_header_row(fields))
 
-    for response in responses:
-        response_row = [
-            localtime(response.created_at).replace(tzinfo=None),
-            response.form.language,
-        ]
-        response_row.extend(cell for field in fields for cell in get_response_cells(field, response.values))
+    for response_row in iter_response_rows(fields, responses):
         output.writerow(response_row)
 
     output.close()
+
+
+def export_responses(event, parameters: dict[str, Any]):
+    """
+    Exporter for core.models.ExportJob. Exports the responses of either a form (form_id)
+    or a survey (survey_id).
+    """
+    from core.csv_export import ExportSource
+
+    from .models import Form, Survey
+
+    if survey_id := parameters.get("survey_id"):
+        survey = Survey.objects.get(id=survey_id)
+        fields = survey.combined_fields
+        responses = survey.responses.order_by("created_at")
+    else:
+        form = Form.objects.get(id=parameters["form_id"])
+        fields = form.validated_fields
+        responses = form.responses.all()
+
+    responses = responses.select_related("form").only("form_data", "created_at", "form__language")
+
+    return ExportSource(
+        header_row=get_header_row(fields),
+        rows=iter_response_rows(fields, responses.iterator(chunk_size=500)),
+        rows_total=responses.count(),
+    )
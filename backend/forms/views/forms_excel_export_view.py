@@ -1,13 +1,12 @@
 from typing import Optional
 
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import get_object_or_404
+from django.http import HttpRequest
+from django.shortcuts import get_object_or_404, redirect
 from django.utils.timezone import now
 
 from access.cbac import default_cbac_required
-from core.models import Event
+from core.models import Event, ExportJob
 
-from ..excel_export import write_responses_as_excel
 from ..models import Form
 
 
@@ -24,12 +23,16 @@ def forms_excel_export_view(
         form = get_object_or_404(Form, event=event, slug=form_slug)
         filename = f"{event.slug}_{form.slug}_responses_{timestamp}.xlsx"
     else:
+        event = None
         form = get_object_or_404(Form, event__isnull=True, slug=form_slug)
         filename = f"{form.slug}_responses_{timestamp}.xlsx"
 
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    job = ExportJob.request(
+        user=request.user,
+        event=event,
+        exporter="forms.excel_export.export_responses",
+        parameters=dict(form_id=form.id),
+        filename=filename,
+    )
 
-    write_responses_as_excel(form.validated_fields, form.responses.all().only("form_data"), response)
-
-    return response
+    return redirect(job.get_absolute_url())
@@ -1,13 +1,12 @@
 from typing import Optional
 
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import get_object_or_404
+from django.http import HttpRequest
+from django.shortcuts import get_object_or_404, redirect
 from django.utils.timezone import now
 
 from access.cbac import default_cbac_required
-from core.models import Event
+from core.models import Event, ExportJob
 
-from ..excel_export import write_responses_as_excel
 from ..models.survey import Survey
 
 
@@ -24,16 +23,16 @@ def forms_survey_excel_export_view(
         survey = get_object_or_404(Survey, event=event, slug=survey_slug)
         filename = f"{event.slug}_{survey.slug}_responses_{timestamp}.xlsx"
     else:
+        event = None
         survey = get_object_or_404(Survey, event__isnull=True, slug=survey_slug)
         filename = f"{survey.slug}_responses_{timestamp}.xlsx"
 
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-    write_responses_as_excel(
-        survey.combined_fields,
-        survey.responses.order_by("created_at").only("form_data"),
-        response,
+    job = ExportJob.request(
+        user=request.user,
+        event=event,
+        exporter="forms.excel_export.export_responses",
+        parameters=dict(survey_id=survey.id),
+        filename=filename,
     )
 
-    return response
+    return redirect(job.get_absolute_url())
@@ -103,6 +103,8 @@ MIDDLEWARE = (
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "access.middleware.CBACCacheMiddleware",
+    "event_log.middleware.EventLogBufferMiddleware",
     "oauth2_provider.middleware.OAuth2TokenMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "core.middleware.PageWizardMiddleware",
@@ -414,6 +416,10 @@ CELERY_RESULT_SERIALIZER = "json"
 
 CELERY_REDIS_SOCKET_KEEPALIVE = True
 
+# Save event log entries in batches in a Celery worker instead of on the request path.
+# Has no effect when Celery is eager. See event_log.batch.
+KOMPASSI_EVENT_LOG_ASYNC_EMIT = env.bool("KOMPASSI_EVENT_LOG_ASYNC_EMIT", default=False)
+
 
 if "api" in INSTALLED_APPS:
     KOMPASSI_APPLICATION_USER_GROUP = f"{KOMPASSI_INSTALLATION_SLUG}-apps"
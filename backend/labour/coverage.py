@@ -0,0 +1,184 @@
+"""
+Coverage of job requirements by shifts as jobs × work hours matrices.
+
+A CoverageMatrix holds the required and allocated number of workers of each job for each work hour of the
+event. It is built from grouped requirement and shift rows in a fixed number of queries, and work hours are
+addressed by their offset from the beginning of work instead of looking datetimes up hour by hour.
+
+Used by the roster API for its per-hour arrays and by the staffing gaps report.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Count, QuerySet, Sum
+
+from core.utils import ONE_HOUR
+
+from .models import Job, JobRequirement, Shift
+
+
+@dataclass
+class StaffingRun:
+    """
+    Consecutive work hours of a job that are understaffed (a coverage gap) or overstaffed.
+    """
+
+    job: Job
+    start_time: datetime
+    hours: int
+    max_difference: int  # number of workers missing or in excess at the worst hour
+    worker_hours: int  # number of work hours missing or in excess in total
+
+    @property
+    def end_time(self):
+        return self.start_time + self.hours * ONE_HOUR
+
+
+@dataclass
+class ShiftOverlap:
+    person_id: int
+    shift_id: int
+    other_shift_id: int
+    start_time: datetime
+    end_time: datetime
+
+
+class CoverageMatrix:
+    def __init__(self, work_hours: list[datetime], jobs: list[Job]):
+        self.work_hours = work_hours
+        self.jobs = jobs
+        self.row_by_job_id = {job.id: row for row, job in enumerate(jobs)}
+        self.required = [[0] * len(work_hours) for _ in jobs]
+        self.allocated = [[0] * len(work_hours) for _ in jobs]
+
+    @classmethod
+    def for_jobs(cls, event, jobs: QuerySet[Job]) -> "CoverageMatrix":
+        matrix = cls(
+            event.labour_event_meta.work_hours,
+            list(jobs.select_related("job_category").order_by("job_category__name", "title")),
+        )
+
+        for job_id, start_time, count in (
+            JobRequirement.objects.filter(job__in=jobs)
+            .values("job_id", "start_time")
+            .annotate(sum_count=Sum("count"))
+            .values_list("job_id", "start_time", "sum_count")
+            .order_by()
+        ):
+            matrix.add(matrix.required, job_id, start_time, 1, count)
+
+        # shifts of the same job with the same start time and length are counted together in the database
+        for job_id, start_time, hours, num_shifts in (
+            Shift.objects.filter(job__in=jobs)
+            .values("job_id", "start_time", "hours")
+            .annotate(num_shifts=Count("id"))
+            .values_list("job_id", "start_time", "hours", "num_shifts")
+            .order_by()
+        ):
+            matrix.add(matrix.allocated, job_id, start_time, hours, num_shifts)
+
+        return matrix
+
+    @classmethod
+    def for_job_category(cls, job_category) -> "CoverageMatrix":
+        return cls.for_jobs(job_category.event, Job.objects.filter(job_category=job_category))
+
+    @classmethod
+    def for_event(cls, event) -> "CoverageMatrix":
+        return cls.for_jobs(event, Job.objects.filter(job_category__event=event))
+
+    def get_hour_index(self, t: datetime) -> int:
+        return (t - self.work_hours[0]) // ONE_HOUR if self.work_hours else 0
+
+    def add(self, matrix: list[list[int]], job_id: int, start_time: datetime, hours: int, count: int):
+        row = matrix[self.row_by_job_id[job_id]]
+        first_hour = self.get_hour_index(start_time)
+
+        # hours outside work_begins…work_ends are not shown in the roster
+        for i in range(max(first_hour, 0), min(first_hour + hours, len(row))):
+            row[i] += count
+
+    def get_required(self, job_id: int) -> list[int]:
+        return self.required[self.row_by_job_id[job_id]]
+
+    def get_allocated(self, job_id: int) -> list[int]:
+        return self.allocated[self.row_by_job_id[job_id]]
+
+    @property
+    def total_required(self) -> list[int]:
+        return [sum(column) for column in zip(*self.required)] if self.jobs else [0] * len(self.work_hours)
+
+    @property
+    def total_allocated(self) -> list[int]:
+        return [sum(column) for column in zip(*self.allocated)] if self.jobs else [0] * len(self.work_hours)
+
+    def get_runs(self, sign: int) -> list[StaffingRun]:
+        """
+        Returns the runs of consecutive hours where allocated - required has the given sign.
+        """
+        runs = []
+
+        for job, required, allocated in zip(self.jobs, self.required, self.allocated):
+            run = None
+
+            for i, (num_required, num_allocated) in enumerate(zip(required, allocated)):
+                difference = sign * (num_allocated - num_required)
+
+                if difference <= 0:
+                    run = None
+                elif run is None:
+                    run = StaffingRun(job, self.work_hours[i], 1, difference, difference)
+                    runs.append(run)
+                else:
+                    run.hours += 1
+                    run.max_difference = max(run.max_difference, difference)
+                    run.worker_hours += difference
+
+        return runs
+
+    def get_gaps(self) -> list[StaffingRun]:
+        return self.get_runs(-1)
+
+    def get_overstaffing(self) -> list[StaffingRun]:
+        return self.get_runs(1)
+
+
+def get_shift_overlaps(shifts: QuerySet[Shift]) -> list[ShiftOverlap]:
+    """
+    Returns the pairs of the given shifts that have the same person working at the same time.
+    """
+    return find_shift_overlaps(
+        shifts.values_list("id", "signup__person_id", "start_time", "hours").order_by("signup__person_id", "start_time")
+    )
+
+
+def find_shift_overlaps(rows: Iterable[tuple[int, int, datetime, int]]) -> list[ShiftOverlap]:
+    """
+    Takes (shift id, person id, start time, hours) rows ordered by person and start time.
+    """
+    overlaps = []
+    current_person_id = None
+    ongoing: list[tuple[int, datetime]] = []  # (shift id, end time) of the shifts of the person so far
+
+    for shift_id, person_id, start_time, hours in rows:
+        if person_id != current_person_id:
+            current_person_id = person_id
+            ongoing = []
+
+        end_time = start_time + hours * ONE_HOUR
+        ongoing = [
+            (other_shift_id, other_end_time)
+            for other_shift_id, other_end_time in ongoing
+            if other_end_time > start_time
+        ]
+
+        for other_shift_id, other_end_time in ongoing:
+            overlaps.append(
+                ShiftOverlap(person_id, other_shift_id, shift_id, start_time, min(end_time, other_end_time))
+            )
+
+        ongoing.append((shift_id, end_time))
+
+    return overlaps
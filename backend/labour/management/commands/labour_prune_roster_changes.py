@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from labour.models import RosterChange
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Delete roster changes older than the roster API keeps them for"
+
+    def handle(self, *args, **options):
+        num_deleted = RosterChange.prune()
+        logger.info("Deleted %d old roster changes", num_deleted)
@@ -0,0 +1,55 @@
+"""
+Progress of mass state changes of signups (see Signup.bulk_change_state).
+
+The state change itself is a single UPDATE, but the side effects (badges, groups, email aliases and messages)
+are applied in the background in chunks of MASS_STATE_CHANGE_BATCH_SIZE signups. The number of signups
+processed so far is kept in the cache per event so that the signups admin view can show it.
+"""
+
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+MASS_STATE_CHANGE_BATCH_SIZE = 50
+MASS_STATE_CHANGE_PROGRESS_TIMEOUT = 60 * 60
+
+
+class MassStateChangeProgress(NamedTuple):
+    num_done: int
+    num_total: int
+
+    @property
+    def is_finished(self):
+        return self.num_done >= self.num_total
+
+
+def get_progress_key(event_id: int, name: str) -> str:
+    return f"labour.mass_state_change:{event_id}:{name}"
+
+
+def start_progress(event_id: int, num_total: int):
+    cache.set_many(
+        {
+            get_progress_key(event_id, "done"): 0,
+            get_progress_key(event_id, "total"): num_total,
+        },
+        MASS_STATE_CHANGE_PROGRESS_TIMEOUT,
+    )
+
+
+def advance_progress(event_id: int, num_done: int):
+    try:
+        cache.incr(get_progress_key(event_id, "done"), num_done)
+    except ValueError:
+        # progress has expired or was never started
+        pass
+
+
+def get_progress(event_id: int) -> MassStateChangeProgress | None:
+    values = cache.get_many([get_progress_key(event_id, "done"), get_progress_key(event_id, "total")])
+    if len(values) < 2:
+        return None
+
+    return MassStateChangeProgress(
+        values[get_progress_key(event_id, "done")], values[get_progress_key(event_id, "total")]
+    )
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("labour", "0036_alter_survey_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RosterChange",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("job", "job"), ("shift", "shift"), ("person", "person")],
+                        max_length=7,
+                    ),
+                ),
+                ("object_id", models.IntegerField()),
+                (
+                    "job_category",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="labour.jobcategory",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "roster change",
+                "verbose_name_plural": "roster changes",
+                "indexes": [models.Index(fields=["job_category", "id"], name="labour_rosterchange_jc_id")],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def merge_duplicate_job_requirements(apps, schema_editor):
+    """
+    The roster shows the sum of the requirements of a job starting at the same time, so duplicates are merged
+    into the oldest of them with their counts added up.
+    """
+    JobRequirement = apps.get_model("labour", "JobRequirement")
+
+    duplicates = (
+        JobRequirement.objects.values("job_id", "start_time")
+        .annotate(num_requirements=models.Count("id"), first_id=models.Min("id"), sum_count=models.Sum("count"))
+        .filter(num_requirements__gt=1)
+        .order_by()
+    )
+
+    for duplicate in duplicates:
+        JobRequirement.objects.filter(id=duplicate["first_id"]).update(count=duplicate["sum_count"])
+        JobRequirement.objects.filter(job_id=duplicate["job_id"], start_time=duplicate["start_time"]).exclude(
+            id=duplicate["first_id"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("labour", "0037_rosterchange"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_job_requirements, migrations.RunPython.noop, elidable=True),
+        migrations.AddConstraint(
+            model_name="jobrequirement",
+            constraint=models.UniqueConstraint(
+                fields=("job", "start_time"), name="labour_jobrequirement_job_start_time"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_revisions(apps, schema_editor):
+    """
+    Revisions handed out so far were RosterChange ids, so they are kept as the revisions of the changes.
+    """
+    RosterChange = apps.get_model("labour", "RosterChange")
+    RosterRevision = apps.get_model("labour", "RosterRevision")
+
+    RosterChange.objects.update(revision=models.F("id"))
+    RosterRevision.objects.bulk_create(
+        [
+            RosterRevision(job_category_id=row["job_category_id"], revision=row["max_id"])
+            for row in RosterChange.objects.values("job_category_id").annotate(max_id=models.Max("id")).order_by()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("labour", "0038_jobrequirement_job_start_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RosterRevision",
+            fields=[
+                (
+                    "job_category",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="labour.jobcategory",
+                    ),
+                ),
+                ("revision", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "roster revision",
+                "verbose_name_plural": "roster revisions",
+            },
+        ),
+        migrations.AddField(
+            model_name="rosterchange",
+            name="revision",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_revisions, migrations.RunPython.noop, elidable=True),
+        migrations.RemoveIndex(
+            model_name="rosterchange",
+            name="labour_rosterchange_jc_id",
+        ),
+        migrations.AddIndex(
+            model_name="rosterchange",
+            index=models.Index(fields=["job_category", "revision"], name="labour_rosterchange_jc_rev"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("labour", "0039_rosterrevision"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rosterchange",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="rosterrevision",
+            name="pruned_revision",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="rosterchange",
+            index=models.Index(fields=["created_at"], name="labour_rosterchange_created"),
+        ),
+    ]
@@ -10,6 +10,9 @@ from .roster import (
     EditShiftRequest,
     Job,
     JobRequirement,
+    RosterChange,
+    RosterRevision,
+    SetJobRequirementsBatchRequest,
     SetJobRequirementsRequest,
     Shift,
     WorkPeriod,
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 # FIXME this shit must die
 
 SIGNUP_STATE_NAMES = dict(
@@ -135,3 +137,13 @@ SIGNUP_STATE_GROUPS = [
 ]
 
 JOB_TITLE_LENGTH = 63
+
+# Maximum number of ranges in one request to the batch job requirements API
+SET_REQUIREMENTS_MAX_RANGES = 1000
+
+# Job requirement rows are upserted this many at a time to keep the number of query parameters reasonable
+SET_REQUIREMENTS_BATCH_SIZE = 1000
+
+# Roster changes are kept this long for the roster API deltas. Clients that last synced before that get the
+# complete roster.
+ROSTER_CHANGE_RETENTION = timedelta(days=30)
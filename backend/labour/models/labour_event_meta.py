@@ -1,4 +1,5 @@
 from datetime import timedelta
+from functools import cached_property
 
 from django.conf import settings
 from django.db import models
@@ -225,7 +226,7 @@ class LabourEventMeta(ContactEmailMixin, EventMetaBase):
         except Signup.DoesNotExist:
             return Signup(person=person, event=self.event)
 
-    @property
+    @cached_property
     def work_hours(self):
         return full_hours_between(self.work_begins, self.work_ends)
 
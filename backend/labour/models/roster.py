@@ -1,15 +1,27 @@
 from collections import defaultdict, namedtuple
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from dateutil.parser import parse as parse_date
 from dateutil.tz import tzlocal
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
-from api.utils import JSONSchemaObject
+from api.utils import BadRequest, JSONSchemaObject
 from core.csv_export import CsvExportMixin
-from core.utils import NONUNIQUE_SLUG_FIELD_PARAMS, ONE_HOUR, format_interval, pick_attrs, slugify
+from core.utils import (
+    NONUNIQUE_SLUG_FIELD_PARAMS,
+    ONE_HOUR,
+    format_interval,
+    full_hours_between,
+    pick_attrs,
+    slugify,
+)
+
+from .constants import ROSTER_CHANGE_RETENTION, SET_REQUIREMENTS_BATCH_SIZE, SET_REQUIREMENTS_MAX_RANGES
 
 
 class WorkPeriod(models.Model):
@@ -126,9 +138,35 @@ class JobRequirement(models.Model):
 
         return super().save(*args, **kwargs)
 
+    @classmethod
+    def set_requirements(cls, job_category, counts: dict[tuple[int, datetime], int]):
+        """
+        Sets the required number of workers for the given (job id, start time) hours of the job category
+        with one upsert per SET_REQUIREMENTS_BATCH_SIZE hours. As bulk_create bypasses signals, the changed
+        jobs are recorded here.
+        """
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [
+                    cls(job_id=job_id, start_time=start_time, end_time=start_time + ONE_HOUR, count=count)
+                    for (job_id, start_time), count in counts.items()
+                ],
+                batch_size=SET_REQUIREMENTS_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["job", "start_time"],
+                update_fields=["count", "end_time"],
+            )
+            RosterChange.record(
+                job_category.id,
+                [(RosterChange.Kind.JOB, job_id) for job_id in sorted({job_id for job_id, _ in counts})],
+            )
+
     class Meta:
         verbose_name = _("job requirement")
         verbose_name_plural = _("job requirements")
+        constraints = [
+            models.UniqueConstraint(fields=["job", "start_time"], name="labour_jobrequirement_job_start_time"),
+        ]
 
 
 class Shift(models.Model, CsvExportMixin):
@@ -193,6 +231,8 @@ class Shift(models.Model, CsvExportMixin):
     admin_get_person.short_description = _("person")
     admin_get_person.admin_order_field = "signup__person"
 
+    csv_select_related = ("job__job_category", "signup__person")
+
     @classmethod
     def get_csv_fields(cls, event):
         from core.models import Person
@@ -242,6 +282,233 @@ class Shift(models.Model, CsvExportMixin):
         ordering = ("job", "start_time")
 
 
+class RosterRevision(models.Model):
+    """
+    Revision counter of the roster of a job category. Recording changes increments it under a row lock that is
+    held until the transaction commits, so revisions become visible in order and a client that has seen a
+    revision never misses a change with a lower one.
+
+    pruned_revision is the latest revision whose changes have been pruned (see RosterChange.prune). Deltas
+    since revisions older than that cannot be served.
+    """
+
+    job_category = models.OneToOneField(
+        "labour.JobCategory",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name="+",
+    )
+    revision = models.IntegerField(default=0)
+    pruned_revision = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("roster revision")
+        verbose_name_plural = _("roster revisions")
+
+    @classmethod
+    def increment(cls, job_category_id) -> int:
+        """
+        Returns the next revision of the roster of the job category. Must be called in a transaction.
+        """
+        revisions = cls.objects.filter(job_category_id=job_category_id)
+
+        if not revisions.update(revision=models.F("revision") + 1):
+            cls.objects.bulk_create([cls(job_category_id=job_category_id)], ignore_conflicts=True)
+            revisions.update(revision=models.F("revision") + 1)
+
+        return revisions.values_list("revision", flat=True).get()
+
+
+class RosterChange(models.Model):
+    """
+    Log of changed jobs, shifts and people in the roster of a job category, used by the roster API to send
+    only what has changed (see labour.roster_api). A changed object that no longer is in the roster has been
+    deleted.
+
+    Recorded by the signal receivers below, by saves of signups and signup extras and explicitly by bulk
+    operations that bypass signals.
+    """
+
+    # No database constraint as changes are recorded while a job category is being deleted along with its jobs.
+    job_category = models.ForeignKey(
+        "labour.JobCategory",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    revision = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Kind(models.TextChoices):
+        JOB = "job", _("job")
+        SHIFT = "shift", _("shift")
+        PERSON = "person", _("person")
+
+    kind = models.CharField(max_length=7, choices=Kind.choices)
+    object_id = models.IntegerField()
+
+    class Meta:
+        verbose_name = _("roster change")
+        verbose_name_plural = _("roster changes")
+        indexes = [
+            models.Index(fields=["job_category", "revision"], name="labour_rosterchange_jc_rev"),
+            models.Index(fields=["created_at"], name="labour_rosterchange_created"),
+        ]
+
+    @classmethod
+    def record(cls, job_category_id, changes):
+        """
+        Records (kind, object id) changes to the roster of the job category.
+        """
+        cls.record_many({job_category_id: changes})
+
+    @classmethod
+    def record_many(cls, changes_by_job_category_id):
+        """
+        Records (kind, object id) changes to the rosters of many job categories. The revisions are locked in
+        job category order to avoid deadlocks between transactions that change the same rosters.
+        """
+        with transaction.atomic():
+            for job_category_id in sorted(changes_by_job_category_id):
+                changes = [
+                    (kind, object_id)
+                    for kind, object_id in changes_by_job_category_id[job_category_id]
+                    if object_id is not None
+                ]
+                if not changes:
+                    continue
+
+                revision = RosterRevision.increment(job_category_id)
+                cls.objects.bulk_create(
+                    [
+                        cls(job_category_id=job_category_id, revision=revision, kind=kind, object_id=object_id)
+                        for kind, object_id in changes
+                    ]
+                )
+
+    @classmethod
+    def get_people_changes(cls, signups, changes_by_job_category_id=None):
+        """
+        Adds the people of the given signups as changed in the rosters of the job categories they are accepted
+        into. Their details (eg. assigned hours, shift wishes) are shown in all of those rosters.
+        """
+        from .signup import Signup
+
+        if changes_by_job_category_id is None:
+            changes_by_job_category_id = defaultdict(list)
+
+        for job_category_id, person_id in Signup.job_categories_accepted.through.objects.filter(
+            signup__in=signups
+        ).values_list("jobcategory_id", "signup__person_id"):
+            changes_by_job_category_id[job_category_id].append((cls.Kind.PERSON, person_id))
+
+        return changes_by_job_category_id
+
+    @classmethod
+    def record_people(cls, signups):
+        cls.record_many(cls.get_people_changes(signups))
+
+    @classmethod
+    def get_revisions(cls, job_category_id) -> tuple[int, int]:
+        """
+        Returns the current and the pruned revision of the roster of the job category.
+        """
+        return RosterRevision.objects.filter(job_category_id=job_category_id).values_list(
+            "revision", "pruned_revision"
+        ).first() or (0, 0)
+
+    @classmethod
+    def prune(cls, t=None) -> int:
+        """
+        Deletes changes recorded more than ROSTER_CHANGE_RETENTION ago. Returns the number of changes deleted.
+        """
+        if t is None:
+            t = now()
+
+        pruned_revisions = list(
+            cls.objects.filter(created_at__lt=t - ROSTER_CHANGE_RETENTION)
+            .values("job_category_id")
+            .annotate(max_revision=models.Max("revision"))
+            .values_list("job_category_id", "max_revision")
+            .order_by("job_category_id")
+        )
+
+        num_deleted = 0
+        for job_category_id, pruned_revision in pruned_revisions:
+            with transaction.atomic():
+                # under the same row lock as recording changes
+                RosterRevision.objects.filter(
+                    job_category_id=job_category_id,
+                    pruned_revision__lt=pruned_revision,
+                ).update(pruned_revision=pruned_revision)
+
+                num_deleted_for_job_category, unused = cls.objects.filter(
+                    job_category_id=job_category_id,
+                    revision__lte=pruned_revision,
+                ).delete()
+                num_deleted += num_deleted_for_job_category
+
+        return num_deleted
+
+
+@receiver(post_save, sender=Job)
+@receiver(post_delete, sender=Job)
+def job_changed(sender, instance: Job, **kwargs):
+    RosterChange.record(instance.job_category_id, [(RosterChange.Kind.JOB, instance.id)])
+
+
+@receiver(post_save, sender=JobRequirement)
+@receiver(post_delete, sender=JobRequirement)
+def job_requirement_changed(sender, instance: JobRequirement, **kwargs):
+    job_category_id = Job.objects.filter(id=instance.job_id).values_list("job_category_id", flat=True).first()
+    if job_category_id is not None:
+        RosterChange.record(job_category_id, [(RosterChange.Kind.JOB, instance.job_id)])
+
+
+def get_shift_roster_keys(shift_id):
+    """
+    Returns (job category id, job id, signup id) of the shift as currently stored in the database.
+    """
+    return Shift.objects.filter(id=shift_id).values_list("job__job_category_id", "job_id", "signup_id").first()
+
+
+@receiver(pre_save, sender=Shift)
+@receiver(pre_delete, sender=Shift)
+def shift_pre_change(sender, instance: Shift, **kwargs):
+    if instance.pk:
+        instance._roster_old_keys = get_shift_roster_keys(instance.pk)  # type: ignore
+
+
+@receiver(post_save, sender=Shift)
+@receiver(post_delete, sender=Shift)
+def shift_changed(sender, instance: Shift, signal, **kwargs):
+    from .signup import Signup
+
+    old_keys = getattr(instance, "_roster_old_keys", None)
+    new_keys = get_shift_roster_keys(instance.id) if signal is post_save else None
+
+    # a shift moved to another job or person changes both the old and the new ones
+    changes_by_job_category_id = defaultdict(list)
+    signup_ids = set()
+    for keys in {old_keys, new_keys}:
+        if keys is None:
+            continue
+
+        job_category_id, job_id, signup_id = keys
+        changes_by_job_category_id[job_category_id].extend(
+            [
+                (RosterChange.Kind.SHIFT, instance.id),
+                (RosterChange.Kind.JOB, job_id),
+            ]
+        )
+        signup_ids.add(signup_id)
+
+    # the assigned hours of the person are shown in all the job categories they are accepted into
+    RosterChange.get_people_changes(Signup.objects.filter(id__in=signup_ids), changes_by_job_category_id)
+    RosterChange.record_many(changes_by_job_category_id)
+
+
 SetJobRequirementsRequestBase = namedtuple("SetJobRequirementsRequest", "startTime hours required")
 
 
@@ -256,6 +523,74 @@ class SetJobRequirementsRequest(SetJobRequirementsRequestBase, JSONSchemaObject)
         required=list(SetJobRequirementsRequestBase._fields),
     )
 
+    def get_counts(self, job_category, job):
+        """
+        Returns (job id, start time) -> required for the hours of the request within the work hours of the event.
+        """
+        meta = job_category.event.labour_event_meta
+
+        start_time = parse_date(self.startTime)
+        end_time = start_time + timedelta(hours=self.hours - 1)  # -1 due to end parameter being inclusive
+
+        start_time = max(start_time, meta.work_begins)
+        end_time = min(end_time, meta.work_ends)
+
+        return {(job.id, hour): self.required for hour in full_hours_between(start_time, end_time)}
+
+
+SetJobRequirementsBatchRequestBase = namedtuple("SetJobRequirementsBatchRequest", "requirements")
+
+
+class SetJobRequirementsBatchRequest(SetJobRequirementsBatchRequestBase, JSONSchemaObject):
+    schema = dict(
+        type="object",
+        properties=dict(
+            requirements=dict(
+                type="array",
+                maxItems=SET_REQUIREMENTS_MAX_RANGES,
+                items=dict(
+                    type="object",
+                    properties=dict(
+                        job=dict(type="string", minLength=1),
+                        **SetJobRequirementsRequest.schema["properties"],
+                    ),
+                    required=["job", *SetJobRequirementsRequestBase._fields],
+                ),
+            ),
+        ),
+        required=["requirements"],
+    )
+
+    def get_counts(self, job_category):
+        """
+        Returns (job id, start time) -> required for all the requested ranges. Unlike the single range request,
+        ranges must lie within the work hours of the event. Later ranges override earlier ones.
+        """
+        meta = job_category.event.labour_event_meta
+        job_ids_by_slug = dict(
+            Job.objects.filter(
+                job_category=job_category,
+                slug__in={requirement["job"] for requirement in self.requirements},
+            ).values_list("slug", "id")
+        )
+
+        counts = {}
+        for requirement in self.requirements:
+            job_id = job_ids_by_slug.get(requirement["job"])
+            if job_id is None:
+                raise BadRequest(f"No such job: {requirement['job']}")
+
+            start_time = parse_date(requirement["startTime"])
+            end_time = start_time + timedelta(hours=requirement["hours"] - 1)  # inclusive
+
+            if start_time < meta.work_begins or end_time > meta.work_ends:
+                raise BadRequest(f"Requirements of {requirement['job']} outside work hours: {requirement['startTime']}")
+
+            for hour in full_hours_between(start_time, end_time):
+                counts[job_id, hour] = requirement["required"]
+
+        return counts
+
 
 EditJobRequestBase = namedtuple("EditJobRequest", "title")
 
@@ -1,18 +1,22 @@
-from collections import OrderedDict
+import logging
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass
 from functools import cached_property
 from typing import TYPE_CHECKING
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
 from core.csv_export import CsvExportMixin
 from core.utils import (
     alias_property,
-    ensure_user_group_membership,
+    ensure_user_group_ids,
     get_previous_and_next,
     time_bool_property,
 )
@@ -30,11 +34,15 @@ from .constants import (
     STATE_NAME_BY_FLAGS,
     STATE_TIME_FIELDS,
 )
+from .signup_extras import ObsoleteSignupExtraBaseV1
 
 if TYPE_CHECKING:
     from .roster import Shift
 
 
+logger = logging.getLogger("kompassi")
+
+
 @dataclass
 class StateTransition:
     """
@@ -112,6 +120,7 @@ class SignupMixin:
 
         else:
             from warnings import warn
+
             warn(f"Unknown state: {state}")
             labels = []
 
@@ -335,6 +344,40 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         SignupExtra = self.signup_extra_model
         return SignupExtra.for_signup(self) if SignupExtra else None
 
+    @classmethod
+    def prefetch_signup_extras(cls, event, signups: list["Signup"]):
+        """
+        Fills in signup_extra for signups of the event in one query instead of one per signup.
+        """
+        SignupExtra = event.labour_event_meta.signup_extra_model
+        if SignupExtra is None:
+            return
+
+        if issubclass(SignupExtra, ObsoleteSignupExtraBaseV1):
+            extras = SignupExtra.objects.filter(signup__in=signups)
+            extras_by_person_id = {extra.signup.person_id: extra for extra in extras.select_related("signup")}
+        else:
+            extras = SignupExtra.objects.filter(event=event, person_id__in=[signup.person_id for signup in signups])
+            extras_by_person_id = {extra.person_id: extra for extra in extras}
+
+        for signup in signups:
+            signup_extra = extras_by_person_id.get(signup.person_id)
+            if signup_extra is None:
+                # like SignupExtra.for_signup without the query
+                if issubclass(SignupExtra, ObsoleteSignupExtraBaseV1):
+                    signup_extra = SignupExtra(signup=signup)
+                else:
+                    signup_extra = SignupExtra(event=event, person=signup.person)
+
+            signup.signup_extra = signup_extra
+
+    @cached_property
+    def jv_kortti(self):
+        # XXX HACK jv-kortin numero
+        from labour_common_qualifications.models import JVKortti
+
+        return JVKortti.objects.filter(personqualification__person=self.person).first()
+
     def get_first_categories(self):
         return self.job_categories.all()[:NUM_FIRST_CATEGORIES]
 
@@ -459,12 +502,97 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         else:
             signups = filter_func(signups)
 
-        for signup in signups:
-            signup.state = new_state
-            signup.save()
-            signup.apply_state()
+        return cls.bulk_change_state(signups, old_state, new_state)
+
+    @classmethod
+    def bulk_change_state(cls, signups, old_state, new_state):
+        """
+        Moves the given signups that are in old_state into new_state with one UPDATE and applies the side
+        effects of the new state in chunks, in the background if possible. Returns the number of signups changed.
+        """
+        from ..mass_state_change import MASS_STATE_CHANGE_BATCH_SIZE, start_progress
+        from .roster import RosterChange
+
+        t = now()
+        changes = {}
+        for field_name, old_flag, new_flag in zip(
+            STATE_TIME_FIELDS,
+            STATE_FLAGS_BY_NAME[old_state],
+            STATE_FLAGS_BY_NAME[new_state],
+        ):
+            if old_flag == new_flag:
+                continue
+
+            if field_name == "created_at":
+                # is_active takes the place of created_at in the Grand Order
+                changes["is_active"] = new_flag
+            else:
+                changes[field_name] = t if new_flag else None
+
+        changes["updated_at"] = t
+
+        # signups may come filtered with joins and DISTINCT that do not mix with FOR UPDATE
+        candidate_ids = list(signups.values_list("id", flat=True))
+
+        with transaction.atomic():
+            signup_rows = list(
+                cls.objects.filter(id__in=candidate_ids, **cls.get_state_query_params(old_state))
+                .select_for_update()
+                .order_by("id")
+                .values_list("id", "event_id")
+            )
+            changed_signups = cls.objects.filter(id__in=[signup_id for signup_id, _event_id in signup_rows])
+            changed_signups.update(**changes)
+
+            # signals are not sent for the UPDATE (see signup_changed)
+            RosterChange.record_people(changed_signups)
+
+        signup_ids_by_event_id = defaultdict(list)
+        for signup_id, event_id in signup_rows:
+            signup_ids_by_event_id[event_id].append(signup_id)
+
+        for event_id, signup_ids in signup_ids_by_event_id.items():
+            start_progress(event_id, len(signup_ids))
+
+            for i in range(0, len(signup_ids), MASS_STATE_CHANGE_BATCH_SIZE):
+                batch = signup_ids[i : i + MASS_STATE_CHANGE_BATCH_SIZE]
+
+                if "background_tasks" in settings.INSTALLED_APPS:
+                    from ..tasks import signups_apply_state
+
+                    signups_apply_state.delay(batch)
+                else:
+                    cls.bulk_apply_state(batch)
+
+        logger.info("Signup.bulk_change_state: %s -> %s for %d signups", old_state, new_state, len(signup_rows))
+        return len(signup_rows)
+
+    @classmethod
+    def bulk_apply_state(cls, signup_ids):
+        """
+        Equivalent of apply_state() for many signups, except that messages are sent with one task per message
+        instead of one per signup.
+        """
+        from mailings.models import Message
+
+        from ..mass_state_change import advance_progress
 
-        return signups
+        people_by_event = defaultdict(list)
+
+        for signup in cls.objects.filter(id__in=signup_ids).select_related(
+            "event",
+            "event__labour_event_meta",
+            "person",
+            "person__user",
+        ):
+            signup.apply_state_sync()
+            signup.apply_state_group_membership()
+            signup.apply_state_email_aliases()
+            people_by_event[signup.event].append(signup.person)
+
+        for event, people in people_by_event.items():
+            Message.send_messages_to_many(event, "labour", people)
+            advance_progress(event.id, len(people))
 
     def apply_state(self):
         self.apply_state_sync()
@@ -490,40 +618,44 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         self.apply_state_send_messages()
 
     def apply_state_group_membership(self):
+        from django.contrib.auth.models import Group
+
         from .job_category import JobCategory
         from .personnel_class import PersonnelClass
 
-        groups_to_add = set()
-        groups_to_remove = set()
-
-        for group_suffix in SIGNUP_STATE_GROUPS:
-            should_belong_to_group = getattr(self, f"is_{group_suffix}")
-            group = self.event.labour_event_meta.get_group(group_suffix)
-
-            if should_belong_to_group:
-                groups_to_add.add(group)
-            else:
-                groups_to_remove.add(group)
+        meta = self.event.labour_event_meta
 
-        for job_category in JobCategory.objects.filter(event=self.event):
-            should_belong_to_group = self.job_categories_accepted.filter(pk=job_category.pk).exists()
-            group = self.event.labour_event_meta.get_group(job_category.slug)
+        # group suffix -> should belong to group
+        desired_membership = {group_suffix: getattr(self, f"is_{group_suffix}") for group_suffix in SIGNUP_STATE_GROUPS}
 
-            if should_belong_to_group:
-                groups_to_add.add(group)
-            else:
-                groups_to_remove.add(group)
+        job_category_ids_accepted = set(self.job_categories_accepted.values_list("id", flat=True))
+        for job_category_id, slug in JobCategory.objects.filter(event=self.event).values_list("id", "slug"):
+            desired_membership[slug] = job_category_id in job_category_ids_accepted
 
-        for personnel_class in PersonnelClass.objects.filter(event=self.event, app_label="labour"):
-            should_belong_to_group = self.personnel_classes.filter(pk=personnel_class.pk).exists()
-            group = self.event.labour_event_meta.get_group(personnel_class.slug)
+        personnel_class_ids = set(self.personnel_classes.values_list("id", flat=True))
+        for personnel_class_id, slug in PersonnelClass.objects.filter(
+            event=self.event,
+            app_label="labour",
+        ).values_list("id", "slug"):
+            desired_membership[slug] = personnel_class_id in personnel_class_ids
+
+        group_names = {suffix: meta.make_group_name(self.event, suffix) for suffix in desired_membership}
+        group_ids = dict(Group.objects.filter(name__in=group_names.values()).values_list("name", "id"))
+
+        group_ids_to_add = []
+        group_ids_to_remove = []
+        for suffix, should_belong_to_group in desired_membership.items():
+            group_id = group_ids.get(group_names[suffix])
+            if group_id is None:
+                logger.warning("Signup.apply_state_group_membership: group %s does not exist", group_names[suffix])
+                continue
 
             if should_belong_to_group:
-                groups_to_add.add(group)
+                group_ids_to_add.append(group_id)
             else:
-                groups_to_remove.add(group)
+                group_ids_to_remove.append(group_id)
 
-        ensure_user_group_membership(self.person.user, groups_to_add, groups_to_remove)
+        ensure_user_group_ids(self.person.user, group_ids_to_add, group_ids_to_remove)
 
     def apply_state_email_aliases(self):
         if "access" not in settings.INSTALLED_APPS:
@@ -773,6 +905,8 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
 
         return email_alias.email_address if email_alias else self.person.email
 
+    csv_select_related = ("person", "event__labour_event_meta")
+
     @classmethod
     def get_csv_fields(cls, event):
         if getattr(event, "_signup_csv_fields", None) is None:
@@ -823,6 +957,24 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
 
         return event._signup_csv_fields
 
+    @classmethod
+    def prepare_csv_related(cls, event, signups: list["Signup"]):
+        cls.prefetch_signup_extras(event, signups)
+
+        # XXX HACK jv-kortin numero
+        if "labour_common_qualifications" in settings.INSTALLED_APPS:
+            from labour_common_qualifications.models import JVKortti
+
+            jv_korttis_by_person_id = {
+                jv_kortti.personqualification.person_id: jv_kortti
+                for jv_kortti in JVKortti.objects.filter(
+                    personqualification__person_id__in=[signup.person_id for signup in signups]
+                ).select_related("personqualification")
+            }
+
+            for signup in signups:
+                signup.jv_kortti = jv_korttis_by_person_id.get(signup.person_id)
+
     def get_csv_related(self):
         from core.models import Person
 
@@ -836,11 +988,7 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         if "labour_common_qualifications" in settings.INSTALLED_APPS:
             from labour_common_qualifications.models import JVKortti
 
-            try:
-                jv_kortti = JVKortti.objects.get(personqualification__person=self.person)
-                related[JVKortti] = jv_kortti
-            except JVKortti.DoesNotExist:
-                related[JVKortti] = None
+            related[JVKortti] = self.jv_kortti
 
         return related
 
@@ -851,12 +999,17 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         total_work = signup_extra.total_work if signup_extra.get_field("total_work") else ""
         shift_type = signup_extra.get_shift_type_display() if signup_extra.get_field("shift_type") else ""
 
+        # the roster API annotates this to avoid a query per person
+        currently_assigned = getattr(self, "currently_assigned_hours", None)
+        if currently_assigned is None:
+            currently_assigned = self.shifts.all().aggregate(sum_hours=Coalesce(Sum("hours"), 0))["sum_hours"]
+
         return dict(
             id=self.person.id,
             fullName=self.person.full_name,
             shiftWishes=shift_wishes,
             totalWork=total_work,
-            currentlyAssigned=self.shifts.all().aggregate(sum_hours=Coalesce(Sum("hours"), 0))["sum_hours"],
+            currentlyAssigned=currently_assigned,
             shiftType=shift_type,
         )
 
@@ -866,3 +1019,32 @@ class Signup(CsvExportMixin, SignupMixin, models.Model):
         Surveys make use of this method.
         """
         return signup
+
+
+@receiver(post_save, sender=Signup)
+@receiver(pre_delete, sender=Signup)
+def signup_changed(sender, instance: Signup, **kwargs):
+    """
+    Cancelling, rejecting or deleting a signup removes the person from the rosters of their job categories.
+    """
+    from .roster import RosterChange
+
+    RosterChange.record_people([instance])
+
+
+@receiver(m2m_changed, sender=Signup.job_categories_accepted.through)
+def signup_job_categories_accepted_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Accepting a person into a job category or removing them from it changes the people of its roster.
+    """
+    from .roster import RosterChange
+
+    if reverse or action not in ("pre_clear", "post_add", "post_remove"):
+        return
+
+    if action == "pre_clear":
+        pk_set = set(instance.job_categories_accepted.values_list("id", flat=True))
+
+    RosterChange.record_many(
+        {job_category_id: [(RosterChange.Kind.PERSON, instance.person_id)] for job_category_id in pk_set or ()}
+    )
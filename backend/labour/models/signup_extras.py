@@ -59,6 +59,14 @@ class SignupExtraMixin:
         self.is_active = self.determine_is_active()
         self.save()
 
+    def save(self, *args, **kwargs):
+        from .roster import RosterChange
+
+        super().save(*args, **kwargs)
+
+        # shift wishes, total work and shift type are shown in the roster
+        RosterChange.record_people(self.get_signups())
+
     def __str__(self):
         return self.signup.__str__() if self.signup else "None"
 
@@ -116,6 +124,11 @@ class SignupExtraBase(SignupExtraMixin, models.Model):
             roles=self.discord_roles,
         )
 
+    def get_signups(self):
+        from .signup import Signup
+
+        return Signup.objects.filter(event_id=self.event_id, person_id=self.person_id)
+
     # NOTE: changing this to cached_property will break a test. beware
     @property
     def signup(self):
@@ -175,6 +188,11 @@ class ObsoleteSignupExtraBaseV1(SignupExtraMixin, models.Model):
     def determine_is_active(self):
         return self.signup.is_active
 
+    def get_signups(self):
+        from .signup import Signup
+
+        return Signup.objects.filter(id=self.signup_id)
+
     @property
     def event(self):
         return self.signup.event if self.signup is not None else None
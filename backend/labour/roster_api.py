@@ -0,0 +1,149 @@
+"""
+Roster API v2: the roster of a job category for the shift planner, in full or as a delta.
+
+The v1 roster API (JobCategory.as_roster_api_dict) rebuilds every job, shift and person of the job category
+with several queries per object. Here the roster is built in a fixed number of queries: per-hour requirement
+and allocation arrays come from a CoverageMatrix and the people are annotated with their assigned hours.
+
+Every change to a job, its requirements, a shift or the people accepted into the job category (including their
+signup, signup extra and assigned hours in any job category) is logged as a RosterChange. The response carries
+the revision of the roster (see RosterRevision). Passing it back as
+`since` returns only the jobs, shifts and people changed after it, along with the ids of those among them that
+are no longer in the roster. Changes are pruned after ROSTER_CHANGE_RETENTION (see
+`python manage.py labour_prune_roster_changes`), after which an old `since` gets the complete roster. The per-hour arrays of the job category and the ids of the shifts that overlap
+with another shift of the same person are always included as they are cheap.
+"""
+
+
+from dateutil.tz import tzlocal
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .coverage import CoverageMatrix, get_shift_overlaps
+from .models import RosterChange, Shift, Signup
+
+
+def get_changed_ids(job_category, since: int, revision: int) -> dict[str, set[int]]:
+    changed_ids = {kind: set() for kind in RosterChange.Kind.values}
+
+    for kind, object_id in RosterChange.objects.filter(
+        job_category=job_category,
+        revision__gt=since,
+        revision__lte=revision,
+    ).values_list("kind", "object_id"):
+        changed_ids[kind].add(object_id)
+
+    return changed_ids
+
+
+def shift_as_dict(shift_id, job_id, start_time, hours, person_id, notes, tz):
+    """
+    Same as Shift.as_dict, but from values_list rows.
+    """
+    return dict(
+        id=shift_id,
+        job=job_id,
+        startTime=start_time.astimezone(tz).isoformat() if start_time else None,
+        hours=hours,
+        person=person_id,
+        notes=notes,
+        state="planned",  # TODO
+    )
+
+
+def get_people(job_category, person_ids: set[int] | None = None) -> list[Signup]:
+    """
+    Returns the active signups accepted into the job category annotated with their assigned hours and with
+    their signup extras fetched in one query.
+    """
+    event = job_category.event
+
+    signups = (
+        job_category.accepted_signup_set.filter(is_active=True)
+        .annotate(currently_assigned_hours=Coalesce(Sum("shifts__hours"), 0))
+        .order_by("person__surname", "person__first_name")
+        .select_related("person", "event")
+    )
+    if person_ids is not None:
+        signups = signups.filter(person_id__in=person_ids)
+    signups = list(signups)
+
+    Signup.prefetch_signup_extras(event, signups)
+
+    return signups
+
+
+def get_roster(job_category, since: int | None = None) -> dict:
+    """
+    Returns the roster of the job category. If `since` is a revision previously returned, only the jobs,
+    shifts and people changed after it are included and those of them that no longer exist are listed in
+    `deleted`. Otherwise the complete roster is returned.
+    """
+    event = job_category.event
+    tz = tzlocal()
+
+    # read first so that changes made while the roster is being built are included in the next delta
+    revision, pruned_revision = RosterChange.get_revisions(job_category.id)
+
+    # changes since older revisions have been pruned, so those clients get the complete roster
+    if since and since >= pruned_revision:
+        changed_ids = get_changed_ids(job_category, since, revision)
+    else:
+        changed_ids = None
+
+    coverage = CoverageMatrix.for_job_category(job_category)
+
+    jobs = sorted(coverage.jobs, key=lambda job: job.id)
+    shifts = Shift.objects.filter(job__job_category=job_category).order_by("job_id", "start_time")
+    person_ids = None
+
+    if changed_ids is not None:
+        jobs = [job for job in jobs if job.id in changed_ids[RosterChange.Kind.JOB]]
+        shifts = shifts.filter(id__in=changed_ids[RosterChange.Kind.SHIFT])
+        person_ids = changed_ids[RosterChange.Kind.PERSON]
+
+    shifts = list(shifts.values_list("id", "job_id", "start_time", "hours", "signup__person_id", "notes"))
+    people = get_people(job_category, person_ids) if person_ids is None or person_ids else []
+
+    # a person may also be working in other job categories at the same time
+    overlaps = get_shift_overlaps(
+        Shift.objects.filter(
+            job__job_category__event=event,
+            signup__in=Signup.objects.filter(shifts__job__job_category=job_category),
+        )
+    )
+
+    doc = dict(
+        title=job_category.title,
+        slug=job_category.slug,
+        revision=revision,
+        since=since if changed_ids is not None else 0,
+        complete=changed_ids is None,
+        requirements=coverage.total_required,
+        allocated=coverage.total_allocated,
+        jobs=[
+            dict(
+                id=job.id,
+                slug=job.slug,
+                title=job.title,
+                requirements=coverage.get_required(job.id),
+                allocated=coverage.get_allocated(job.id),
+            )
+            for job in jobs
+        ],
+        shifts=[shift_as_dict(*row, tz=tz) for row in shifts],
+        people=[signup.as_dict() for signup in people],
+        overlappingShifts=sorted(
+            {shift_id for overlap in overlaps for shift_id in (overlap.shift_id, overlap.other_shift_id)}
+        ),
+        deleted=dict(jobs=[], shifts=[], people=[]),
+    )
+
+    if changed_ids is not None:
+        doc["deleted"] = dict(
+            jobs=sorted(changed_ids[RosterChange.Kind.JOB] - {job.id for job in jobs}),
+            shifts=sorted(changed_ids[RosterChange.Kind.SHIFT] - {row[0] for row in shifts}),
+            people=sorted(changed_ids[RosterChange.Kind.PERSON] - {signup.person_id for signup in people}),
+        )
+
+    return doc
@@ -9,6 +9,13 @@ def signup_apply_state(signup_pk):
     signup._apply_state()
 
 
+@shared_task(ignore_result=True)
+def signups_apply_state(signup_pks):
+    from .models import Signup
+
+    Signup.bulk_apply_state(signup_pks)
+
+
 @shared_task(ignore_result=True)
 def labour_event_meta_create_groups(meta_pk):
     from .models import LabourEventMeta
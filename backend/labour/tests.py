@@ -1,12 +1,30 @@
+from datetime import timedelta
 from io import BytesIO
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
 
 from access.models import CBACEntry
-from core.csv_export import export_csv
+from api.utils import BadRequest
+from core.csv_export import export_csv, get_m2m_choices, iter_export, iter_model_instances, iter_rows
 from core.models import Person
 
-from .models import JobCategory, LabourEventMeta, Qualification, Signup
+from .coverage import CoverageMatrix, find_shift_overlaps
+from .models import (
+    Job,
+    JobCategory,
+    JobRequirement,
+    LabourEventMeta,
+    Qualification,
+    RosterChange,
+    SetJobRequirementsBatchRequest,
+    Shift,
+    Signup,
+)
+from .models.constants import ROSTER_CHANGE_RETENTION
+from .roster_api import get_roster
 
 
 class LabourEventAdminTest(TestCase):
@@ -61,6 +79,32 @@ class SignupTest(TestCase):
         self.assertFalse(params["time_accepted__isnull"])
         self.assertTrue(params["time_finished__isnull"])
 
+    def test_mass_reject(self):
+        signup, unused = Signup.get_or_create_dummy()
+        signups = Signup.objects.filter(id=signup.id)
+
+        assert Signup.mass_reject(signups) == 1
+        assert Signup.mass_reject(signups) == 0
+
+        signup.refresh_from_db()
+        assert signup.state == "rejected"
+        assert signup.time_rejected is not None
+
+    def test_apply_state_group_membership(self):
+        signup, unused = Signup.get_or_create_dummy(accepted=True)
+        meta = signup.event.labour_event_meta
+        job_category = signup.job_categories_accepted.get()
+        user = signup.person.user
+
+        assert user.groups.filter(id=job_category.group.id).exists()
+        assert user.groups.filter(id=meta.get_group("accepted").id).exists()
+
+        signup.job_categories_accepted.clear()
+        signup.apply_state_group_membership()
+
+        assert not user.groups.filter(id=job_category.group.id).exists()
+        assert user.groups.filter(id=meta.get_group("accepted").id).exists()
+
 
 class JobCategoryTestCase(TestCase):
     def test_group(self):
@@ -82,6 +126,158 @@ class JobCategoryTestCase(TestCase):
         assert rg.verbose_name == jc.name
 
 
+class RosterApiTestCase(TestCase):
+    def test_roster_delta(self):
+        signup, unused = Signup.get_or_create_dummy(accepted=True)
+        job_category = signup.job_categories_accepted.get()
+        first_hour = signup.event.labour_event_meta.work_hours[0]
+
+        job = Job.objects.create(job_category=job_category, title="Dummy job")
+        JobRequirement.objects.create(job=job, start_time=first_hour, count=2)
+        shift = Shift.objects.create(job=job, signup=signup, start_time=first_hour, hours=2)
+
+        roster = get_roster(job_category)
+        v1_roster = job_category.as_dict(include_jobs=True, include_requirements=True, include_people=True)
+
+        assert roster["complete"]
+        assert roster["requirements"] == v1_roster["requirements"]
+        assert roster["allocated"] == v1_roster["allocated"]
+        assert roster["allocated"][:3] == [1, 1, 0]
+        assert roster["jobs"][0]["requirements"] == v1_roster["jobs"][0]["requirements"]
+        assert roster["people"] == v1_roster["people"]
+        assert [s["id"] for s in roster["shifts"]] == [shift.id]
+
+        delta = get_roster(job_category, roster["revision"])
+        assert not delta["complete"]
+        assert delta["jobs"] == delta["shifts"] == delta["people"] == []
+
+        shift.delete()
+
+        delta = get_roster(job_category, roster["revision"])
+        assert delta["revision"] > roster["revision"]
+        assert delta["shifts"] == []
+        assert delta["deleted"]["shifts"] == [shift.id]
+        assert [j["id"] for j in delta["jobs"]] == [job.id]
+        assert delta["jobs"][0]["allocated"][:3] == [0, 0, 0]
+        assert delta["people"][0]["currentlyAssigned"] == 0
+
+    def test_prune_roster_changes(self):
+        job_category, unused = JobCategory.get_or_create_dummy()
+        Job.objects.create(job_category=job_category, title="Dummy job 1")
+        old_revision = get_roster(job_category)["revision"]
+        Job.objects.create(job_category=job_category, title="Dummy job 2")
+        revision = get_roster(job_category)["revision"]
+
+        assert RosterChange.prune() == 0
+        assert RosterChange.prune(t=now() + ROSTER_CHANGE_RETENTION + timedelta(minutes=1)) > 0
+        assert not RosterChange.objects.filter(job_category=job_category).exists()
+
+        # a client that has not seen every pruned change gets the complete roster
+        roster = get_roster(job_category, old_revision)
+        assert roster["complete"]
+        assert len(roster["jobs"]) == Job.objects.filter(job_category=job_category).count()
+
+        # one that has seen them still gets a delta
+        delta = get_roster(job_category, revision)
+        assert not delta["complete"]
+        assert delta["jobs"] == []
+
+    def test_person_changes(self):
+        signup, unused = Signup.get_or_create_dummy(accepted=True)
+        job_category = signup.job_categories_accepted.get()
+        other_job_category, unused = JobCategory.get_or_create_dummy(name="Other job category")
+        first_hour = signup.event.labour_event_meta.work_hours[0]
+        revision = get_roster(job_category)["revision"]
+
+        # a shift in another job category changes the assigned hours shown in this one
+        other_job = Job.objects.create(job_category=other_job_category, title="Other job")
+        Shift.objects.create(job=other_job, signup=signup, start_time=first_hour, hours=2)
+
+        delta = get_roster(job_category, revision)
+        assert delta["revision"] > revision
+        assert [person["currentlyAssigned"] for person in delta["people"]] == [2]
+
+        # the person drops out of the roster when their signup is no longer active
+        signup.is_active = False
+        signup.save()
+
+        delta = get_roster(job_category, delta["revision"])
+        assert delta["people"] == []
+        assert delta["deleted"]["people"] == [signup.person.id]
+
+    def test_set_requirements_batch(self):
+        job_category, unused = JobCategory.get_or_create_dummy()
+        work_hours = job_category.event.labour_event_meta.work_hours
+        job1 = Job.objects.create(job_category=job_category, title="Dummy job 1")
+        job2 = Job.objects.create(job_category=job_category, title="Dummy job 2")
+        JobRequirement.objects.create(job=job1, start_time=work_hours[0], count=5)
+        revision = get_roster(job_category)["revision"]
+
+        body = SetJobRequirementsBatchRequest.from_dict(
+            dict(
+                requirements=[
+                    dict(job=job1.slug, startTime=work_hours[0].isoformat(), hours=3, required=2),
+                    dict(job=job2.slug, startTime=work_hours[1].isoformat(), hours=2, required=1),
+                    dict(job=job2.slug, startTime=work_hours[2].isoformat(), hours=1, required=3),
+                ]
+            )
+        )
+        JobRequirement.set_requirements(job_category, body.get_counts(job_category))
+
+        assert JobRequirement.objects.filter(job=job1).count() == 3
+        roster = get_roster(job_category, revision)
+        assert [job["id"] for job in roster["jobs"]] == [job1.id, job2.id]
+        assert roster["jobs"][0]["requirements"][:4] == [2, 2, 2, 0]
+        assert roster["jobs"][1]["requirements"][:4] == [0, 1, 3, 0]
+
+        body = SetJobRequirementsBatchRequest.from_dict(
+            dict(requirements=[dict(job=job1.slug, startTime=work_hours[-1].isoformat(), hours=2, required=1)])
+        )
+        with self.assertRaises(BadRequest):
+            body.get_counts(job_category)
+
+
+class CoverageTestCase(TestCase):
+    def test_coverage_matrix(self):
+        signup, unused = Signup.get_or_create_dummy(accepted=True)
+        job_category = signup.job_categories_accepted.get()
+        work_hours = signup.event.labour_event_meta.work_hours
+
+        job = Job.objects.create(job_category=job_category, title="Dummy job")
+        for hour in work_hours[:3]:
+            JobRequirement.objects.create(job=job, start_time=hour, count=1)
+        Shift.objects.create(job=job, signup=signup, start_time=work_hours[1], hours=3)
+
+        coverage = CoverageMatrix.for_event(signup.event)
+
+        assert coverage.get_required(job.id)[:5] == [1, 1, 1, 0, 0]
+        assert coverage.get_allocated(job.id)[:5] == [0, 1, 1, 1, 0]
+
+        (gap,) = coverage.get_gaps()
+        assert (gap.start_time, gap.hours, gap.worker_hours) == (work_hours[0], 1, 1)
+
+        (overstaffing,) = coverage.get_overstaffing()
+        assert (overstaffing.start_time, overstaffing.hours, overstaffing.worker_hours) == (work_hours[3], 1, 1)
+
+    def test_find_shift_overlaps(self):
+        meta, unused = LabourEventMeta.get_or_create_dummy()
+        work_hours = meta.work_hours
+
+        # (shift id, person id, start time, hours)
+        overlaps = find_shift_overlaps(
+            [
+                (1, 1, work_hours[0], 4),
+                (2, 1, work_hours[2], 4),
+                (3, 1, work_hours[8], 1),
+                (4, 2, work_hours[0], 4),
+            ]
+        )
+
+        assert [(overlap.shift_id, overlap.other_shift_id) for overlap in overlaps] == [(1, 2)]
+        assert overlaps[0].start_time == work_hours[2]
+        assert overlaps[0].end_time == work_hours[4]
+
+
 class ExcelExportTestCase(TestCase):
     def test_labour_excel_export(self):
         signup, exists = Signup.get_or_create_dummy()
@@ -89,3 +285,59 @@ class ExcelExportTestCase(TestCase):
 
         with BytesIO() as output_file:
             export_csv(signup.event, Signup, signups, output_file, m2m_mode="separate_columns", dialect="xlsx")
+
+    def test_labour_streaming_export(self):
+        signup, exists = Signup.get_or_create_dummy()
+        signups = Signup.objects.filter(id=signup.id)
+
+        with BytesIO() as output_file:
+            export_csv(signup.event, Signup, signups, output_file, m2m_mode="separate_columns", dialect="excel-tab")
+            assert b"".join(iter_export(signup.event, Signup, signups, dialect="excel-tab")) == output_file.getvalue()
+
+        xlsx = b"".join(iter_export(signup.event, Signup, signups, dialect="xlsx"))
+        assert xlsx.startswith(b"PK")
+
+    def test_m2m_index(self):
+        signup, exists = Signup.get_or_create_dummy(accepted=True)
+        fields = Signup.get_csv_fields(signup.event)
+
+        expected_row = signup.get_csv_row(signup.event, fields, "separate_columns")
+        (actual_row,) = iter_rows(signup.event, fields, [signup], "separate_columns")
+
+        assert True in actual_row
+        assert actual_row == expected_row
+
+    def test_export_query_count(self):
+        signup, unused = Signup.get_or_create_dummy(accepted=True)
+        event = signup.event
+        fields = Signup.get_csv_fields(event)
+
+        def export():
+            signups = Signup.objects.filter(event=event)
+            with CaptureQueriesContext(connection) as queries:
+                rows = list(iter_rows(event, fields, iter_model_instances(Signup, signups), "separate_columns"))
+            return len(rows), len(queries)
+
+        export()  # warm up the m2m choices cache
+        num_rows, num_queries = export()
+        assert num_rows == 1
+
+        other_person = Person.objects.create(first_name="Other", surname="Person")
+        other_signup = Signup.objects.create(person=other_person, event=event)
+        other_signup.job_categories.set(signup.job_categories.all())
+
+        assert export() == (2, num_queries)
+
+    def test_m2m_choices_invalidation(self):
+        signup, exists = Signup.get_or_create_dummy()
+        field = Signup._meta.get_field("job_categories")
+
+        choices = get_m2m_choices(signup.event, field)
+        assert get_m2m_choices(signup.event, field) is choices
+
+        job_category, created = JobCategory.get_or_create_dummy(name="Another job category")
+        assert created
+
+        new_choices = get_m2m_choices(signup.event, field)
+        assert len(new_choices) == len(choices) + 1
+        assert new_choices[-1].label == str(job_category)
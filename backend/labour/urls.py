@@ -13,12 +13,15 @@ from .views import (
     admin_signup_view,
     admin_signups_view,
     admin_special_diets_view,
+    admin_staffing_gaps_view,
     admin_startstop_view,
     api_job_categories_view,
     api_job_category_view,
     api_job_view,
+    api_set_job_requirements_batch_view,
     api_set_job_requirements_view,
     api_shift_view,
+    api_v2_roster_view,
     confirm_view,
     person_disqualify_view,
     person_qualification_view,
@@ -134,6 +137,11 @@ urlpatterns = [
         admin_special_diets_view,
         name="admin_special_diets_view",
     ),
+    re_path(
+        r"^events/(?P<event_slug>[a-z0-9-]+)/labour/admin/staffinggaps/?$",
+        admin_staffing_gaps_view,
+        name="admin_staffing_gaps_view",
+    ),
     re_path(
         r"^api/v1/events/(?P<event_slug>[a-z0-9-]+)/jobcategories/?$",
         api_job_categories_view,
@@ -159,6 +167,11 @@ urlpatterns = [
         api_set_job_requirements_view,
         name="api_set_job_requirements_view",
     ),
+    re_path(
+        r"^api/v1/events/(?P<event_slug>[a-z0-9-]+)/jobcategories/(?P<job_category_slug>[a-z0-9-]+)/requirements/?$",
+        api_set_job_requirements_batch_view,
+        name="api_set_job_requirements_batch_view",
+    ),
     re_path(
         r"^api/v1/events/(?P<event_slug>[a-z0-9-]+)/jobcategories/(?P<job_category_slug>[a-z0-9-]+)/shifts/?$",
         api_shift_view,
@@ -169,4 +182,9 @@ urlpatterns = [
         api_shift_view,
         name="api_edit_shift_view",
     ),
+    re_path(
+        r"^api/v2/events/(?P<event_slug>[a-z0-9-]+)/jobcategories/(?P<job_category_slug>[a-z0-9-]+)/roster/?$",
+        api_v2_roster_view,
+        name="api_v2_roster_view",
+    ),
 ]
@@ -7,6 +7,7 @@ from .admin_shirts_view import admin_shirts_view
 from .admin_signup_view import admin_signup_view
 from .admin_signups_view import admin_signups_view
 from .admin_special_diets_view import admin_special_diets_view
+from .admin_staffing_gaps_view import admin_staffing_gaps_view
 from .admin_startstop_view import admin_startstop_view
 from .admin_views import (
     admin_dashboard_view,
@@ -17,8 +18,10 @@ from .api_views import (
     api_job_categories_view,
     api_job_category_view,
     api_job_view,
+    api_set_job_requirements_batch_view,
     api_set_job_requirements_view,
     api_shift_view,
+    api_v2_roster_view,
 )
 from .public_views import (
     confirm_view,
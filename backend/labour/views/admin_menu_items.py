@@ -25,6 +25,10 @@ def labour_admin_menu_items(request, event):
     shifts_active = request.path.startswith(shifts_url)
     shifts_text = _("Shift lists")
 
+    staffing_gaps_url = url("labour:admin_staffing_gaps_view", event.slug)
+    staffing_gaps_active = request.path == staffing_gaps_url
+    staffing_gaps_text = _("Staffing gaps")
+
     jobcategories_url = url("labour:admin_jobcategories_view", event.slug)
     jobcategories_active = request.path.startswith(jobcategories_url)
     jobcategories_text = _("Edit job categories")
@@ -48,6 +52,7 @@ def labour_admin_menu_items(request, event):
             href=shifts_url,
             text=shifts_text,
         ),
+        (staffing_gaps_active, staffing_gaps_url, staffing_gaps_text),
         (jobcategories_active, jobcategories_url, jobcategories_text),
         (startstop_active, startstop_url, startstop_text),
     ]
@@ -2,7 +2,7 @@ from django.shortcuts import render
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
-from core.csv_export import CSV_EXPORT_FORMATS, EXPORT_FORMATS, ExportFormat, csv_response
+from core.csv_export import CSV_EXPORT_FORMATS, EXPORT_FORMATS, ExportFormat, streaming_csv_response
 from core.sort_and_filter import Filter, Sorter
 
 from ..helpers import labour_admin_required
@@ -96,7 +96,7 @@ def admin_shifts_view(request, vars, event, format="screen"):
     elif format in CSV_EXPORT_FORMATS:
         filename = f"{event.slug}_shifts_{t.strftime('%Y%m%d%H%M%S')}.{format}"
 
-        return csv_response(
+        return streaming_csv_response(
             event,
             Shift,
             shifts,
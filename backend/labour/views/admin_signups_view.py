@@ -6,12 +6,14 @@ from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_http_methods
 
-from core.csv_export import CSV_EXPORT_FORMATS, EXPORT_FORMATS, csv_response
+from core.csv_export import CSV_EXPORT_FORMATS, EXPORT_FORMATS, get_model_export_parameters
+from core.models import ExportJob
 from core.sort_and_filter import Filter, Sorter
 from event_log.utils import emit
 
 from ..filters import SignupStateFilter
 from ..helpers import labour_admin_required
+from ..mass_state_change import get_progress as get_mass_state_change_progress
 from ..models import ArchivedSignup, Signup
 from ..proxies.signup.certificate import SignupCertificateProxy
 
@@ -108,14 +110,18 @@ def admin_signups_view(request, vars, event, format="screen"):
     if request.method == "POST" and not archive_mode:
         action = request.POST.get("action", None)
         if action == "reject":
-            SignupClass.mass_reject(signups)
+            num_changed = SignupClass.mass_reject(signups)
         elif action == "request_confirmation":
-            SignupClass.mass_request_confirmation(signups)
+            num_changed = SignupClass.mass_request_confirmation(signups)
         elif action == "send_shifts":
-            SignupClass.mass_send_shifts(signups)
+            num_changed = SignupClass.mass_send_shifts(signups)
         else:
+            num_changed = None
             messages.error(request, "Ei semmosta toimintoa oo.")
 
+        if num_changed is not None:
+            messages.success(request, f"Massatoiminto kohdistui {num_changed} henkilöön.")
+
         return redirect("labour:admin_signups_view", event.slug)
 
     elif format in HTML_TEMPLATES:
@@ -168,6 +174,7 @@ def admin_signups_view(request, vars, event, format="screen"):
             job_category_accepted_filters=job_category_accepted_filters,
             job_category_filters=job_category_filters if not archive_mode else None,
             mass_operations=mass_operations,
+            mass_state_change_progress=get_mass_state_change_progress(event.id) if not archive_mode else None,
             night_work_filter=night_work_filter,
             num_all_signups=num_all_signups,
             num_signups=signups.count(),
@@ -187,13 +194,15 @@ def admin_signups_view(request, vars, event, format="screen"):
 
         emit("core.person.exported", request=request, event=event)
 
-        return csv_response(
-            event,
-            SignupClass,
-            signups,
-            dialect=CSV_EXPORT_FORMATS[format],
+        job = ExportJob.request(
+            user=request.user,
+            event=event,
+            exporter="core.csv_export.export_model_instances",
+            parameters=get_model_export_parameters(SignupClass, signups, m2m_mode="separate_columns"),
             filename=filename,
-            m2m_mode="separate_columns",
+            format=format,
         )
+
+        return redirect(job.get_absolute_url())
     else:
         raise NotImplementedError(format)
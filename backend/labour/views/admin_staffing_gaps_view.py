@@ -0,0 +1,26 @@
+from django.shortcuts import render
+
+from ..coverage import CoverageMatrix, get_shift_overlaps
+from ..helpers import labour_admin_required
+from ..models import Shift
+
+
+@labour_admin_required
+def admin_staffing_gaps_view(request, vars, event):
+    coverage = CoverageMatrix.for_event(event)
+    overlaps = get_shift_overlaps(Shift.objects.filter(job__job_category__event=event))
+
+    overlapping_shift_ids = {
+        shift_id for overlap in overlaps for shift_id in (overlap.shift_id, overlap.other_shift_id)
+    }
+    shifts_by_id = Shift.objects.filter(id__in=overlapping_shift_ids).select_related("job", "signup__person").in_bulk()
+
+    vars.update(
+        gaps=coverage.get_gaps(),
+        overstaffing=coverage.get_overstaffing(),
+        overlaps=[
+            (shifts_by_id[overlap.shift_id], shifts_by_id[overlap.other_shift_id], overlap) for overlap in overlaps
+        ],
+    )
+
+    return render(request, "labour_admin_staffing_gaps_view.pug", vars)
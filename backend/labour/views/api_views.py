@@ -1,12 +1,9 @@
 import logging
-from datetime import timedelta
 
-from dateutil.parser import parse as parse_datetime
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_POST, require_safe
 
 from api.utils import MethodNotAllowed, api_view
-from core.utils import full_hours_between
 
 from ..helpers import labour_admin_required
 from ..models import (
@@ -15,13 +12,32 @@ from ..models import (
     Job,
     JobCategory,
     JobRequirement,
+    SetJobRequirementsBatchRequest,
     SetJobRequirementsRequest,
     Shift,
 )
+from ..roster_api import get_roster
 
 logger = logging.getLogger("kompassi")
 
 
+def get_since(request) -> int | None:
+    since = request.GET.get("since")
+    return int(since) if since and since.isdigit() else None
+
+
+def roster_response(request, job_category):
+    """
+    The mutation views return the whole v1 roster, or the v2 roster delta if the revision of the roster
+    the client has is given as `?since=`.
+    """
+    since = get_since(request)
+    if since is None:
+        return job_category.as_roster_api_dict()
+
+    return get_roster(job_category, since)
+
+
 @labour_admin_required
 @require_safe
 @api_view
@@ -54,14 +70,14 @@ def api_job_view(request, vars, event, job_category_slug, job_slug=None):
     elif request.method == "DELETE" and job_slug is not None:
         job = get_object_or_404(Job, job_category=job_category, slug=job_slug)
         job.delete()
-        return job_category.as_roster_api_dict()
+        return roster_response(request, job_category)
     else:
         raise MethodNotAllowed(request.method)
 
     job.title = body.title
     job.save()
 
-    return job_category.as_roster_api_dict()
+    return roster_response(request, job_category)
 
 
 @labour_admin_required
@@ -78,14 +94,14 @@ def api_shift_view(request, vars, event, job_category_slug, shift_id=None):
     elif request.method == "DELETE" and shift_id is not None:
         shift = get_object_or_404(Shift, id=int(shift_id), job__job_category=job_category)
         shift.delete()
-        return job_category.as_roster_api_dict()
+        return roster_response(request, job_category)
     else:
         raise MethodNotAllowed(request.method)
 
     edit_shift_request.update(job_category, shift)
     shift.save()
 
-    return job_category.as_roster_api_dict()
+    return roster_response(request, job_category)
 
 
 @labour_admin_required
@@ -96,25 +112,31 @@ def api_set_job_requirements_view(request, vars, event, job_category_slug, job_s
     job = get_object_or_404(Job, job_category=job_category, slug=job_slug)
 
     body = SetJobRequirementsRequest.from_json(request.body)
+    JobRequirement.set_requirements(job_category, body.get_counts(job_category, job))
+
+    # Successful result emulates that of /api/v1/events/tracon11/jobcategories/conitea
+    return roster_response(request, job_category)
 
-    start_time = parse_datetime(body.startTime)
-    end_time = start_time + timedelta(hours=body.hours - 1)  # -1 due to end parameter being inclusive
 
-    start_time = max(start_time, event.labour_event_meta.work_begins)
-    end_time = min(end_time, event.labour_event_meta.work_ends)
+@labour_admin_required
+@require_safe
+@api_view
+def api_v2_roster_view(request, vars, event, job_category_slug):
+    job_category = get_object_or_404(JobCategory, event=event, slug=job_category_slug)
+    return get_roster(job_category, get_since(request))
+
 
-    for hour in full_hours_between(start_time, end_time):  # start/end inclusive
-        requirement, created = JobRequirement.objects.get_or_create(
-            job=job,
-            start_time=hour,
-            defaults=dict(
-                count=body.required,
-            ),
-        )
+@labour_admin_required
+@require_POST
+@api_view
+def api_set_job_requirements_batch_view(request, vars, event, job_category_slug):
+    """
+    Sets the requirements of many jobs over many ranges of hours at once. Takes
+    {"requirements": [{"job": slug, "startTime": ..., "hours": ..., "required": ...}, ...]}.
+    """
+    job_category = get_object_or_404(JobCategory, event=event, slug=job_category_slug)
 
-        if not created:
-            requirement.count = body.required
-            requirement.save()
+    body = SetJobRequirementsBatchRequest.from_json(request.body)
+    JobRequirement.set_requirements(job_category, body.get_counts(job_category))
 
-    # Successful result emulates that of /api/v1/events/tracon11/jobcategories/conitea
-    return job_category.as_roster_api_dict()
+    return roster_response(request, job_category)
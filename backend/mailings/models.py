@@ -1,4 +1,5 @@
 import logging
+from collections import defaultdict
 from datetime import datetime
 from hashlib import sha1
 
@@ -201,6 +202,29 @@ class Message(models.Model):
                 resend=False,
             )
 
+    @classmethod
+    def send_messages_to_many(cls, event, app_label, people):
+        """
+        Equivalent of calling send_messages for each of the people, but with one send task per message.
+        """
+        people_by_id = {person.id: person for person in people}
+        recipient_ids_by_message_id = defaultdict(list)
+
+        for message_id, person_id in Message.objects.filter(
+            recipient__app_label=app_label,
+            recipient__event=event,
+            recipient__group__user__person__in=people_by_id.keys(),
+            sent_at__isnull=False,
+            expired_at__isnull=True,
+        ).values_list("id", "recipient__group__user__person"):
+            recipient_ids_by_message_id[message_id].append(person_id)
+
+        for message in Message.objects.filter(id__in=recipient_ids_by_message_id.keys()):
+            message.send(
+                recipients=[people_by_id[person_id] for person_id in recipient_ids_by_message_id[message.id]],
+                resend=False,
+            )
+
     @property
     def event(self):
         return self.recipient.event
@@ -141,6 +141,8 @@ class Membership(models.Model, CsvExportMixin):
             person=self.person.official_name if self.person else None,
         )
 
+    csv_select_related = ("person",)
+
     @classmethod
     def get_csv_fields(cls, unused_organization):
         return [
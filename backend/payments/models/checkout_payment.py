@@ -340,21 +340,27 @@ class CheckoutPayment(models.Model):
     def get_payments_by_payment_method(cls, event):
         results: dict[str, PaymentsByPaymentMethod] = dict()
 
-        for payment in cls.objects.filter(event=event):
-            result = results.setdefault(payment.provider, PaymentsByPaymentMethod(provider=payment.provider))
-
-            if payment.status == "new":
-                result.num_new += 1
-            elif payment.status == "ok":
-                result.num_ok += 1
-            elif payment.status == "pending":
-                result.num_pending += 1
-            elif payment.status == "fail":
-                result.num_fail += 1
-            elif payment.status == "delayed":
-                result.num_delayed += 1
+        for provider, status, count in (
+            cls.objects.filter(event=event)
+            .values("provider", "status")
+            .annotate(count=models.Count("id"))
+            .order_by()
+            .values_list("provider", "status", "count")
+        ):
+            result = results.setdefault(provider, PaymentsByPaymentMethod(provider=provider))
+
+            if status == "new":
+                result.num_new += count
+            elif status == "ok":
+                result.num_ok += count
+            elif status == "pending":
+                result.num_pending += count
+            elif status == "fail":
+                result.num_fail += count
+            elif status == "delayed":
+                result.num_delayed += count
             else:
-                raise NotImplementedError(payment.status)
+                raise NotImplementedError(status)
 
         total_row = PaymentsByPaymentMethod(provider="Total")
         for result in results.values():
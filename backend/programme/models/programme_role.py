@@ -96,6 +96,8 @@ class ProgrammeRole(models.Model, CsvExportMixin):
         else:
             return self.programme.get_state_display()
 
+    csv_select_related = ("person", "programme__form_used", "role")
+
     @classmethod
     def get_csv_fields(cls, event):
         from core.models import Person
@@ -7,6 +7,8 @@ class PaikkalaTicketCsvExportProxy(CsvExportMixin, Ticket):
     class Meta:
         proxy = True
 
+    csv_select_related = ("zone", "row", "user__person")
+
     @classmethod
     def get_csv_fields(cls, event):
         from core.models import Person
@@ -40,6 +40,7 @@ class LimitGroupAdmin(admin.ModelAdmin):
     )
 
     list_filter = ("event",)
+    list_select_related = ("sales_counter",)
 
 
 class CustomerInline(admin.StackedInline):
@@ -50,8 +51,17 @@ class OrderProductInline(admin.TabularInline):
     model = OrderProduct
 
 
+def confirm_payment_of_selected_orders(modeladmin, request, queryset):
+    num_orders = Order.bulk_confirm_payment(queryset)
+    modeladmin.message_user(request, f"{num_orders} tilausta merkittiin maksetuksi.")
+
+
+confirm_payment_of_selected_orders.short_description = "Merkitse valitut tilaukset maksetuiksi"
+
+
 class OrderAdmin(admin.ModelAdmin):
     model = Order
+    actions = [confirm_payment_of_selected_orders]
     inlines = [
         OrderProductInline,
         #        CustomerInline
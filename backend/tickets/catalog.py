@@ -0,0 +1,115 @@
+"""
+Cached product catalog of the public ticket shop.
+
+The products of an event, along with their availability as of the snapshot, are kept in the Django cache
+for a short while so that customers merely browsing the shop do not query products, limit groups and
+sales counters on every page view. The snapshot is dropped when a product or limit group of the event
+changes or an order is confirmed, cancelled or reinstated.
+
+Availability in the snapshot may lag behind by up to CATALOG_CACHE_TIMEOUT_SECONDS. This is fine because
+capacity is checked authoritatively when the order is confirmed (see tickets.reservation).
+"""
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LimitGroup, Product
+from .models.consts import LOW_AVAILABILITY_THRESHOLD
+
+CATALOG_CACHE_TIMEOUT_SECONDS = 30
+
+CATALOG_PRODUCT_FIELDS = [
+    "id",
+    "event_id",
+    "name",
+    "override_electronic_ticket_title",
+    "description",
+    "mail_description",
+    "price_cents",
+    "requires_accommodation_information",
+    "electronic_ticket",
+    "electronic_tickets_per_product",
+    "available",
+    "ordering",
+    "code",
+]
+
+
+def get_cache_key(event_id: int) -> str:
+    return f"tickets.catalog:{event_id}"
+
+
+def get_availability(amount_available: int) -> str:
+    if amount_available < 1:
+        return "sold_out"
+    elif amount_available < LOW_AVAILABILITY_THRESHOLD:
+        return "low"
+    else:
+        return "available"
+
+
+def build_catalog(event_id: int) -> list[dict]:
+    products = (
+        Product.objects.filter(event_id=event_id, available=True)
+        .order_by("ordering", "id")
+        .prefetch_related(
+            models.Prefetch("limit_groups", queryset=LimitGroup.objects.select_related("sales_counter")),
+        )
+    )
+
+    return [
+        dict(
+            {field_name: getattr(product, field_name) for field_name in CATALOG_PRODUCT_FIELDS},
+            amount_available=product.amount_available,
+            availability=get_availability(product.amount_available),
+        )
+        for product in products
+    ]
+
+
+def get_catalog(event_id: int) -> list[dict]:
+    cache_key = get_cache_key(event_id)
+    catalog = cache.get(cache_key)
+
+    if catalog is None:
+        catalog = build_catalog(event_id)
+        cache.set(cache_key, catalog, CATALOG_CACHE_TIMEOUT_SECONDS)
+
+    return catalog
+
+
+def get_catalog_products(event, code: str = "") -> list[Product]:
+    """
+    Cached equivalent of Product.get_products_for_event(event, code) for customers. Returns unsaved
+    Product instances that must not be saved; amount_available comes from the snapshot.
+    """
+    products = []
+
+    for product_dict in get_catalog(event.id):
+        if product_dict["code"] != code:
+            continue
+
+        product = Product(**{field_name: product_dict[field_name] for field_name in CATALOG_PRODUCT_FIELDS})
+        product.__dict__["amount_available"] = product_dict["amount_available"]
+        products.append(product)
+
+    return products
+
+
+def invalidate_catalog(event_id: int):
+    transaction.on_commit(lambda: cache.delete(get_cache_key(event_id)))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=LimitGroup)
+@receiver(post_delete, sender=LimitGroup)
+def product_or_limit_group_changed(sender, instance, **kwargs):
+    invalidate_catalog(instance.event_id)
+
+
+@receiver(m2m_changed, sender=Product.limit_groups.through)
+def product_limit_groups_changed(sender, instance, **kwargs):
+    invalidate_catalog(instance.event_id)
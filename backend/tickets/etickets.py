@@ -0,0 +1,128 @@
+"""
+E-ticket PDFs rendered once per order and kept in storage.
+
+Rendering an e-ticket PDF with lippukala's OrderPrinter is CPU heavy, yet the same PDF is needed whenever the
+payment confirmation is (re)sent and whenever an admin looks at the e-tickets of an order. The PDF is stored
+at etickets/<reference number>/<hash>.pdf where the hash covers everything printed on the tickets, so a
+changed code or print setting never serves a stale PDF. Revoking or reinstating the codes of an order also
+deletes its stored PDFs.
+
+`python manage.py tickets_prerender_etickets` renders the PDFs of an event in advance.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger("kompassi")
+
+ETICKETS_DIR = "etickets"
+
+
+def get_etickets_dir(reference_number: str) -> str:
+    return f"{ETICKETS_DIR}/{reference_number}"
+
+
+def get_etickets_pdf_path(order, lippukala_order) -> str:
+    meta = order.event.tickets_event_meta
+    codes = list(lippukala_order.code_set.order_by("id").values_list("code", "literate_code", "product_text", "status"))
+    content = json.dumps(
+        [
+            lippukala_order.address_text,
+            lippukala_order.free_text,
+            meta.print_logo_path,
+            meta.print_logo_size_cm,
+            codes,
+        ],
+        default=str,
+    )
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+    return f"{get_etickets_dir(order.reference_number)}/{content_hash}.pdf"
+
+
+def get_etickets_pdf(order) -> bytes:
+    """
+    Returns the e-ticket PDF of the order from storage, rendering and storing it first if needed.
+    """
+    lippukala_order = order.lippukala_order
+    if lippukala_order is None:
+        return order.render_etickets_pdf(lippukala_order)
+
+    path = get_etickets_pdf_path(order, lippukala_order)
+
+    if default_storage.exists(path):
+        with default_storage.open(path, "rb") as pdf_file:
+            return pdf_file.read()
+
+    pdf = order.render_etickets_pdf(lippukala_order)
+
+    delete_etickets_pdfs(order.reference_number)
+    default_storage.save(path, ContentFile(pdf))
+    logger.debug("Stored e-ticket PDF %s", path)
+
+    return pdf
+
+
+def delete_etickets_pdfs(reference_number: str):
+    """
+    Storage errors are logged instead of raised: this runs after commit, and a PDF left behind is never served
+    as its path no longer matches the codes of the order.
+    """
+    etickets_dir = get_etickets_dir(reference_number)
+
+    try:
+        _, filenames = default_storage.listdir(etickets_dir)
+    except FileNotFoundError:
+        return
+    except Exception:
+        logger.exception("Failed to list stored e-ticket PDFs of order %s", reference_number)
+        return
+
+    for filename in filenames:
+        try:
+            default_storage.delete(f"{etickets_dir}/{filename}")
+        except Exception:
+            logger.exception("Failed to delete stored e-ticket PDF %s/%s", etickets_dir, filename)
+
+
+def invalidate_etickets_pdfs(reference_numbers: list[str]):
+    """
+    Deletes the stored e-ticket PDFs of the given orders once the current transaction commits.
+    """
+
+    def delete():
+        for reference_number in reference_numbers:
+            delete_etickets_pdfs(reference_number)
+
+    transaction.on_commit(delete)
+
+
+def prerender_etickets_pdfs(event) -> int:
+    """
+    Renders and stores the e-ticket PDFs of the paid, non-cancelled orders of the event that do not have
+    an up-to-date PDF in storage yet. Returns the number of orders processed.
+    """
+    from .models import Order
+
+    orders = Order.objects.filter(
+        event=event,
+        payment_date__isnull=False,
+        cancellation_time__isnull=True,
+        order_product_set__count__gt=0,
+        order_product_set__product__electronic_ticket=True,
+    ).distinct()
+
+    num_orders = 0
+    for order in orders.select_related("event", "event__tickets_event_meta").order_by("id").iterator():
+        get_etickets_pdf(order)
+        num_orders += 1
+
+        if num_orders % 100 == 0:
+            logger.info("%s: pre-rendered e-tickets of %d orders", event.slug, num_orders)
+
+    return num_orders
@@ -11,3 +11,16 @@ registry.register(
     name="tickets.accommodation.presence.left",
     message=_("{entry.accommodation_information} left {entry.limit_group.description}"),
 )
+
+registry.register(
+    name="tickets.accommodation.presence.batch",
+    message=_(
+        "{entry.other_fields[num_accommodees]} accommodees marked as {entry.other_fields[state]} "
+        "in {entry.limit_group.description}"
+    ),
+)
+
+registry.register(
+    name="tickets.order.cancelled",
+    message=_("Order #{entry.other_fields[order_id]:06d} was cancelled"),
+)
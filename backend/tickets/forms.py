@@ -84,10 +84,15 @@ class OrderProductForm(forms.ModelForm):
 
     @classmethod
     def get_for_order(cls, request, order, admin=False, code=""):
-        return [
-            cls.get_for_order_and_product(request, order, product, admin=admin)
-            for product in Product.get_products_for_event(order.event, code=code, admin=admin)
-        ]
+        if not admin and order.pk is None and request.method in ("GET", "HEAD"):
+            # customer browsing the shop: render from the cached catalog
+            from .catalog import get_catalog_products
+
+            products = get_catalog_products(order.event, code=code)
+        else:
+            products = Product.get_products_for_event(order.event, code=code, admin=admin)
+
+        return [cls.get_for_order_and_product(request, order, product, admin=admin) for product in products]
 
     @classmethod
     def get_for_order_and_product(cls, request, order, product, admin=False):
@@ -1,13 +1,15 @@
+import time
 from functools import wraps
 
 from django.contrib import messages
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
 from core.utils import get_ip
 
 from .models import Order
+from .waiting_room import QueueToken, WaitingRoom
 
 __all__ = [
     "clear_order",
@@ -18,6 +20,7 @@ __all__ = [
     "set_order",
     "tickets_admin_required",
     "tickets_event_required",
+    "tickets_queue_required",
 ]
 
 
@@ -154,3 +157,50 @@ def tickets_event_required(view_func):
         return view_func(request, event, *args, **kwargs)
 
     return wrapper
+
+
+def tickets_queue_required(view_func):
+    """
+    Sends customers through the waiting room if one is configured for the event (see tickets.waiting_room).
+    Must be applied inside tickets_event_required. Admins and customers who already have an order skip the queue.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, event, *args, **kwargs):
+        meta = event.tickets_event_meta
+        queue_config = meta.queue_config
+
+        if (
+            queue_config is None
+            or ORDER_KEY_TEMPLATE.format(event=event) in request.session
+            or meta.is_user_admin(request.user)
+        ):
+            return view_func(request, event, *args, **kwargs)
+
+        waiting_room = WaitingRoom(event.slug)
+        waiting_room.configure(queue_config)
+
+        token = QueueToken.from_request(request, event.slug)
+        if token is not None and waiting_room.is_shopping(token):
+            return view_func(request, event, *args, **kwargs)
+
+        if token is None or token.admitted_at is not None:
+            # new in line, or admitted earlier but did not finish in time
+            token = waiting_room.join()
+
+        status = waiting_room.get_status(token)
+
+        if status.admitted:
+            token = token._replace(admitted_at=time.time())
+            response = view_func(request, event, *args, **kwargs)
+        else:
+            vars = dict(
+                event=event,
+                status=status,
+            )
+            response = render(request, "tickets_queue_view.pug", vars)
+
+        token.set_cookie(response)
+        return response
+
+    return wrapper
@@ -1,3 +1,7 @@
+import secrets
+
+from django.conf import settings
+
 # https://docs.google.com/spreadsheet/ccc?key=0Annwjrq9JeBldGQ3aEFRakpJeGtISUVpTnpJRl92dUE&usp=drive_web#gid=0
 KEYSPACE = list(
     set(
@@ -41,6 +45,9 @@ siika       pohja
 )
 
 
+GENERATE_CODES_MAX_ATTEMPTS = 10
+
+
 class Queue:
     ONE_QUEUE = "1"
 
@@ -56,3 +63,49 @@ KEYSPACES = {
 
 def select_queue(_):
     return Queue.ONE_QUEUE
+
+
+def generate_code() -> str:
+    """
+    Returns a random code of the length configured for lippukala. Uniqueness is up to the caller.
+    """
+    n_digits = secrets.choice(range(settings.LIPPUKALA_CODE_MIN_N_DIGITS, settings.LIPPUKALA_CODE_MAX_N_DIGITS + 1))
+    return str(secrets.randbelow(10**n_digits)).zfill(n_digits)
+
+
+def generate_codes(codes):
+    """
+    Fills in the code and literate code of unsaved lippukala Codes like Code.save() would, so that the codes
+    can be inserted with bulk_create, which does not call save().
+
+    Code.save() checks each candidate against the database with a query of its own. Here the candidates of
+    the whole batch are checked in one query and only those that collide with an existing code are generated
+    again. The literate code is derived from the code without touching the database.
+    """
+    from lippukala.models import Code
+
+    pending = [code for code in codes if not code.code]
+    taken = {code.code for code in codes if code.code}
+
+    for _attempt in range(GENERATE_CODES_MAX_ATTEMPTS):
+        if not pending:
+            break
+
+        for code in pending:
+            while (candidate := generate_code()) in taken:
+                pass
+
+            code.code = candidate
+            taken.add(candidate)
+
+        collisions = set(Code.objects.filter(code__in=[code.code for code in pending]).values_list("code", flat=True))
+        pending = [code for code in pending if code.code in collisions]
+
+    if pending:
+        raise ValueError("Unable to find unused codes. Is the keyspace exhausted?")
+
+    for code in codes:
+        if not code.literate_code:
+            code.literate_code = code._generate_literate_code()
+
+    return codes
@@ -0,0 +1,54 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core.models import Event
+
+from ...models import Order
+from ...models.consts import UNPAID_CANCEL_HOURS
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Cancel orders that have been confirmed but not paid for the given number of hours"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "event_slugs",
+            nargs="+",
+            metavar="EVENT_SLUG",
+        )
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=UNPAID_CANCEL_HOURS,
+        )
+        parser.add_argument(
+            "--send-email",
+            action="store_true",
+            default=False,
+            help="Send cancellation notices to customers",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report how many orders would be cancelled",
+        )
+
+    def handle(self, *args, **options):
+        for event_slug in options["event_slugs"]:
+            event = Event.objects.get(slug=event_slug)
+
+            num_orders = Order.cancel_unpaid_orders(
+                event=event,
+                hours=options["hours"],
+                send_email=options["send_email"],
+                dry_run=options["dry_run"],
+            )
+
+            if options["dry_run"]:
+                logger.info("%s: would cancel %d unpaid orders", event_slug, num_orders)
+            else:
+                logger.info("%s: cancelled %d unpaid orders", event_slug, num_orders)
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...scanning import load_code_index
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Load the valid electronic ticket codes of events into the scanning index ahead of the doors opening"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "event_slugs",
+            nargs="+",
+            metavar="EVENT_SLUG",
+        )
+
+    def handle(self, *args, **options):
+        for event_slug in options["event_slugs"]:
+            load_code_index(event_slug)
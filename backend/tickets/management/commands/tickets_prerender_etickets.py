@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core.models import Event
+
+from ...etickets import prerender_etickets_pdfs
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Render and store the e-ticket PDFs of paid orders in advance, eg. the day before the event"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "event_slugs",
+            nargs="+",
+            metavar="EVENT_SLUG",
+        )
+
+    def handle(self, *args, **options):
+        for event_slug in options["event_slugs"]:
+            event = Event.objects.get(slug=event_slug)
+            num_orders = prerender_etickets_pdfs(event)
+            logger.info("%s: pre-rendered e-tickets of %d orders", event_slug, num_orders)
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core.models import Event
+
+from ...models.sales_counter import reconcile_sales_counters
+
+logger = logging.getLogger("kompassi")
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized ticket sales counters from order products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "event_slugs",
+            nargs="*",
+            metavar="EVENT_SLUG",
+            help="Only reconcile these events (default: all events)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report counters that are off",
+        )
+
+    def handle(self, *args, **options):
+        if options["event_slugs"]:
+            events = [Event.objects.get(slug=event_slug) for event_slug in options["event_slugs"]]
+        else:
+            events = [None]
+
+        for event in events:
+            for mismatch in reconcile_sales_counters(event=event, dry_run=options["dry_run"]):
+                logger.warning("Sales counter mismatch: %s", mismatch)
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ACTIVE_ORDER = "o.confirm_time IS NOT NULL AND o.cancellation_time IS NULL"
+
+POPULATE_PRODUCT_SALES_COUNTERS = f"""
+INSERT INTO tickets_productsalescounter (product_id, sold)
+SELECT p.id, COALESCE(SUM(op.count) FILTER (WHERE {ACTIVE_ORDER}), 0)
+FROM tickets_product p
+LEFT JOIN tickets_orderproduct op ON op.product_id = p.id
+LEFT JOIN tickets_order o ON o.id = op.order_id
+GROUP BY p.id
+"""
+
+POPULATE_LIMIT_GROUP_SALES_COUNTERS = f"""
+INSERT INTO tickets_limitgroupsalescounter (limit_group_id, sold)
+SELECT lg.id, COALESCE(SUM(op.count) FILTER (WHERE {ACTIVE_ORDER}), 0)
+FROM tickets_limitgroup lg
+LEFT JOIN tickets_product_limit_groups plg ON plg.limitgroup_id = lg.id
+LEFT JOIN tickets_orderproduct op ON op.product_id = plg.product_id
+LEFT JOIN tickets_order o ON o.id = op.order_id
+GROUP BY lg.id
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tickets", "0038_autumn_cleaning"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LimitGroupSalesCounter",
+            fields=[
+                (
+                    "limit_group",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales_counter",
+                        serialize=False,
+                        to="tickets.limitgroup",
+                    ),
+                ),
+                ("sold", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "limit group sales counter",
+                "verbose_name_plural": "limit group sales counters",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSalesCounter",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="sales_counter",
+                        serialize=False,
+                        to="tickets.product",
+                    ),
+                ),
+                ("sold", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "product sales counter",
+                "verbose_name_plural": "product sales counters",
+            },
+        ),
+        migrations.RunSQL(POPULATE_PRODUCT_SALES_COUNTERS, migrations.RunSQL.noop, elidable=True),
+        migrations.RunSQL(POPULATE_LIMIT_GROUP_SALES_COUNTERS, migrations.RunSQL.noop, elidable=True),
+    ]
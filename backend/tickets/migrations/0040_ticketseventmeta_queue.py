@@ -0,0 +1,31 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tickets", "0039_sales_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticketseventmeta",
+            name="queue_admission_rate",
+            field=models.PositiveIntegerField(
+                default=60,
+                help_text="At most this many customers are admitted from the waiting room per minute.",
+                verbose_name="Waiting room: admission rate (per minute)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="ticketseventmeta",
+            name="queue_max_shoppers",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="If set, customers are admitted to the ticket shop through a waiting room so that at most this many customers are shopping at the same time.",
+                null=True,
+                verbose_name="Waiting room: maximum concurrent shoppers",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POPULATE_DAILY_PRODUCT_SALES = """
+INSERT INTO tickets_dailyproductsales (product_id, date, sold)
+SELECT op.product_id, (o.confirm_time AT TIME ZONE 'UTC')::date, SUM(op.count)
+FROM tickets_orderproduct op
+JOIN tickets_order o ON o.id = op.order_id
+WHERE o.confirm_time IS NOT NULL AND o.cancellation_time IS NULL
+GROUP BY op.product_id, (o.confirm_time AT TIME ZONE 'UTC')::date
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tickets", "0040_ticketseventmeta_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("sold", models.IntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="tickets.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "daily product sales",
+                "verbose_name_plural": "daily product sales",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailyproductsales",
+            constraint=models.UniqueConstraint(
+                fields=("product", "date"), name="tickets_dailyproductsales_product_date"
+            ),
+        ),
+        migrations.RunSQL(POPULATE_DAILY_PRODUCT_SALES, migrations.RunSQL.noop, elidable=True),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tickets", "0041_dailyproductsales"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="accommodationinformation",
+            index=models.Index(fields=["last_name", "first_name"], name="tickets_acc_name_idx"),
+        ),
+    ]
@@ -8,4 +8,5 @@ from .product import Product
 
 # non-database models
 from .product_handout import ProductHandout
+from .sales_counter import DailyProductSales, LimitGroupSalesCounter, ProductSalesCounter
 from .tickets_event_meta import TicketsEventMeta
@@ -1,6 +1,6 @@
 import logging
 
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
 from core.csv_export import CsvExportMixin
@@ -99,6 +99,24 @@ class AccommodationInformation(models.Model, CsvExportMixin):
     def row_css_class(self):
         return "success" if self.is_present else ""
 
+    @classmethod
+    def bulk_set_state(cls, limit_group, accommodation_information_ids, state) -> list[int]:
+        """
+        Sets the state of the given accommodees of the limit group in one UPDATE. Accommodees already in
+        that state are left alone. Returns the ids of the accommodees whose state changed.
+        """
+        with transaction.atomic():
+            changed_ids = list(
+                cls.objects.filter(limit_groups=limit_group, id__in=accommodation_information_ids)
+                .exclude(state=state)
+                .select_for_update()
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            cls.objects.filter(id__in=changed_ids).update(state=state)
+
+        return changed_ids
+
     def get_presence_form(self):
         from ..forms import AccommodationPresenceForm
 
@@ -123,3 +141,6 @@ class AccommodationInformation(models.Model, CsvExportMixin):
     class Meta:
         verbose_name = "majoittujan tiedot"
         verbose_name_plural = "majoittujan tiedot"
+        indexes = [
+            models.Index(fields=["last_name", "first_name"], name="tickets_acc_name_idx"),
+        ]
@@ -2,6 +2,8 @@ from django.utils.translation import gettext_lazy as _
 
 LOW_AVAILABILITY_THRESHOLD = 10
 UNPAID_CANCEL_HOURS = 24
+CONFIRMATION_MESSAGE_BATCH_SIZE = 100
+ACCOMMODATION_PAGE_SIZE = 100
 TICKETS_VIEW_VERSION_CHOICES = [
     ("v1", "Version 1 (Django frontend, multiple phases)"),
     ("v1.5", "Version 1.5 (Django frontend, single phase)"),
@@ -2,6 +2,7 @@ import logging
 from functools import cached_property
 from typing import TYPE_CHECKING
 
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -32,15 +33,13 @@ class LimitGroup(models.Model):
 
     @cached_property
     def amount_sold(self):
-        from .order_product import OrderProduct
-
-        amount_sold = OrderProduct.objects.filter(
-            product__limit_groups=self,
-            order__confirm_time__isnull=False,
-            order__cancellation_time__isnull=True,
-        ).aggregate(models.Sum("count"))["count__sum"]
-
-        return amount_sold if amount_sold is not None else 0
+        """
+        Read from the denormalized LimitGroupSalesCounter. Use select_related("sales_counter") when listing.
+        """
+        try:
+            return self.sales_counter.sold  # type: ignore
+        except ObjectDoesNotExist:
+            return 0
 
     def refresh_from_db(self, *args, **kwargs):
         super().refresh_from_db(*args, **kwargs)
@@ -1,13 +1,16 @@
 import logging
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from datetime import time as dtime
+from datetime import timezone as dt_timezone
 from typing import TYPE_CHECKING
 
 from dateutil.tz import tzlocal
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.db import connection, models
+from django.db import connection, models, transaction
+from django.db.models.functions import TruncDate
 from django.template.loader import render_to_string
 from django.utils import timezone, translation
 from django.utils.translation import gettext_lazy as _
@@ -17,7 +20,7 @@ from core.models.event import Event
 from core.utils import url
 
 from ..utils import append_reference_number_checksum, format_date, format_price
-from .consts import LANGUAGE_CHOICES, UNPAID_CANCEL_HOURS
+from .consts import CONFIRMATION_MESSAGE_BATCH_SIZE, LANGUAGE_CHOICES, UNPAID_CANCEL_HOURS
 from .tickets_event_meta import TicketsEventMeta
 
 if TYPE_CHECKING:
@@ -35,6 +38,26 @@ class ArrivalsRow:
 
     QUERY = resource_string(__name__, "queries/arrivals_by_hour.sql").decode()
 
+    @classmethod
+    def backfill_missing_hours(cls, rows: list["ArrivalsRow"]) -> list["ArrivalsRow"]:
+        """
+        Inserts zero rows for hours without arrivals between the first and last arrival so that the report
+        shows the lulls, too. The row of unused codes (hour=None) sorts last and is kept as is.
+        """
+        results = []
+
+        for row in rows:
+            if row.hour is not None and results and results[-1].hour is not None:
+                previous = results[-1]
+                hour = previous.hour + timedelta(hours=1)
+                while hour < row.hour:
+                    results.append(cls(hour, 0, previous.cum_arrivals))
+                    hour += timedelta(hours=1)
+
+            results.append(row)
+
+        return results
+
 
 class Order(models.Model):
     order_product_set: models.QuerySet["OrderProduct"]
@@ -149,7 +172,15 @@ class Order(models.Model):
     def clean_up_order_products(self):
         self.order_product_set.filter(count__lte=0).delete()
 
-    def confirm_order(self):
+    def confirm_order(self, reserve=False):
+        """
+        If reserve is set, raises tickets.reservation.SoldOutError and leaves the order unconfirmed
+        if the order would exceed a limit group. Otherwise the order is confirmed even if it oversells.
+        """
+        from ..catalog import invalidate_catalog
+        from ..reservation import reserve_order
+        from .sales_counter import count_order
+
         assert self.customer is not None
         assert not self.is_confirmed
 
@@ -157,7 +188,20 @@ class Order(models.Model):
 
         self.reference_number = self._make_reference_number()
         self.confirm_time = timezone.now()
-        self.save()
+
+        try:
+            with transaction.atomic():
+                self.save()
+
+                if reserve:
+                    reserve_order(self)
+                else:
+                    count_order(self, 1)
+
+                invalidate_catalog(self.event_id)
+        except Exception:
+            self.confirm_time = None
+            raise
 
     def confirm_payment(self, payment_date=None, send_email=True):
         assert self.is_confirmed and not self.is_paid
@@ -169,32 +213,101 @@ class Order(models.Model):
 
         self.save()
 
+        self.process_paid_orders([self.pk], send_email=send_email)
+
+    @classmethod
+    def bulk_confirm_payment(cls, orders, payment_date=None, send_email=True):
+        """
+        Set-based equivalent of calling confirm_payment() on each of the given orders. Orders that are not
+        confirmed or are already paid or cancelled are skipped.
+
+        Returns the number of orders marked as paid.
+        """
+        if payment_date is None:
+            payment_date = date.today()
+
+        with transaction.atomic():
+            order_ids = list(
+                orders.filter(
+                    confirm_time__isnull=False,
+                    payment_date__isnull=True,
+                    cancellation_time__isnull=True,
+                )
+                .select_for_update()
+                .values_list("id", flat=True)
+            )
+            cls.objects.filter(id__in=order_ids).update(payment_date=payment_date)
+
+            cls.process_paid_orders(order_ids, send_email=send_email)
+
+        logger.info("Marked %d orders as paid", len(order_ids))
+        return len(order_ids)
+
+    @classmethod
+    def process_paid_orders(cls, order_ids, send_email=True):
+        """
+        Creates the electronic ticket codes of newly paid orders and sends them their payment confirmations.
+        As rendering the e-ticket PDFs is slow, this is done in the background after the transaction has been
+        committed if background tasks are available.
+        """
+        if "background_tasks" in settings.INSTALLED_APPS:
+            from ..tasks import orders_process_paid
+
+            for i in range(0, len(order_ids), CONFIRMATION_MESSAGE_BATCH_SIZE):
+                batch = order_ids[i : i + CONFIRMATION_MESSAGE_BATCH_SIZE]
+                transaction.on_commit(lambda batch=batch: orders_process_paid.delay(batch, send_email))  # type: ignore
+        else:
+            cls._process_paid_orders(order_ids, send_email=send_email)
+
+    @classmethod
+    def _process_paid_orders(cls, order_ids, send_email=True):
+        orders = list(
+            cls.objects.filter(pk__in=order_ids).select_related("event", "event__tickets_event_meta", "customer")
+        )
+
         if "lippukala" in settings.INSTALLED_APPS:
-            self.lippukala_create_codes()
+            cls.lippukala_create_codes_bulk(orders)
 
         if send_email:
-            self.send_confirmation_message("payment_confirmation")
+            for order in orders:
+                order._send_confirmation_message("payment_confirmation")
 
     def cancel(self, send_email=True):
+        from ..catalog import invalidate_catalog
+        from .sales_counter import count_order
+
         assert self.is_confirmed
 
         if "lippukala" in settings.INSTALLED_APPS:
             self.lippukala_revoke_codes()
 
+        was_active = self.is_active
         self.cancellation_time = timezone.now()
-        self.save()
+
+        with transaction.atomic():
+            self.save()
+            if was_active:
+                count_order(self, -1)
+                invalidate_catalog(self.event_id)
 
         if send_email:
             self.send_confirmation_message("cancellation_notice")
 
     def uncancel(self, send_email=True):
+        from ..catalog import invalidate_catalog
+        from .sales_counter import count_order
+
         assert self.is_cancelled
 
         if "lippukala" in settings.INSTALLED_APPS:
             self.lippukala_reinstate_codes()
 
         self.cancellation_time = None
-        self.save()
+
+        with transaction.atomic():
+            self.save()
+            count_order(self, 1)
+            invalidate_catalog(self.event_id)
 
         if send_email:
             self.send_confirmation_message("uncancellation_notice")
@@ -266,37 +379,74 @@ class Order(models.Model):
             return ""
 
     def lippukala_create_codes(self):
+        self.lippukala_create_codes_bulk([self])
+
+    @classmethod
+    def lippukala_create_codes_bulk(cls, orders):
+        """
+        Creates lippukala orders and codes for the electronic tickets in the given orders, inserting the codes
+        of all orders in one round trip. Orders that already have a lippukala order are skipped.
+        """
         if "lippukala" not in settings.INSTALLED_APPS:
             raise NotImplementedError("lippukala is not installed")
 
-        if not self.contains_electronic_tickets:
-            return
-
         from lippukala.models import Code
         from lippukala.models import Order as LippukalaOrder
 
-        assert self.customer
+        from ..lippukala_integration import generate_codes
+        from .order_product import OrderProduct
 
-        lippukala_order, created = LippukalaOrder.objects.get_or_create(
-            reference_number=self.reference_number,
-            defaults=dict(
-                event=self.event.slug,
-                address_text=self.customer.name,
-                free_text=self.event.tickets_event_meta.ticket_free_text,
-            ),
+        order_products_by_order_id: dict[int, list[OrderProduct]] = defaultdict(list)
+        for op in OrderProduct.objects.filter(
+            order__in=orders,
+            count__gt=0,
+            product__electronic_ticket=True,
+        ).select_related("product"):
+            order_products_by_order_id[op.order_id].append(op)  # type: ignore
+
+        orders = [order for order in orders if order.id in order_products_by_order_id]
+        if not orders:
+            return
+
+        existing_reference_numbers = set(
+            LippukalaOrder.objects.filter(
+                reference_number__in=[order.reference_number for order in orders],
+            ).values_list("reference_number", flat=True)
         )
+        if existing_reference_numbers:
+            logger.debug("Lippukala orders already exist: %s", existing_reference_numbers)
 
-        if not created:
-            logger.debug("Lippukala order already exists")
+        orders = [order for order in orders if order.reference_number not in existing_reference_numbers]
+        if not orders:
             return
 
-        for op in self.order_product_set.filter(count__gt=0, product__electronic_ticket=True):
-            for _i in range(op.count * op.product.electronic_tickets_per_product):
-                Code.objects.create(
-                    order=lippukala_order,
-                    prefix=self.lippukala_prefix,
-                    product_text=op.product.electronic_ticket_title,
-                )
+        with transaction.atomic():
+            lippukala_orders = LippukalaOrder.objects.bulk_create(
+                [
+                    LippukalaOrder(
+                        reference_number=order.reference_number,
+                        event=order.event.slug,
+                        address_text=order.customer.name,  # type: ignore
+                        free_text=order.event.tickets_event_meta.ticket_free_text,
+                    )
+                    for order in orders
+                ]
+            )
+
+            codes = []
+            for order, lippukala_order in zip(orders, lippukala_orders):
+                prefix = order.lippukala_prefix
+                for op in order_products_by_order_id[order.id]:
+                    for _i in range(op.count * op.product.electronic_tickets_per_product):
+                        codes.append(
+                            Code(
+                                order=lippukala_order,
+                                prefix=prefix,
+                                product_text=op.product.electronic_ticket_title,
+                            )
+                        )
+
+            Code.objects.bulk_create(generate_codes(codes))
 
     def lippukala_revoke_codes(self):
         if "lippukala" not in settings.INSTALLED_APPS:
@@ -307,7 +457,12 @@ class Order(models.Model):
 
         from lippukala.consts import MANUAL_INTERVENTION_REQUIRED, UNUSED
 
+        from ..etickets import invalidate_etickets_pdfs
+        from ..scanning import forget_codes
+
         self.lippukala_order.code_set.filter(status=UNUSED).update(status=MANUAL_INTERVENTION_REQUIRED)  # type: ignore
+        invalidate_etickets_pdfs([self.reference_number])
+        forget_codes([self.reference_number])
 
     def lippukala_reinstate_codes(self):
         if "lippukala" not in settings.INSTALLED_APPS:
@@ -318,7 +473,12 @@ class Order(models.Model):
 
         from lippukala.consts import MANUAL_INTERVENTION_REQUIRED, UNUSED
 
+        from ..etickets import invalidate_etickets_pdfs
+        from ..scanning import forget_codes
+
         self.lippukala_order.code_set.filter(status=MANUAL_INTERVENTION_REQUIRED).update(status=UNUSED)  # type: ignore
+        invalidate_etickets_pdfs([self.reference_number])
+        forget_codes([self.reference_number])
 
     @classmethod
     def lippukala_get_order(cls, lippukala_order):
@@ -337,15 +497,26 @@ class Order(models.Model):
         if "lippukala" not in settings.INSTALLED_APPS:
             raise NotImplementedError("lippukala not installed")
 
+        from ..etickets import get_etickets_pdf
+
+        return get_etickets_pdf(self)
+
+    def render_etickets_pdf(self, lippukala_order=None):
+        if "lippukala" not in settings.INSTALLED_APPS:
+            raise NotImplementedError("lippukala not installed")
+
         from lippukala.printing import OrderPrinter
 
+        if lippukala_order is None:
+            lippukala_order = self.lippukala_order
+
         meta = self.event.tickets_event_meta
 
         printer = OrderPrinter(
             print_logo_path=meta.print_logo_path,
             print_logo_size_cm=meta.print_logo_size_cm,
         )
-        printer.process_order(self.lippukala_order)
+        printer.process_order(lippukala_order)
 
         return printer.finish()
 
@@ -450,14 +621,97 @@ class Order(models.Model):
         )
 
     @classmethod
-    def cancel_unpaid_orders(cls, event, hours=UNPAID_CANCEL_HOURS, send_email=False):
+    def cancel_unpaid_orders(cls, event, hours=UNPAID_CANCEL_HOURS, send_email=False, dry_run=False, request=None):
         orders = cls.get_unpaid_orders_to_cancel(event=event, hours=hours)
-        count = orders.count()
+        return cls.bulk_cancel(orders, send_email=send_email, dry_run=dry_run, request=request)
+
+    @classmethod
+    def bulk_cancel(cls, orders, send_email=False, dry_run=False, request=None):
+        """
+        Set-based equivalent of calling cancel() on each of the given confirmed, non-cancelled orders:
+        one UPDATE for the orders, one for the sales counters of each affected product and limit group,
+        one for lippukala codes, one bulk insert for event log entries and batched emails.
+
+        Returns the number of orders cancelled (or that would be cancelled if dry_run is set).
+        """
+        from event_log.utils import emit_many
+
+        from ..catalog import invalidate_catalog
+        from .order_product import OrderProduct
+        from .sales_counter import increment_counters
+
+        orders = orders.filter(confirm_time__isnull=False, cancellation_time__isnull=True)
+
+        if dry_run:
+            return orders.count()
+
+        with transaction.atomic():
+            order_rows = list(orders.select_for_update().values_list("id", "event_id", "reference_number"))
+            if not order_rows:
+                return 0
+
+            order_ids = [order_id for order_id, _event_id, _reference_number in order_rows]
+            cls.objects.filter(id__in=order_ids).update(cancellation_time=timezone.now())
+
+            product_deltas_by_date: dict[date, dict[int, int]] = defaultdict(dict)
+            for row in (
+                OrderProduct.objects.filter(order_id__in=order_ids, count__gt=0)
+                .values("product_id", sales_date=TruncDate("order__confirm_time", tzinfo=dt_timezone.utc))
+                .annotate(count=models.Sum("count"))
+                .order_by()
+            ):
+                product_deltas_by_date[row["sales_date"]][row["product_id"]] = -row["count"]
+
+            for sales_date, product_deltas in sorted(product_deltas_by_date.items()):
+                increment_counters(product_deltas, sales_date)
 
-        for order in orders:
-            order.cancel(send_email=send_email)
+            if "lippukala" in settings.INSTALLED_APPS:
+                cls.lippukala_revoke_codes_bulk([reference_number for _id, _event_id, reference_number in order_rows])
 
-        return count
+            emit_many(
+                "tickets.order.cancelled",
+                [dict(event_id=event_id, other_fields=dict(order_id=order_id)) for order_id, event_id, _ in order_rows],
+                request=request,
+            )
+
+            for event_id in {event_id for _id, event_id, _reference_number in order_rows}:
+                invalidate_catalog(event_id)
+
+            if send_email:
+                transaction.on_commit(lambda: cls.send_confirmation_messages(order_ids, "cancellation_notice"))
+
+        logger.info("Cancelled %d orders", len(order_ids))
+        return len(order_ids)
+
+    @classmethod
+    def lippukala_revoke_codes_bulk(cls, reference_numbers):
+        if "lippukala" not in settings.INSTALLED_APPS:
+            raise NotImplementedError("lippukala is not installed")
+
+        from lippukala.consts import MANUAL_INTERVENTION_REQUIRED, UNUSED
+        from lippukala.models import Code
+
+        from ..etickets import invalidate_etickets_pdfs
+        from ..scanning import forget_codes
+
+        invalidate_etickets_pdfs(reference_numbers)
+        forget_codes(reference_numbers)
+
+        return Code.objects.filter(
+            order__reference_number__in=reference_numbers,
+            status=UNUSED,
+        ).update(status=MANUAL_INTERVENTION_REQUIRED)
+
+    @classmethod
+    def send_confirmation_messages(cls, order_ids, msgtype):
+        if "background_tasks" in settings.INSTALLED_APPS:
+            from ..tasks import orders_send_confirmation_messages
+
+            for i in range(0, len(order_ids), CONFIRMATION_MESSAGE_BATCH_SIZE):
+                orders_send_confirmation_messages.delay(order_ids[i : i + CONFIRMATION_MESSAGE_BATCH_SIZE], msgtype)  # type: ignore
+        else:
+            for order in cls.objects.filter(pk__in=order_ids).select_related("event", "customer"):
+                order._send_confirmation_message(msgtype)
 
     @staticmethod
     def get_arrivals_by_hour(event: Event | str):
@@ -467,6 +721,4 @@ class Order(models.Model):
             cursor.execute(ArrivalsRow.QUERY, [event_slug])
             results = [ArrivalsRow(*row) for row in cursor.fetchall()]
 
-        # TODO backfill missing hours
-
-        return results
+        return ArrivalsRow.backfill_missing_hours(results)
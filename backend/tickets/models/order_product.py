@@ -32,6 +32,8 @@ class OrderProduct(models.Model, CsvExportMixin):
     def description(self):
         return "%dx %s" % (self.count, self.product.name if self.product is not None else None)
 
+    csv_select_related = ("order", "product")
+
     @classmethod
     def get_csv_fields(cls, event):
         return [
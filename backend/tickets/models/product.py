@@ -2,6 +2,7 @@ import logging
 from functools import cached_property
 from typing import Any
 
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -9,6 +10,7 @@ from core.models import Event
 
 from ..utils import format_price
 from .consts import LOW_AVAILABILITY_THRESHOLD
+from .limit_group import LimitGroup
 
 logger = logging.getLogger("kompassi")
 
@@ -79,14 +81,13 @@ class Product(models.Model):
 
     @property
     def amount_sold(self):
-        from .order_product import OrderProduct
-
-        cnt = OrderProduct.objects.filter(
-            product=self, order__confirm_time__isnull=False, order__cancellation_time__isnull=True
-        ).aggregate(models.Sum("count"))
-
-        sm = cnt["count__sum"]
-        return sm if sm is not None else 0
+        """
+        Read from the denormalized ProductSalesCounter.
+        """
+        try:
+            return self.sales_counter.sold  # type: ignore
+        except ObjectDoesNotExist:
+            return 0
 
     def __str__(self):
         return f"{self.name} ({self.formatted_price})"
@@ -139,4 +140,10 @@ class Product(models.Model):
         criteria: dict[str, Any] = dict(event=event, available=True)
         if not admin:
             criteria.update(code=code)
-        return cls.objects.filter(**criteria).order_by("ordering", "id")
+        return (
+            cls.objects.filter(**criteria)
+            .order_by("ordering", "id")
+            .prefetch_related(
+                models.Prefetch("limit_groups", queryset=LimitGroup.objects.select_related("sales_counter")),
+            )
+        )
@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 
+from django.db import models
 from lippukala.consts import UNUSED, USED
 from lippukala.models import Code
 
@@ -25,20 +26,30 @@ class ProductHandout:
 
     @classmethod
     def get_product_handouts(cls, event: Event):
-        handouts = dict()
+        products = (
+            Product.objects.filter(event=event, electronic_ticket=True)
+            .order_by("ordering", "id")
+            .only("name", "override_electronic_ticket_title")
+        )
 
-        products = Product.objects.filter(event=event, electronic_ticket=True).order_by("ordering", "id")
+        titles = []
         for product in products:
-            codes = Code.objects.filter(
-                order__event=event.slug,
-                product_text=product.electronic_ticket_title,
-            )
+            if product.electronic_ticket_title not in titles:
+                titles.append(product.electronic_ticket_title)
+
+        handouts = {title: cls(title) for title in titles}
 
-            handout = handouts.setdefault(
-                product.electronic_ticket_title,
-                cls(product.electronic_ticket_title),
+        for row in (
+            Code.objects.filter(order__event=event.slug, product_text__in=titles)
+            .values("product_text")
+            .annotate(
+                handed_out_count=models.Count("id", filter=models.Q(status=USED)),
+                not_handed_out_count=models.Count("id", filter=models.Q(status=UNUSED)),
             )
-            handout.handed_out_count += codes.filter(status=USED).count()
-            handout.not_handed_out_count += codes.filter(status=UNUSED).count()
+            .order_by()
+        ):
+            handout = handouts[row["product_text"]]
+            handout.handed_out_count = row["handed_out_count"]
+            handout.not_handed_out_count = row["not_handed_out_count"]
 
         return list(handouts.values())
@@ -0,0 +1,324 @@
+import logging
+from collections import Counter
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+from typing import TYPE_CHECKING, Iterable
+
+from django.db import models, transaction
+from django.db.models.functions import TruncDate
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from .limit_group import LimitGroup
+from .order_product import OrderProduct
+from .product import Product
+
+if TYPE_CHECKING:
+    from .order import Order
+
+
+logger = logging.getLogger("kompassi")
+
+
+class ProductSalesCounter(models.Model):
+    """
+    Denormalized amount of a product in confirmed, non-cancelled orders.
+
+    Kept up to date by Order.confirm_order/cancel/uncancel and by changes to OrderProducts of such orders.
+    `python manage.py tickets_reconcile_sales_counters` recomputes the counters from OrderProducts.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="sales_counter",
+    )
+    sold = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("product sales counter")
+        verbose_name_plural = _("product sales counters")
+
+
+class LimitGroupSalesCounter(models.Model):
+    """
+    Denormalized amount of products in a limit group in confirmed, non-cancelled orders.
+    See ProductSalesCounter.
+    """
+
+    limit_group = models.OneToOneField(
+        LimitGroup,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="sales_counter",
+    )
+    sold = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("limit group sales counter")
+        verbose_name_plural = _("limit group sales counters")
+
+
+class DailyProductSales(models.Model):
+    """
+    Amount of a product in confirmed, non-cancelled orders by the (UTC) date the orders were confirmed.
+    Maintained alongside ProductSalesCounter for the sales by date report.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    date = models.DateField()
+    sold = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("daily product sales")
+        verbose_name_plural = _("daily product sales")
+        constraints = [
+            models.UniqueConstraint(fields=["product", "date"], name="tickets_dailyproductsales_product_date"),
+        ]
+
+
+def get_sales_date(confirm_time: datetime) -> date:
+    return confirm_time.astimezone(dt_timezone.utc).date()
+
+
+def get_limit_group_deltas(product_deltas: dict[int, int]) -> Counter[int]:
+    limit_group_deltas: Counter[int] = Counter()
+
+    for product_id, limit_group_id in Product.limit_groups.through.objects.filter(
+        product_id__in=product_deltas.keys(),
+    ).values_list("product_id", "limitgroup_id"):
+        limit_group_deltas[limit_group_id] += product_deltas[product_id]
+
+    return limit_group_deltas
+
+
+def count_limit_group_links(links: Iterable[tuple[int, int]], sign: int):
+    """
+    Adds (sign=1) or removes (sign=-1) the amounts sold of products to or from the counters of limit groups
+    they were added to or removed from. links are (product id, limit group id) pairs.
+    """
+    links = list(links)
+    if not links:
+        return
+
+    with transaction.atomic():
+        # locking the product counters keeps sales of these products from being counted in between
+        sold_by_product_id = dict(
+            ProductSalesCounter.objects.filter(product_id__in={product_id for product_id, _ in links})
+            .order_by("product_id")
+            .select_for_update()
+            .values_list("product_id", "sold")
+        )
+
+        limit_group_deltas: Counter[int] = Counter()
+        for product_id, limit_group_id in links:
+            limit_group_deltas[limit_group_id] += sign * sold_by_product_id.get(product_id, 0)
+
+        increment_counter_rows(LimitGroupSalesCounter, "limit_group_id", limit_group_deltas)
+
+
+def increment_counters(product_deltas: dict[int, int], sales_date: date | None = None):
+    """
+    Adds the given amounts (product id -> delta) to the counters of the products and their limit groups,
+    and to the daily sales of sales_date if given. Counters are updated in id order so that concurrent
+    orders do not deadlock.
+    """
+    product_deltas = {product_id: delta for product_id, delta in product_deltas.items() if delta}
+    if not product_deltas:
+        return
+
+    limit_group_deltas = get_limit_group_deltas(product_deltas)
+
+    with transaction.atomic():
+        increment_counter_rows(ProductSalesCounter, "product_id", product_deltas)
+        increment_counter_rows(LimitGroupSalesCounter, "limit_group_id", limit_group_deltas)
+
+        if sales_date is not None:
+            increment_daily_sales(sales_date, product_deltas)
+
+
+def create_missing_counter_rows(Counter_: type[models.Model], key: str, deltas: dict[int, int]):
+    """
+    Counters that are missing are created at the first sale. Decrements only touch existing
+    counters so that deleting products along with their orders does not resurrect them.
+    """
+    Counter_.objects.bulk_create(
+        [Counter_(**{key: id}) for id, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+
+
+def increment_counter_rows(Counter_: type[models.Model], key: str, deltas: dict[int, int]):
+    create_missing_counter_rows(Counter_, key, deltas)
+
+    for id in sorted(deltas):
+        if deltas[id]:
+            Counter_.objects.filter(**{key: id}).update(sold=models.F("sold") + deltas[id])
+
+
+def increment_daily_sales(sales_date: date, product_deltas: dict[int, int]):
+    DailyProductSales.objects.bulk_create(
+        [
+            DailyProductSales(product_id=product_id, date=sales_date)
+            for product_id, delta in product_deltas.items()
+            if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+
+    for product_id in sorted(product_deltas):
+        if product_deltas[product_id]:
+            DailyProductSales.objects.filter(product_id=product_id, date=sales_date).update(
+                sold=models.F("sold") + product_deltas[product_id]
+            )
+
+
+def count_order(order: "Order", sign: int):
+    """
+    Adds (sign=1) or removes (sign=-1) the products of the order to or from the sales counters.
+    """
+    product_deltas: Counter[int] = Counter()
+    for product_id, count in order.order_product_set.filter(count__gt=0).values_list("product_id", "count"):
+        product_deltas[product_id] += sign * count
+
+    increment_counters(product_deltas, get_sales_date(order.confirm_time))  # type: ignore
+
+
+def reconcile_sales_counters(event=None, product_ids: Iterable[int] | None = None, dry_run=False) -> list[str]:
+    """
+    Recomputes sales counters from OrderProducts. Returns a description of each counter that was off.
+    """
+    products = Product.objects.all()
+    limit_groups = LimitGroup.objects.all()
+
+    if event is not None:
+        products = products.filter(event=event)
+        limit_groups = limit_groups.filter(event=event)
+
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        # filtering through the same relation as the Sum below would restrict the Sum to these products
+        limit_groups = limit_groups.filter(
+            id__in=LimitGroup.objects.filter(product__id__in=product_ids).values("id"),
+        )
+
+    if not dry_run:
+        rebuild_daily_sales(products)
+
+    active = dict(
+        order_product_set__order__confirm_time__isnull=False,
+        order_product_set__order__cancellation_time__isnull=True,
+    )
+    products = products.annotate(
+        actual_sold=models.Sum("order_product_set__count", filter=models.Q(**active)),
+        counted_sold=models.F("sales_counter__sold"),
+    )
+    limit_groups = limit_groups.annotate(
+        actual_sold=models.Sum(
+            "product__order_product_set__count",
+            filter=models.Q(**{f"product__{key}": value for key, value in active.items()}),
+        ),
+        counted_sold=models.F("sales_counter__sold"),
+    )
+
+    mismatches = []
+
+    with transaction.atomic():
+        for Counter_, key, queryset in [
+            (ProductSalesCounter, "product_id", products),
+            (LimitGroupSalesCounter, "limit_group_id", limit_groups),
+        ]:
+            for id, description, actual_sold, counted_sold in queryset.values_list(
+                "id",
+                "name" if Counter_ is ProductSalesCounter else "description",
+                "actual_sold",
+                "counted_sold",
+            ):
+                # a missing counter reads as zero
+                actual_sold = actual_sold or 0
+                counted_sold = counted_sold or 0
+                if actual_sold == counted_sold:
+                    continue
+
+                mismatches.append(f"{Counter_.__name__} {id} ({description}): {counted_sold} -> {actual_sold}")
+
+                if not dry_run:
+                    Counter_.objects.update_or_create(**{key: id}, defaults=dict(sold=actual_sold))
+
+    return mismatches
+
+
+def rebuild_daily_sales(products: models.QuerySet[Product]):
+    with transaction.atomic():
+        DailyProductSales.objects.filter(product__in=products).delete()
+        DailyProductSales.objects.bulk_create(
+            [
+                DailyProductSales(product_id=row["product_id"], date=row["sales_date"], sold=row["sold"])
+                for row in OrderProduct.objects.filter(
+                    product__in=products,
+                    order__confirm_time__isnull=False,
+                    order__cancellation_time__isnull=True,
+                )
+                .values("product_id", sales_date=TruncDate("order__confirm_time", tzinfo=dt_timezone.utc))
+                .annotate(sold=models.Sum("count"))
+                .order_by()
+            ]
+        )
+
+
+@receiver(pre_save, sender=OrderProduct)
+def order_product_pre_save(sender, instance: OrderProduct, **kwargs):
+    if instance.pk and instance.order.is_active:
+        instance._sales_counter_old_count = (  # type: ignore
+            OrderProduct.objects.filter(pk=instance.pk).values_list("count", flat=True).first() or 0
+        )
+
+
+@receiver(post_save, sender=OrderProduct)
+def order_product_post_save(sender, instance: OrderProduct, created, **kwargs):
+    if instance.order.is_active:
+        old_count = 0 if created else getattr(instance, "_sales_counter_old_count", 0)
+        increment_counters(
+            {instance.product_id: instance.count - old_count},  # type: ignore
+            get_sales_date(instance.order.confirm_time),  # type: ignore
+        )
+
+
+@receiver(post_delete, sender=OrderProduct)
+def order_product_post_delete(sender, instance: OrderProduct, **kwargs):
+    try:
+        order = instance.order
+    except OrderProduct.order.RelatedObjectDoesNotExist:  # type: ignore
+        # the order is already gone
+        return
+
+    if order.is_active:
+        increment_counters(
+            {instance.product_id: -instance.count},  # type: ignore
+            get_sales_date(order.confirm_time),  # type: ignore
+        )
+
+
+@receiver(m2m_changed, sender=Product.limit_groups.through)
+def product_limit_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps limit group counters right when products that have already sold are added to or removed from
+    limit groups, from either side of the relation.
+    """
+    if action in ("pre_remove", "pre_clear"):
+        links = Product.limit_groups.through.objects.filter(
+            **{"limitgroup_id" if reverse else "product_id": instance.pk}
+        )
+        if pk_set is not None:
+            links = links.filter(**{"product_id__in" if reverse else "limitgroup_id__in": pk_set})
+
+        # read before the links are gone
+        instance._sales_counter_removed_links = list(links.values_list("product_id", "limitgroup_id"))
+
+    elif action in ("post_remove", "post_clear"):
+        count_limit_group_links(instance.__dict__.pop("_sales_counter_removed_links", []), -1)
+
+    elif action == "post_add":
+        count_limit_group_links(((pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set), 1)
@@ -151,9 +151,34 @@ class TicketsEventMeta(ContactEmailMixin, EventMetaBase, LocalizedModel):
         verbose_name=_("Tickets view version"),
     )
 
+    queue_max_shoppers = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("Waiting room: maximum concurrent shoppers"),
+        help_text=_(
+            "If set, customers are admitted to the ticket shop through a waiting room so that at most this "
+            "many customers are shopping at the same time."
+        ),
+    )
+
+    queue_admission_rate = models.PositiveIntegerField(
+        default=60,
+        verbose_name=_("Waiting room: admission rate (per minute)"),
+        help_text=_("At most this many customers are admitted from the waiting room per minute."),
+    )
+
     def __str__(self):
         return self.event.name
 
+    @property
+    def queue_config(self):
+        from ..waiting_room import QueueConfig
+
+        if not self.queue_max_shoppers:
+            return None
+
+        return QueueConfig(self.queue_max_shoppers, self.queue_admission_rate)
+
     @property
     def print_logo_size_cm(self):
         return (self.print_logo_width_mm / 10.0, self.print_logo_height_mm / 10.0)
@@ -0,0 +1,110 @@
+"""
+Reservation of ticket capacity for orders being confirmed.
+
+Instead of running the whole checkout in a SERIALIZABLE transaction, each limit group an order touches is
+reserved with a single conditional UPDATE on its LimitGroupSalesCounter row that only succeeds if the
+limit would not be exceeded. Concurrent buyers of the same limit group queue on that row lock for the
+duration of one statement instead of failing with serialization errors at commit. Limit groups are
+reserved in id order so that orders spanning several limit groups do not deadlock; should a transient
+error happen regardless, the reservation is retried with backoff.
+
+Reservations are released when the order is cancelled (see Order.cancel), including the cancellation of
+unpaid orders whose reservation has expired.
+"""
+
+import logging
+import random
+import time
+from collections import Counter
+from datetime import date
+from typing import TYPE_CHECKING
+
+from django.db import OperationalError, connection, transaction
+
+from .models.sales_counter import (
+    LimitGroupSalesCounter,
+    ProductSalesCounter,
+    create_missing_counter_rows,
+    get_limit_group_deltas,
+    get_sales_date,
+    increment_counter_rows,
+    increment_daily_sales,
+)
+
+if TYPE_CHECKING:
+    from .models import Order
+
+
+logger = logging.getLogger("kompassi")
+
+RESERVATION_ATTEMPTS = 5
+RESERVATION_BACKOFF_SECONDS = 0.05
+
+# serialization_failure, deadlock_detected
+TRANSIENT_SQLSTATES = {"40001", "40P01"}
+
+RESERVE_LIMIT_GROUP_SQL = """
+UPDATE tickets_limitgroupsalescounter AS counter
+SET sold = counter.sold + %(amount)s
+FROM tickets_limitgroup AS limit_group
+WHERE counter.limit_group_id = %(limit_group_id)s
+  AND limit_group.id = counter.limit_group_id
+  AND counter.sold + %(amount)s <= limit_group."limit"
+RETURNING counter.sold
+"""
+
+
+class SoldOutError(RuntimeError):
+    def __init__(self, limit_group_id: int):
+        super().__init__(f"Limit group {limit_group_id} does not have enough capacity left")
+        self.limit_group_id = limit_group_id
+
+
+def is_transient(error: OperationalError) -> bool:
+    return getattr(error.__cause__, "sqlstate", None) in TRANSIENT_SQLSTATES
+
+
+def reserve(product_deltas: dict[int, int], sales_date: date | None = None):
+    """
+    Adds the given amounts (product id -> amount) to the sales counters or raises SoldOutError
+    without changing any counter if a limit group would be exceeded.
+    """
+    product_deltas = {product_id: amount for product_id, amount in product_deltas.items() if amount > 0}
+    limit_group_deltas = get_limit_group_deltas(product_deltas)
+
+    for attempt in range(RESERVATION_ATTEMPTS):
+        try:
+            # a savepoint if called within a transaction, so a failed attempt can be retried
+            with transaction.atomic():
+                create_missing_counter_rows(LimitGroupSalesCounter, "limit_group_id", limit_group_deltas)
+
+                with connection.cursor() as cursor:
+                    for limit_group_id in sorted(limit_group_deltas):
+                        cursor.execute(
+                            RESERVE_LIMIT_GROUP_SQL,
+                            dict(limit_group_id=limit_group_id, amount=limit_group_deltas[limit_group_id]),
+                        )
+                        if cursor.fetchone() is None:
+                            raise SoldOutError(limit_group_id)
+
+                increment_counter_rows(ProductSalesCounter, "product_id", product_deltas)
+
+                if sales_date is not None:
+                    increment_daily_sales(sales_date, product_deltas)
+
+            return
+        except OperationalError as e:
+            if not is_transient(e) or attempt == RESERVATION_ATTEMPTS - 1:
+                raise
+
+            delay = RESERVATION_BACKOFF_SECONDS * 2**attempt * (1 + random.random())
+            logger.info("tickets.reservation: transient error (%s), retrying in %.2f s", e, delay)
+            time.sleep(delay)
+
+
+def reserve_order(order: "Order"):
+    product_deltas: Counter[int] = Counter()
+    for product_id, count in order.order_product_set.filter(count__gt=0).values_list("product_id", "count"):
+        product_deltas[product_id] += count
+
+    reserve(product_deltas, get_sales_date(order.confirm_time))  # type: ignore
@@ -0,0 +1,219 @@
+"""
+Ticket scanning at the door without a database round trip per scan.
+
+The valid codes of an event are loaded into the Django cache (Redis in production) as one small entry per
+code, so that looking up a batch of scanned codes is a single get_many. Scanning devices may be offline for
+a while and submit their scans in batches; the scans of a batch are written back to lippukala with one UPDATE.
+
+Whether a code has been used is first decided by an atomic cache.add on a per-code key, so when several doors
+scan the same code only the first one gets further. Postgres has the final say: the codes are locked and only
+those still unused are marked used and reported "ok". A code marked used elsewhere (eg. by the lippukala POS
+view, which does not know about the index) is reported "used".
+
+Scan times without a timezone are taken to be in the current (event) timezone.
+
+Codes not found in the index (eg. orders paid after the index was loaded) are looked up from the database in
+one query per batch and added to the index. Revoking or reinstating codes drops them from the index.
+"""
+
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils.timezone import is_naive, make_aware, now
+
+logger = logging.getLogger("kompassi")
+
+SCANNING_INDEX_TIMEOUT = 24 * 60 * 60
+SCANNING_INDEX_LOAD_BATCH_SIZE = 1000
+SCANNING_MAX_BATCH_SIZE = 500
+
+
+class IndexedCode(NamedTuple):
+    event_slug: str
+    status: int
+    product_text: str
+
+
+class ScanResult(NamedTuple):
+    code: str
+    result: str  # ok, used or invalid
+    product_text: str = ""
+
+    def as_dict(self):
+        return self._asdict()
+
+
+def get_code_key(code: str) -> str:
+    return f"tickets.scanning:code:{code}"
+
+
+def get_used_key(code: str) -> str:
+    return f"tickets.scanning:used:{code}"
+
+
+def get_loaded_key(event_slug: str) -> str:
+    return f"tickets.scanning:loaded:{event_slug}"
+
+
+def get_valid_codes():
+    from lippukala.consts import BEYOND_LOGIC, MANUAL_INTERVENTION_REQUIRED
+    from lippukala.models import Code
+
+    # Kompassi uses the MIR state for cancelled orders (see KompassiPOSView).
+    return Code.objects.exclude(status__in=(MANUAL_INTERVENTION_REQUIRED, BEYOND_LOGIC))
+
+
+def index_codes(rows) -> dict[str, IndexedCode]:
+    """
+    Adds (code, event slug, status, product text) rows to the index.
+    """
+    from lippukala.consts import USED
+
+    indexed = {code: IndexedCode(event_slug, status, product_text) for code, event_slug, status, product_text in rows}
+    cache.set_many({get_code_key(code): tuple(value) for code, value in indexed.items()}, SCANNING_INDEX_TIMEOUT)
+    cache.set_many(
+        {get_used_key(code): True for code, value in indexed.items() if value.status == USED},
+        SCANNING_INDEX_TIMEOUT,
+    )
+
+    return indexed
+
+
+def load_code_index(event_slug: str) -> int:
+    """
+    Loads the valid codes of the event into the index. Returns the number of codes loaded.
+    """
+    codes = get_valid_codes().filter(order__event=event_slug).order_by("id")
+
+    num_codes = 0
+    last_id = 0
+    while True:
+        rows = list(
+            codes.filter(id__gt=last_id).values_list("id", "code", "status", "product_text")[
+                :SCANNING_INDEX_LOAD_BATCH_SIZE
+            ]
+        )
+        if not rows:
+            break
+
+        index_codes((code, event_slug, status, product_text) for _id, code, status, product_text in rows)
+        num_codes += len(rows)
+        last_id = rows[-1][0]
+
+    cache.set(get_loaded_key(event_slug), num_codes, SCANNING_INDEX_TIMEOUT)
+    logger.info("%s: loaded %d codes into the scanning index", event_slug, num_codes)
+
+    return num_codes
+
+
+def ensure_code_index(event_slug: str):
+    if cache.get(get_loaded_key(event_slug)) is None:
+        load_code_index(event_slug)
+
+
+def forget_codes(reference_numbers: list[str]):
+    """
+    Drops the codes of the given orders from the index once the current transaction commits so that their
+    next scan sees their current status.
+    """
+    from lippukala.models import Code
+
+    def forget():
+        codes = list(Code.objects.filter(order__reference_number__in=reference_numbers).values_list("code", flat=True))
+        cache.delete_many([get_code_key(code) for code in codes] + [get_used_key(code) for code in codes])
+
+    transaction.on_commit(forget)
+
+
+def lookup_codes(event_slug: str, codes: list[str]) -> dict[str, IndexedCode]:
+    found = {
+        key.removeprefix(get_code_key("")): IndexedCode(*value)
+        for key, value in cache.get_many([get_code_key(code) for code in codes]).items()
+    }
+
+    missing = [code for code in codes if code not in found]
+    if missing:
+        found.update(
+            index_codes(
+                get_valid_codes().filter(code__in=missing).values_list("code", "order__event", "status", "product_text")
+            )
+        )
+
+    return {code: value for code, value in found.items() if value.event_slug == event_slug}
+
+
+def scan_codes(event_slug: str, scans: list[tuple[str, datetime | None]], station: str = "") -> list[ScanResult]:
+    """
+    Processes a batch of (code, scanned at) scans in the order they were made. Returns one result per scan.
+    """
+    from lippukala.consts import UNUSED, USED
+    from lippukala.models import Code
+
+    ensure_code_index(event_slug)
+
+    t = now()
+    scans = [
+        (code, make_aware(scanned_at) if scanned_at is not None and is_naive(scanned_at) else scanned_at)
+        for code, scanned_at in scans
+    ]
+    scans = sorted(enumerate(scans), key=lambda item: item[1][1] or t)
+    indexed = lookup_codes(event_slug, list({code for _i, (code, _scanned_at) in scans}))
+
+    results: dict[int, ScanResult] = {}
+    used_on_by_code: dict[str, datetime] = {}
+
+    for i, (code, scanned_at) in scans:
+        indexed_code = indexed.get(code)
+
+        if indexed_code is None:
+            results[i] = ScanResult(code, "invalid")
+        elif cache.add(get_used_key(code), True, SCANNING_INDEX_TIMEOUT):
+            results[i] = ScanResult(code, "ok", indexed_code.product_text)
+            used_on_by_code[code] = scanned_at or t
+        else:
+            results[i] = ScanResult(code, "used", indexed_code.product_text)
+
+    if used_on_by_code:
+        try:
+            with transaction.atomic():
+                unused_codes = set(
+                    Code.objects.select_for_update()
+                    .filter(code__in=used_on_by_code.keys(), status=UNUSED)
+                    .values_list("code", flat=True)
+                )
+
+                if unused_codes:
+                    Code.objects.filter(code__in=unused_codes).update(
+                        status=USED,
+                        used_on=models.Case(
+                            *(
+                                models.When(code=code, then=models.Value(used_on_by_code[code]))
+                                for code in unused_codes
+                            ),
+                            output_field=models.DateTimeField(),
+                        ),
+                        used_at=station,
+                    )
+        except Exception:
+            # otherwise these codes would be refused as used without asking the database until the keys expire
+            cache.delete_many([get_used_key(code) for code in used_on_by_code])
+            raise
+
+        # the cache said unused but the database did not
+        for i, result in results.items():
+            if result.result == "ok" and result.code not in unused_codes:
+                results[i] = result._replace(result="used")
+
+        # let the next scan of these ask the database again, eg. in case they are reinstated
+        stale_codes = [code for code in used_on_by_code if code not in unused_codes]
+        cache.delete_many([get_used_key(code) for code in stale_codes] + [get_code_key(code) for code in stale_codes])
+
+        cache.set_many(
+            {get_code_key(code): tuple(indexed[code]._replace(status=USED)) for code in unused_codes},
+            SCANNING_INDEX_TIMEOUT,
+        )
+
+    return [results[i] for i in range(len(results))]
@@ -7,3 +7,18 @@ def order_send_confirmation_message(order_id: int, msgtype: str):
 
     order = Order.objects.get(pk=order_id)
     order._send_confirmation_message(msgtype)
+
+
+@shared_task(ignore_result=True)
+def orders_send_confirmation_messages(order_ids: list[int], msgtype: str):
+    from .models import Order
+
+    for order in Order.objects.filter(pk__in=order_ids).select_related("event", "customer"):
+        order._send_confirmation_message(msgtype)
+
+
+@shared_task(ignore_result=True)
+def orders_process_paid(order_ids: list[int], send_email: bool):
+    from .models import Order
+
+    Order._process_paid_orders(order_ids, send_email=send_email)
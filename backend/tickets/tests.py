@@ -1,6 +1,34 @@
-from django.test import TestCase
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
 
-from .models import LimitGroup, Order, Product
+from django.core.files.storage import InMemoryStorage
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase
+from django.utils.timezone import now
+from lippukala.consts import UNUSED, USED
+from lippukala.models import Code
+
+from event_log.models import Entry
+
+from . import etickets, lippukala_integration
+from .catalog import get_catalog_products, invalidate_catalog
+from .models import (
+    AccommodationInformation,
+    Customer,
+    DailyProductSales,
+    LimitGroup,
+    LimitGroupSalesCounter,
+    Order,
+    Product,
+    ProductSalesCounter,
+)
+from .models.order import ArrivalsRow
+from .models.sales_counter import reconcile_sales_counters
+from .reservation import SoldOutError
+from .scanning import load_code_index, scan_codes
+from .waiting_room import QueueConfig, QueueToken, WaitingRoom
 
 
 class LimitGroupsTestCase(TestCase):
@@ -34,3 +62,384 @@ class LimitGroupsTestCase(TestCase):
         assert not weekend.in_stock
         assert not saturday.in_stock
         assert sunday.in_stock
+
+
+class SalesCounterTestCase(TestCase):
+    def test_sales_counters(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=saturday, count=2)
+        order.order_product_set.create(product=weekend, count=3)
+
+        # not counted until the order is confirmed
+        assert saturday.amount_sold == 0
+
+        order.confirm_order()
+
+        def refresh_and_get_amounts_sold():
+            for instance in (weekend, saturday, limit_saturday, limit_sunday):
+                instance.refresh_from_db()
+            return weekend.amount_sold, saturday.amount_sold, limit_saturday.amount_sold, limit_sunday.amount_sold
+
+        assert refresh_and_get_amounts_sold() == (3, 2, 5, 3)
+
+        order.cancel(send_email=False)
+        assert refresh_and_get_amounts_sold() == (0, 0, 0, 0)
+
+        order.uncancel(send_email=False)
+        assert refresh_and_get_amounts_sold() == (3, 2, 5, 3)
+
+        ProductSalesCounter.objects.filter(product=saturday).update(sold=100)
+        LimitGroupSalesCounter.objects.filter(limit_group=limit_sunday).delete()
+
+        assert len(reconcile_sales_counters(event=order.event, dry_run=True)) == 2
+        assert len(reconcile_sales_counters(event=order.event)) == 2
+        assert refresh_and_get_amounts_sold() == (3, 2, 5, 3)
+        assert reconcile_sales_counters(event=order.event) == []
+
+    def test_limit_group_change(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=saturday, count=2)
+        order.confirm_order()
+
+        limit_new = LimitGroup.objects.create(event=order.event, description="Testing new", limit=5000)
+
+        # products that have already sold count towards the limit groups they are moved into
+        saturday.limit_groups.add(limit_new)
+        limit_new.refresh_from_db()
+        assert limit_new.amount_sold == 2
+
+        limit_saturday.product_set.remove(saturday)
+        limit_saturday.refresh_from_db()
+        assert limit_saturday.amount_sold == 0
+
+        saturday.limit_groups.clear()
+        limit_new.refresh_from_db()
+        assert limit_new.amount_sold == 0
+
+        assert reconcile_sales_counters(event=order.event) == []
+
+
+class ReservationTestCase(TestCase):
+    def test_reserve_order(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=4000)
+        order.confirm_order(reserve=True)
+
+        customer2 = Customer.objects.create(first_name="Other", last_name="Testinen", email="other@example.com")
+        order2 = Order.objects.create(event=order.event, customer=customer2)
+        order2.order_product_set.create(product=saturday, count=1001)
+
+        with self.assertRaises(SoldOutError) as context:
+            order2.confirm_order(reserve=True)
+
+        assert context.exception.limit_group_id == limit_saturday.id
+        assert not order2.is_confirmed
+
+        order2.refresh_from_db()
+        assert not order2.is_confirmed
+
+        limit_saturday.refresh_from_db()
+        limit_sunday.refresh_from_db()
+        assert limit_saturday.amount_sold == 4000
+        assert limit_sunday.amount_sold == 4000
+
+        order2.order_product_set.update(count=1000)
+        order2.confirm_order(reserve=True)
+
+        limit_saturday.refresh_from_db()
+        assert limit_saturday.amount_available == 0
+
+        order.cancel(send_email=False)
+        limit_saturday.refresh_from_db()
+        assert limit_saturday.amount_available == 4000
+
+
+class WaitingRoomTestCase(TestCase):
+    def test_fifo_admission(self):
+        waiting_room = WaitingRoom("dummy-queue-event")
+        waiting_room.configure(QueueConfig(max_shoppers=2, admission_rate=60))
+
+        t = time.time()
+        first, second, third = waiting_room.join(), waiting_room.join(), waiting_room.join()
+
+        # one per second, at most two shopping at a time
+        assert not waiting_room.get_status(first, t).admitted
+        assert waiting_room.get_status(first, t + 1).admitted
+        assert waiting_room.get_status(second, t + 1).position == 1
+        assert waiting_room.get_status(second, t + 2).admitted
+        assert waiting_room.get_status(third, t + 10).position == 1
+
+        # leaving without an admitted token does not make room
+        assert not waiting_room.leave(None)
+        assert not waiting_room.leave(third)
+        assert not waiting_room.get_status(third, t + 11).admitted
+
+        first = first._replace(admitted_at=time.time())
+        assert waiting_room.leave(first)
+        assert not waiting_room.leave(first)
+        assert not waiting_room.is_shopping(first)
+        assert waiting_room.get_status(third, t + 12).admitted
+
+        # tokens survive the round trip through the cookie
+        request = RequestFactory().get("/")
+        request.COOKIES[third.cookie_name] = third.dumps()
+        assert QueueToken.from_request(request, "dummy-queue-event") == third
+        assert QueueToken.from_request(request, "other-event") is None
+
+
+class CatalogTestCase(TestCase):
+    def test_catalog_is_cached_and_invalidated(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+        event = weekend.event
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_catalog(event.id)
+
+        products = get_catalog_products(event)
+        assert [product.id for product in products] == [weekend.id, saturday.id, sunday.id]
+        assert all(product.in_stock for product in products)
+
+        with self.assertNumQueries(0):
+            get_catalog_products(event)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            limit_saturday.limit = 0
+            limit_saturday.save()
+
+        weekend, saturday, sunday = get_catalog_products(event)
+        assert not weekend.in_stock
+        assert not saturday.in_stock
+        assert sunday.in_stock
+
+
+class BulkCancelTestCase(TestCase):
+    def test_cancel_unpaid_orders(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=2)
+        order.confirm_order()
+
+        customer2 = Customer.objects.create(first_name="Other", last_name="Testinen", email="other@example.com")
+        paid_order = Order.objects.create(event=order.event, customer=customer2)
+        paid_order.order_product_set.create(product=saturday, count=1)
+        paid_order.confirm_order()
+        paid_order.confirm_payment(send_email=False)
+
+        assert Order.cancel_unpaid_orders(event=order.event, hours=0, dry_run=True) == 1
+        assert Order.cancel_unpaid_orders(event=order.event, hours=0) == 1
+
+        order.refresh_from_db()
+        paid_order.refresh_from_db()
+        assert order.is_cancelled
+        assert not paid_order.is_cancelled
+
+        limit_saturday.refresh_from_db()
+        limit_sunday.refresh_from_db()
+        assert limit_saturday.amount_sold == 1
+        assert limit_sunday.amount_sold == 0
+
+        assert Entry.objects.filter(entry_type="tickets.order.cancelled", other_fields__order_id=order.id).exists()
+        assert Order.cancel_unpaid_orders(event=order.event, hours=0) == 0
+
+
+class BulkConfirmPaymentTestCase(TestCase):
+    def test_bulk_confirm_payment(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+
+        customer2 = Customer.objects.create(first_name="Other", last_name="Testinen", email="other@example.com")
+        unconfirmed_order = Order.objects.create(event=order.event, customer=customer2)
+
+        orders = Order.objects.filter(id__in=[order.id, unconfirmed_order.id])
+        assert Order.bulk_confirm_payment(orders, send_email=False) == 1
+        assert Order.bulk_confirm_payment(orders, send_email=False) == 0
+
+        order.refresh_from_db()
+        unconfirmed_order.refresh_from_db()
+        assert order.is_paid
+        assert not unconfirmed_order.is_paid
+
+
+class DailyProductSalesTestCase(TestCase):
+    def test_daily_sales(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=2)
+        order.confirm_order()
+
+        def get_daily_sales():
+            return list(DailyProductSales.objects.filter(sold__gt=0).values_list("product_id", "date", "sold"))
+
+        sales_date = order.confirm_time.astimezone(dt_timezone.utc).date()
+        assert get_daily_sales() == [(weekend.id, sales_date, 2)]
+
+        order.order_product_set.create(product=saturday, count=1)
+        assert sorted(get_daily_sales()) == sorted([(weekend.id, sales_date, 2), (saturday.id, sales_date, 1)])
+
+        DailyProductSales.objects.all().delete()
+        reconcile_sales_counters(event=order.event)
+        assert sorted(get_daily_sales()) == sorted([(weekend.id, sales_date, 2), (saturday.id, sales_date, 1)])
+
+        order.cancel(send_email=False)
+        assert get_daily_sales() == []
+
+
+class ArrivalsByHourTestCase(TestCase):
+    def test_backfill_missing_hours(self):
+        t = now().replace(minute=0, second=0, microsecond=0)
+        rows = [ArrivalsRow(t, 2, 2), ArrivalsRow(t + timedelta(hours=3), 1, 3), ArrivalsRow(None, 5, 8)]
+
+        assert ArrivalsRow.backfill_missing_hours(rows) == [
+            ArrivalsRow(t, 2, 2),
+            ArrivalsRow(t + timedelta(hours=1), 0, 2),
+            ArrivalsRow(t + timedelta(hours=2), 0, 2),
+            ArrivalsRow(t + timedelta(hours=3), 1, 3),
+            ArrivalsRow(None, 5, 8),
+        ]
+
+
+class ScanningTestCase(TestCase):
+    def test_scan_codes(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+        order.lippukala_create_codes()
+        (code,) = order.lippukala_order.code_set.values_list("code", flat=True)
+
+        results = scan_codes(order.event.slug, [(code, None), ("nonexistent", None), (code, None)], station="door")
+        assert [result.result for result in results] == ["ok", "invalid", "used"]
+        assert order.lippukala_order.code_set.get().status == USED
+
+    def test_scan_code_used_elsewhere(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+        order.lippukala_create_codes()
+        (code,) = order.lippukala_order.code_set.values_list("code", flat=True)
+        load_code_index(order.event.slug)
+
+        # the lippukala POS view marks codes used without updating the index
+        order.lippukala_order.code_set.update(status=USED)
+
+        # naive scan times are taken to be in the current timezone
+        (result,) = scan_codes(order.event.slug, [(code, datetime(2026, 1, 1, 12, 0))])
+        assert result.result == "used"
+
+        # the cache does not keep refusing the code once it is reinstated
+        order.lippukala_order.code_set.update(status=UNUSED)
+        (result,) = scan_codes(order.event.slug, [(code, None)])
+        assert result.result == "ok"
+
+    def test_scan_codes_database_error(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+        order.lippukala_create_codes()
+        (code,) = order.lippukala_order.code_set.values_list("code", flat=True)
+
+        with mock.patch.object(Code.objects, "select_for_update", side_effect=DatabaseError("Simulated failure")):
+            with self.assertRaises(DatabaseError):
+                scan_codes(order.event.slug, [(code, None)])
+
+        (result,) = scan_codes(order.event.slug, [(code, None)])
+        assert result.result == "ok"
+
+
+class EticketsTestCase(TestCase):
+    def test_etickets_pdf_is_stored(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+        order.lippukala_create_codes()
+
+        storage = InMemoryStorage()
+
+        with (
+            mock.patch.object(etickets, "default_storage", storage),
+            mock.patch.object(Order, "render_etickets_pdf", return_value=b"%PDF-dummy") as render_etickets_pdf,
+        ):
+            assert order.get_etickets_pdf() == b"%PDF-dummy"
+            path = etickets.get_etickets_pdf_path(order, order.lippukala_order)
+            assert storage.exists(path)
+
+            # the second time around the PDF is read from storage
+            assert order.get_etickets_pdf() == b"%PDF-dummy"
+            assert render_etickets_pdf.call_count == 1
+
+            with self.captureOnCommitCallbacks(execute=True):
+                order.lippukala_revoke_codes()
+
+            assert not storage.exists(path)
+
+    def test_storage_errors_are_logged(self):
+        storage = mock.Mock()
+        storage.listdir.side_effect = OSError("Storage unavailable")
+
+        with mock.patch.object(etickets, "default_storage", storage), self.assertLogs("kompassi", "ERROR"):
+            etickets.delete_etickets_pdfs("1234")
+
+
+class GenerateCodesTestCase(TestCase):
+    def test_generate_codes(self):
+        weekend, saturday, sunday = Product.get_or_create_dummies()
+
+        order, unused = Order.get_or_create_dummy()
+        order.order_product_set.create(product=weekend, count=1)
+        order.confirm_order()
+        order.lippukala_create_codes()
+        (existing_code,) = order.lippukala_order.code_set.values_list("code", flat=True)
+
+        # the first candidate is already in the database and the replacement is first drawn from within the batch
+        candidates = iter([existing_code, "1000001", "1000001", "1000002"])
+        codes = [Code(order=order.lippukala_order, prefix=order.lippukala_prefix) for _ in range(2)]
+
+        with mock.patch.object(lippukala_integration, "generate_code", lambda: next(candidates)):
+            with self.assertNumQueries(2):
+                lippukala_integration.generate_codes(codes)
+
+        assert [code.code for code in codes] == ["1000002", "1000001"]
+        assert all(code.literate_code for code in codes)
+
+
+class AccommodationPresenceTestCase(TestCase):
+    def test_bulk_set_state(self):
+        limit_saturday, limit_sunday = LimitGroup.get_or_create_dummies()
+        State = AccommodationInformation.State
+
+        accommodees = [AccommodationInformation.objects.create(first_name=f"Test {i}") for i in range(3)]
+        for accommodee in accommodees[:2]:
+            accommodee.limit_groups.add(limit_saturday)
+
+        ids = [accommodee.id for accommodee in accommodees]
+        assert AccommodationInformation.bulk_set_state(limit_saturday, ids, State.ARRIVED) == ids[:2]
+        assert AccommodationInformation.bulk_set_state(limit_saturday, ids, State.ARRIVED) == []
+        assert (
+            list(
+                AccommodationInformation.objects.filter(state=State.ARRIVED).order_by("id").values_list("id", flat=True)
+            )
+            == ids[:2]
+        )
@@ -4,6 +4,7 @@ from .views import (
     tickets_accommodation_view,
     tickets_address_view,
     tickets_admin_accommodation_create_view,
+    tickets_admin_accommodation_presence_batch_view,
     tickets_admin_accommodation_presence_view,
     tickets_admin_accommodation_view,
     tickets_admin_etickets_view,
@@ -12,10 +13,12 @@ from .views import (
     tickets_admin_orders_view,
     tickets_admin_pos_view,
     tickets_admin_reports_view,
+    tickets_admin_scan_view,
     tickets_admin_stats_by_date_view,
     tickets_admin_stats_view,
     tickets_admin_tools_view,
     tickets_confirm_view,
+    tickets_queue_status_view,
     tickets_router_view,
     tickets_thanks_view,
     tickets_tickets_view,
@@ -27,6 +30,11 @@ urlpatterns = [
         tickets_router_view,
         name="tickets_welcome_view",
     ),
+    re_path(
+        r"events/(?P<event_slug>[a-z0-9-]+)/tickets/queue.json$",
+        tickets_queue_status_view,
+        name="tickets_queue_status_view",
+    ),
     re_path(
         r"events/(?P<event_slug>[a-z0-9-]+)/tickets/products/?$",
         tickets_tickets_view,
@@ -98,6 +106,11 @@ urlpatterns = [
         tickets_admin_accommodation_presence_view,
         name="tickets_admin_accommodation_presence_view",
     ),
+    re_path(
+        r"events/(?P<event_slug>[a-z0-9-]+)/tickets/admin/accommodation/(?P<limit_group_id>\d+)/presence/?$",
+        tickets_admin_accommodation_presence_batch_view,
+        name="tickets_admin_accommodation_presence_batch_view",
+    ),
     re_path(
         r"events/(?P<event_slug>[a-z0-9-]+)/tickets/admin/accommodation/(?P<limit_group_id>\d+)/new/?$",
         tickets_admin_accommodation_create_view,
@@ -118,4 +131,9 @@ urlpatterns = [
         tickets_admin_pos_view,
         name="tickets_admin_pos_view",
     ),
+    re_path(
+        r"events/(?P<event_slug>[a-z0-9-]+)/tickets/admin/scan.json$",
+        tickets_admin_scan_view,
+        name="tickets_admin_scan_view",
+    ),
 ]
@@ -1,5 +1,6 @@
 from .admin_views import (
     tickets_admin_accommodation_create_view,
+    tickets_admin_accommodation_presence_batch_view,
     tickets_admin_accommodation_presence_view,
     tickets_admin_accommodation_view,
     tickets_admin_etickets_view,
@@ -8,12 +9,13 @@ from .admin_views import (
     tickets_admin_order_view,
     tickets_admin_orders_view,
     tickets_admin_pos_view,
+    tickets_admin_scan_view,
     tickets_admin_stats_by_date_view,
     tickets_admin_stats_view,
     tickets_admin_tools_view,
 )
 from .tickets_admin_reports_view import tickets_admin_reports_view
-from .tickets_v1_5_views import tickets_router_view
+from .tickets_v1_5_views import tickets_queue_status_view, tickets_router_view
 from .tickets_v1_views import (
     ALL_PHASES,
     tickets_accommodation_view,
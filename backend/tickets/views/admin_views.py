@@ -1,13 +1,17 @@
 import datetime
+import json
 from collections import defaultdict
 
 from csp.decorators import csp_exempt
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import EmptyPage, InvalidPage, Paginator
-from django.db.models import Q, Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.dateparse import parse_datetime
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
@@ -15,9 +19,11 @@ from django.views.decorators.http import require_http_methods, require_POST, req
 from lippukala.consts import BEYOND_LOGIC, MANUAL_INTERVENTION_REQUIRED
 from lippukala.views import POSView
 
-from core.csv_export import CSV_EXPORT_FORMATS, EXPORT_FORMATS, csv_response
+from api.utils import BadRequest, api_view
+from core.csv_export import CSV_EXPORT_FORMATS, csv_response, get_model_export_parameters
+from core.models import ExportJob
 from core.sort_and_filter import Filter
-from core.utils import initialize_form, login_redirect, slugify, url
+from core.utils import get_next, initialize_form, login_redirect, slugify, url
 from event_log.utils import emit
 
 from ..forms import (
@@ -31,11 +37,13 @@ from ..forms import (
 from ..helpers import perform_search, tickets_admin_required, tickets_event_required
 from ..models import (
     AccommodationInformation,
+    DailyProductSales,
     LimitGroup,
     Order,
     OrderProduct,
 )
-from ..models.consts import UNPAID_CANCEL_HOURS
+from ..models.consts import ACCOMMODATION_PAGE_SIZE, UNPAID_CANCEL_HOURS
+from ..scanning import SCANNING_MAX_BATCH_SIZE, scan_codes
 from ..utils import format_price
 
 __all__ = [
@@ -49,26 +57,36 @@ __all__ = [
 
 @tickets_admin_required
 def tickets_admin_stats_view(request, vars, event):
+    order_counts = event.order_set.filter(confirm_time__isnull=False).aggregate(
+        num_confirmed_orders=Count("id"),
+        num_cancelled_orders=Count("id", filter=Q(cancellation_time__isnull=False)),
+        num_paid_orders=Count("id", filter=Q(cancellation_time__isnull=True, payment_date__isnull=False)),
+    )
 
-    confirmed_orders = event.order_set.filter(confirm_time__isnull=False)
-    cancelled_orders = confirmed_orders.filter(cancellation_time__isnull=False)
-    paid_orders = confirmed_orders.filter(cancellation_time__isnull=True, payment_date__isnull=False)
+    # one grouped query for all products instead of two aggregates per product
+    sold_by_product = {
+        row["product_id"]: row
+        for row in OrderProduct.objects.filter(
+            order__event=event,
+            order__confirm_time__isnull=False,
+            order__cancellation_time__isnull=True,
+        )
+        .values("product_id")
+        .annotate(
+            count=Sum("count"),
+            paid_count=Sum("count", filter=Q(order__payment_date__isnull=False)),
+        )
+        .order_by()
+    }
 
     data = []
     total_cents = 0
     total_paid_cents = 0
 
     for product in event.product_set.all():
-        soldop_set = product.order_product_set.filter(
-            order__confirm_time__isnull=False, order__cancellation_time__isnull=True
-        )
-        paidop_set = soldop_set.filter(order__payment_date__isnull=False)
-
-        count = soldop_set.aggregate(count=Sum("count"))["count"]
-        count = count if count is not None else 0
-
-        paid_count = paidop_set.aggregate(count=Sum("count"))["count"]
-        paid_count = paid_count if paid_count is not None else 0
+        row = sold_by_product.get(product.id, {})
+        count = row.get("count") or 0
+        paid_count = row.get("paid_count") or 0
 
         cents = count * product.price_cents
         total_cents += cents
@@ -90,11 +108,10 @@ def tickets_admin_stats_view(request, vars, event):
 
     vars.update(
         data=data,
-        num_confirmed_orders=confirmed_orders.count(),
-        num_cancelled_orders=cancelled_orders.count(),
-        num_paid_orders=paid_orders.count(),
+        limit_groups=event.limitgroup_set.select_related("sales_counter").order_by("id"),
         total_price=total_price,
         total_paid_price=total_paid_price,
+        **order_counts,
     )
 
     return render(request, "tickets_admin_stats_view.pug", vars)
@@ -102,19 +119,18 @@ def tickets_admin_stats_view(request, vars, event):
 
 @tickets_admin_required
 def tickets_admin_stats_by_date_view(request, vars, event, raw=False):
-    confirmed_orders = event.order_set.filter(
-        confirm_time__isnull=False,
-        cancellation_time__isnull=True,
-        order_product_set__product__name__contains="lippu",
-    ).distinct()
-    tickets_by_date = defaultdict(int)
-
-    for order in confirmed_orders:
-        date = order.confirm_time.date()
+    # maintained incrementally alongside the sales counters, see tickets.models.sales_counter
+    tickets_by_date = defaultdict(
+        int,
+        DailyProductSales.objects.filter(product__event=event, product__name__contains="lippu", sold__gt=0)
+        .values("date")
+        .annotate(tickets=Sum("sold"))
+        .order_by()
+        .values_list("date", "tickets"),
+    )
 
-        # XXX this deserves an "XXX"
-        for op in order.order_product_set.filter(product__name__contains="lippu").distinct():
-            tickets_by_date[date] += op.count
+    if not tickets_by_date:
+        tickets_by_date[now().date()] = 0
 
     min_date = min(tickets_by_date.keys())
     max_date = max(tickets_by_date.keys())
@@ -284,7 +300,7 @@ def tickets_admin_tools_view(request, vars, event):
 
     if request.method == "POST":
         if "cancel-unpaid" in request.POST:
-            num_cancelled_orders = Order.cancel_unpaid_orders(event=event, hours=unpaid_cancel_hours)
+            num_cancelled_orders = Order.cancel_unpaid_orders(event=event, hours=unpaid_cancel_hours, request=request)
             messages.success(request, f"{num_cancelled_orders} tilausta peruttiin.")
         else:
             messages.error(request, "Tuntematon toiminto.")
@@ -327,7 +343,11 @@ def tickets_admin_accommodation_view(request, event, limit_group_id=None):
                 order_product__order__cancellation_time__isnull=True,
             )
         )
-        accommodees = AccommodationInformation.objects.filter(query).order_by("last_name", "first_name")
+        accommodees = (
+            AccommodationInformation.objects.filter(query)
+            .select_related("order_product__order")
+            .order_by("last_name", "first_name", "id")
+        )
         active_filter = limit_group
     else:
         accommodees = AccommodationInformation.objects.none()
@@ -340,6 +360,16 @@ def tickets_admin_accommodation_view(request, event, limit_group_id=None):
     )
     accommodees = present_filter.filter_queryset(accommodees)
 
+    search_term = request.GET.get("q", "").strip()
+    if search_term:
+        accommodees = accommodees.filter(
+            Q(last_name__icontains=search_term)
+            | Q(first_name__icontains=search_term)
+            | Q(email__icontains=search_term)
+            | Q(phone_number__icontains=search_term)
+            | Q(room_name__icontains=search_term)
+        )
+
     format = request.GET.get("format", "screen")
 
     if format in CSV_EXPORT_FORMATS:
@@ -375,8 +405,25 @@ def tickets_admin_accommodation_view(request, event, limit_group_id=None):
 
         filters = [(limit_group_id == lg.id, lg) for lg in LimitGroup.objects.filter(q).distinct().order_by("id")]
 
+        try:
+            page = int(request.GET.get("page", "1"))
+        except ValueError:
+            page = 1
+
+        paginator = Paginator(accommodees, ACCOMMODATION_PAGE_SIZE)
+
+        try:
+            accommodees = paginator.page(page)
+        except (EmptyPage, InvalidPage):
+            accommodees = paginator.page(paginator.num_pages)
+
+        page_query = request.GET.copy()
+        page_query.pop("page", None)
+
         vars.update(
             accommodees=accommodees,
+            page_query=page_query.urlencode(),
+            search_term=search_term,
             present_filter=present_filter,
             # TODO legacy manual filter
             active_filter=active_filter,
@@ -443,6 +490,59 @@ def tickets_admin_accommodation_presence_view(request, event, limit_group_id, ac
     return redirect("tickets_admin_accommodation_filtered_view", event.slug, limit_group_id)
 
 
+@tickets_event_required
+@require_POST
+def tickets_admin_accommodation_presence_batch_view(request, event, limit_group_id):
+    """
+    Marks the selected accommodees as arrived or left at once. Used at check-in where hundreds of people
+    arrive within minutes.
+    """
+    if not event.tickets_event_meta.is_user_allowed_accommodation_access(request.user):
+        raise PermissionDenied()
+
+    limit_group = get_object_or_404(LimitGroup, event=event, id=limit_group_id)
+    State = AccommodationInformation.State
+
+    action = request.POST.get("action")
+    if action == "arrived":
+        state = State.ARRIVED
+    elif action == "left":
+        state = State.LEFT
+    else:
+        messages.error(request, "Tuntematon tai kielletty toiminto.")
+        return redirect("tickets_admin_accommodation_filtered_view", event.slug, limit_group_id)
+
+    try:
+        accommodation_information_ids = [int(id) for id in request.POST.getlist("accommodation_information_ids")]
+    except ValueError:
+        accommodation_information_ids = []
+
+    with transaction.atomic():
+        changed_ids = AccommodationInformation.bulk_set_state(limit_group, accommodation_information_ids, state)
+
+        if changed_ids:
+            emit(
+                "tickets.accommodation.presence.batch",
+                request=request,
+                event=event,
+                limit_group=limit_group,
+                other_fields=dict(
+                    state=state.value,
+                    num_accommodees=len(changed_ids),
+                    accommodation_information_ids=changed_ids,
+                ),
+            )
+
+    messages.success(request, _("{num_changed} accommodees updated.").format(num_changed=len(changed_ids)))
+
+    default_url = url("tickets_admin_accommodation_filtered_view", event.slug, limit_group_id)
+    next_url = get_next(request, default_url)
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = default_url
+
+    return redirect(next_url)
+
+
 @tickets_event_required
 @require_http_methods(["GET", "HEAD", "POST"])
 def tickets_admin_accommodation_create_view(request, event, limit_group_id):
@@ -514,6 +614,35 @@ def tickets_admin_pos_view(request, event):
     return lippukala_pos_view(request)
 
 
+@tickets_event_required
+@require_POST
+@api_view
+def tickets_admin_scan_view(request, event):
+    """
+    Accepts a batch of scans from a door device as
+    {"station": "...", "scans": [{"code": "...", "scanned_at": "<ISO 8601>"}, ...]}
+    and responds with {"results": [{"code": "...", "result": "ok|used|invalid", "product_text": "..."}, ...]}
+    in the same order. scanned_at is optional and lets offline devices report when the scan happened.
+    """
+    meta = event.tickets_event_meta
+    if not meta or not meta.is_user_allowed_pos_access(request.user):
+        return JsonResponse(dict(error="Forbidden"), status=403)
+
+    try:
+        body = json.loads(request.body)
+        station = str(body.get("station", ""))[:64]
+        scans = [(str(scan["code"]), parse_datetime(scan.get("scanned_at") or "")) for scan in body["scans"]]
+    except (TypeError, KeyError, AttributeError) as e:
+        raise BadRequest() from e
+
+    if len(scans) > SCANNING_MAX_BATCH_SIZE:
+        raise BadRequest(f"At most {SCANNING_MAX_BATCH_SIZE} scans per request")
+
+    results = scan_codes(event.slug, scans, station=station)
+
+    return dict(results=[result.as_dict() for result in results])
+
+
 def tickets_admin_menu_items(request, event):
     stats_url = url("tickets_admin_stats_view", event.slug)
     stats_active = request.path == stats_url
@@ -564,10 +693,13 @@ def tickets_admin_export_view(request, vars, event, format="xlsx"):
 
     timestamp = now().strftime("%Y%m%d%H%M%S")
 
-    return csv_response(
-        event,
-        OrderProduct,
-        ops,
-        dialect=next(fmt for fmt in EXPORT_FORMATS if fmt.extension == format).csv_dialect,
+    job = ExportJob.request(
+        user=request.user,
+        event=event,
+        exporter="core.csv_export.export_model_instances",
+        parameters=get_model_export_parameters(OrderProduct, ops),
         filename=f"{event.slug}_ticketsales_{timestamp}.{format}",
+        format=format,
     )
+
+    return redirect(job.get_absolute_url())
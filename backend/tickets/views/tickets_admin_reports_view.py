@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.shortcuts import render
 
 from payments.models import CheckoutPayment
@@ -5,14 +6,27 @@ from payments.models import CheckoutPayment
 from ..helpers import tickets_admin_required
 from ..models import Order, ProductHandout
 
+# The reports are looked at repeatedly during the event to follow arrivals, so a short delay is acceptable.
+REPORTS_CACHE_TIMEOUT_SECONDS = 60
 
-@tickets_admin_required
-def tickets_admin_reports_view(request, vars, event):
-    vars.update(
+
+def get_reports(event):
+    return dict(
         arrivals_by_hour=Order.get_arrivals_by_hour(event),
         orders_by_payment_status=CheckoutPayment.get_orders_by_payment_status(event),
         payments_by_payment_method=CheckoutPayment.get_payments_by_payment_method(event),
         product_handouts=ProductHandout.get_product_handouts(event),
     )
 
+
+@tickets_admin_required
+def tickets_admin_reports_view(request, vars, event):
+    vars.update(
+        cache.get_or_set(
+            f"tickets.reports:{event.id}",
+            lambda: get_reports(event),
+            REPORTS_CACHE_TIMEOUT_SECONDS,
+        )
+    )
+
     return render(request, "tickets_admin_reports_view.pug", vars)
@@ -5,7 +5,8 @@ https://outline.con2.fi/doc/ticket-sales-1cFCJvcZxc
 
 from csp.decorators import csp_update
 from django.contrib import messages
-from django.db import connection, transaction
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_http_methods
@@ -14,7 +15,9 @@ from core.utils import initialize_form
 from payments.models.checkout_payment import CHECKOUT_PAYMENT_WALL_ORIGIN, CheckoutPayment
 
 from ..forms import CustomerForm, OrderProductForm
-from ..helpers import tickets_event_required
+from ..helpers import tickets_event_required, tickets_queue_required
+from ..reservation import SoldOutError
+from ..waiting_room import QueueToken, WaitingRoom
 from .tickets_v1_views import clear_order, get_order, set_order, tickets_welcome_view
 
 
@@ -28,6 +31,7 @@ def tickets_router_view(request, event, *args, **kwargs):
 
 
 @csp_update(FORM_ACTION=CHECKOUT_PAYMENT_WALL_ORIGIN)
+@tickets_queue_required
 def tickets_view(request, event):
     order = get_order(request, event)
     if order.is_confirmed:
@@ -35,65 +39,73 @@ def tickets_view(request, event):
 
     code = request.GET.get("code", "")
 
-    with transaction.atomic():
-        # TODO handle serialization_failure
-        cursor = connection.cursor()
-        cursor.execute("set transaction isolation level serializable")
+    order_product_forms = OrderProductForm.get_for_order(request, order, code=code)
+    customer_form = initialize_form(CustomerForm, request, order=order)
 
-        order_product_forms = OrderProductForm.get_for_order(request, order, code=code)
-        customer_form = initialize_form(CustomerForm, request, order=order)
+    vars = dict(
+        customer_form=customer_form,
+        event=event,
+        form=order_product_forms,  # for historical reasons this needs to be called "form"
+        order=order,
+    )
 
-        vars = dict(
-            customer_form=customer_form,
-            event=event,
-            form=order_product_forms,  # for historical reasons this needs to be called "form"
-            order=order,
-        )
+    if request.method != "POST":
+        return render(request, "v1.5/tickets_view.pug", vars)
 
-        if request.method != "POST":
-            return render(request, "v1.5/tickets_view.pug", vars)
+    # if we are here, the user is trying to confirm the order
 
-        # if we are here, the user is trying to confirm the order
+    if not customer_form.is_valid() or not all(form.is_valid() for form in order_product_forms):
+        messages.error(request, _("Please check the form."))
+        return render(request, "v1.5/tickets_view.pug", vars)
+
+    order_products = [form.save(commit=False) for form in order_product_forms]
+    if sum(op.count for op in order_products) == 0:
+        messages.error(request, _("Please select at least one product."))
+        return render(request, "v1.5/tickets_view.pug", vars)
+
+    sold_out_message = _(
+        "We're sorry to inform you that a product you have selected "
+        "is not available in the quantity you have requested."
+    )
 
-        if not customer_form.is_valid() or not all(form.is_valid() for form in order_product_forms):
-            messages.error(request, _("Please check the form."))
-            return render(request, "v1.5/tickets_view.pug", vars)
+    # Cheap early exit. Capacity is actually reserved atomically by confirm_order(reserve=True) below.
+    if any(op.product.amount_available < op.count for op in order_products):
+        messages.error(request, sold_out_message)
+        return render(request, "v1.5/tickets_view.pug", vars)
 
-        order_products = [form.save(commit=False) for form in order_product_forms]
-        if sum(op.count for op in order_products) == 0:
-            messages.error(request, _("Please select at least one product."))
-            return render(request, "v1.5/tickets_view.pug", vars)
+    order_was_saved = order.pk is not None
 
-        # TODO as OrderProductForm sets max_value, this should not be necessary
-        if any(op.product.amount_available < op.count for op in order_products):
-            messages.error(
-                request,
-                _(
-                    "We're sorry to inform you that a product you have selected "
-                    "is not available in the quantity you have requested."
-                ),
-            )
-            return render(request, "v1.5/tickets_view.pug", vars)
+    try:
+        with transaction.atomic():
+            order.save()
 
-        order.save()
-        set_order(request, event, order)
+            customer = customer_form.save(commit=False)
+            customer.order = order
+            customer.save()
 
-        customer = customer_form.save(commit=False)
-        customer.order = order
-        customer.save()
+            for op in order_products:
+                op.order = order
+                op.save()
 
-        for op in order_products:
-            op.order = order
-            op.save()
+            order.confirm_order(reserve=True)
 
-        order.confirm_order()
+            payment = CheckoutPayment.from_order(order)
+            payment.save()
+    except SoldOutError:
+        if not order_was_saved:
+            order.pk = None
 
-        payment = CheckoutPayment.from_order(order)
-        payment.save()
+        messages.error(request, sold_out_message)
+        return render(request, "v1.5/tickets_view.pug", vars)
+
+    set_order(request, event, order)
+    WaitingRoom(event.slug).leave(QueueToken.from_request(request, event.slug))
 
     # does an API call to Paytrail so we need to do it after the transaction
     result = payment.perform_create_payment_request(request)
-    return redirect(result["href"])
+    response = redirect(result["href"])
+    QueueToken.delete_cookie(response, event.slug)
+    return response
 
 
 def tickets_confirmed_view(request, event, order):
@@ -147,3 +159,16 @@ def tickets_confirmed_view(request, event, order):
                 messages.error(request, _("Please check the form."))
 
     return render(request, "v1.5/tickets_confirmed_view.pug", vars)
+
+
+@require_http_methods(["GET", "HEAD"])
+def tickets_queue_status_view(request, event_slug):
+    """
+    Polled by customers in the waiting room. Served from the cache alone; must not touch the database.
+    """
+    token = QueueToken.from_request(request, event_slug)
+    if token is None:
+        return JsonResponse(dict(error="not_in_queue"), status=404)
+
+    status = WaitingRoom(event_slug).get_status(token)
+    return JsonResponse(status.as_dict())
@@ -17,8 +17,11 @@ from ..helpers import (
     is_phase_completed,
     set_order,
     tickets_event_required,
+    tickets_queue_required,
 )
 from ..models import OrderProduct
+from ..reservation import SoldOutError
+from ..waiting_room import QueueToken, WaitingRoom
 
 
 def multiform_validate(forms):
@@ -46,6 +49,7 @@ def decorate(view_obj):
     """
 
     @tickets_event_required
+    @tickets_queue_required
     def wrapper(request, event, *args, **kwargs):
         return view_obj(request, event, *args, **kwargs)
 
@@ -99,8 +103,10 @@ class Phase:
             errors = self.validate(request, event, form)
 
             if not errors:
-                self.save(request, event, form)
+                # Saving may still fail, eg. when a product sells out at the last moment.
+                errors = self.save(request, event, form) or []
 
+            if not errors:
                 # The "Next" button should only proceed with valid data.
                 if action == "next":
                     if not self.delay_complete:
@@ -364,7 +370,19 @@ class ConfirmPhase(Phase):
         action = request.POST.get("action", "cancel")
 
         if action == "next" and not order.is_confirmed:
-            order.confirm_order()
+            # the check in validate is only a cheap early exit, capacity is reserved atomically here
+            try:
+                order.confirm_order(reserve=True)
+            except SoldOutError:
+                messages.error(
+                    request,
+                    _("We're sorry to inform you that a product you have selected has just been sold out."),
+                )
+                return ["soldout_confirm"]
+
+            WaitingRoom(event.slug).leave(QueueToken.from_request(request, event.slug))
+
+        return []
 
     def can_go_back(self, request, event):
         order = get_order(request, event)
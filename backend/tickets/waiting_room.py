@@ -0,0 +1,206 @@
+"""
+Virtual waiting room in front of the ticket shop.
+
+When TicketsEventMeta.queue_max_shoppers is set, shoppers without an admission get a signed queue token
+holding their number in line. They are admitted in FIFO order, at most queue_admission_rate per minute, while
+fewer than queue_max_shoppers are shopping. An admitted shopper counts as shopping until they confirm their
+order or QUEUE_SHOPPING_SECONDS pass, after which they have to queue again. Confirming an order uses up the
+queue token, so only shoppers who were actually admitted make room for the next ones, and only once.
+
+All queue state lives in the Django cache so that polling the queue position (tickets_queue_status_view)
+does not touch Postgres. There is no background worker: whoever polls advances the queue, guarded by a
+short-lived lock key so that only one request does so at a time.
+"""
+
+import time
+from typing import NamedTuple
+
+from django.core import signing
+from django.core.cache import cache
+
+QUEUE_SHOPPING_SECONDS = 20 * 60
+QUEUE_STATE_TIMEOUT = 24 * 60 * 60
+QUEUE_LOCK_SECONDS = 2
+QUEUE_TOKEN_SALT = "tickets.waiting_room"
+QUEUE_COOKIE_TEMPLATE = "tickets_queue_{event_slug}"
+
+
+class QueueConfig(NamedTuple):
+    max_shoppers: int
+    admission_rate: int  # per minute
+
+
+class QueueToken(NamedTuple):
+    event_slug: str
+    number: int
+    admitted_at: float | None = None
+
+    @property
+    def cookie_name(self):
+        return QUEUE_COOKIE_TEMPLATE.format(event_slug=self.event_slug)
+
+    def dumps(self) -> str:
+        return signing.dumps(list(self), salt=QUEUE_TOKEN_SALT)
+
+    @classmethod
+    def from_request(cls, request, event_slug: str) -> "QueueToken | None":
+        value = request.COOKIES.get(QUEUE_COOKIE_TEMPLATE.format(event_slug=event_slug))
+        if not value:
+            return None
+
+        try:
+            token = cls(*signing.loads(value, salt=QUEUE_TOKEN_SALT, max_age=QUEUE_STATE_TIMEOUT))
+        except (signing.BadSignature, TypeError):
+            return None
+
+        return token if token.event_slug == event_slug else None
+
+    @staticmethod
+    def delete_cookie(response, event_slug: str):
+        response.delete_cookie(QUEUE_COOKIE_TEMPLATE.format(event_slug=event_slug), samesite="Lax")
+
+    def set_cookie(self, response):
+        response.set_cookie(
+            self.cookie_name,
+            self.dumps(),
+            max_age=QUEUE_STATE_TIMEOUT,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+class QueueStatus(NamedTuple):
+    admitted: bool
+    position: int
+    eta_seconds: int
+
+    def as_dict(self):
+        return self._asdict()
+
+
+class WaitingRoom:
+    def __init__(self, event_slug: str):
+        self.event_slug = event_slug
+
+    def get_cache_key(self, name: str) -> str:
+        return f"tickets.queue:{self.event_slug}:{name}"
+
+    def configure(self, config: QueueConfig):
+        cache.set(self.get_cache_key("config"), tuple(config), QUEUE_STATE_TIMEOUT)
+
+    def get_config(self) -> QueueConfig | None:
+        config = cache.get(self.get_cache_key("config"))
+        return QueueConfig(*config) if config else None
+
+    def incr(self, name: str) -> int:
+        key = self.get_cache_key(name)
+        cache.add(key, 0, QUEUE_STATE_TIMEOUT)
+        return cache.incr(key)
+
+    def join(self) -> QueueToken:
+        return QueueToken(self.event_slug, self.incr("tail"))
+
+    def get_left_key(self, token: QueueToken) -> str:
+        return self.get_cache_key(f"left:{token.number}")
+
+    def leave(self, token: QueueToken | None) -> bool:
+        """
+        Called when a shopper has confirmed their order to make room for the next one. Only a token that was
+        admitted and is still shopping makes room, and only once; the token cannot be used to shop after this.
+        Returns whether room was made.
+        """
+        if token is None or not self.is_shopping(token):
+            # did not take a slot (admins, customers with an order, queue disabled) or the slot has expired
+            return False
+
+        if not cache.add(self.get_left_key(token), True, QUEUE_SHOPPING_SECONDS):
+            # already left
+            return False
+
+        self.incr("departures")
+        return True
+
+    def is_shopping(self, token: QueueToken, t: float | None = None) -> bool:
+        if t is None:
+            t = time.time()
+
+        return (
+            token.admitted_at is not None
+            and t - token.admitted_at < QUEUE_SHOPPING_SECONDS
+            and cache.get(self.get_left_key(token)) is None
+        )
+
+    def get_state(self, t: float) -> dict:
+        return cache.get(self.get_cache_key("state")) or dict(
+            admitted=0,
+            last_admission=t,
+            departures_seen=0,
+            admissions=[],
+            departures=[],
+        )
+
+    def advance(self, t: float | None = None):
+        """
+        Admits as many shoppers as the admission rate and the number of current shoppers allow.
+        """
+        if t is None:
+            t = time.time()
+
+        config = self.get_config()
+        if config is None or config.admission_rate <= 0:
+            return
+
+        lock_key = self.get_cache_key("lock")
+        if not cache.add(lock_key, 1, QUEUE_LOCK_SECONDS):
+            # someone else is advancing the queue right now
+            return
+
+        try:
+            state = self.get_state(t)
+            tail = cache.get(self.get_cache_key("tail"), 0)
+            departures = cache.get(self.get_cache_key("departures"), 0)
+
+            if departures > state["departures_seen"]:
+                state["departures"].append((t, departures - state["departures_seen"]))
+                state["departures_seen"] = departures
+
+            window_start = t - QUEUE_SHOPPING_SECONDS
+            state["admissions"] = [(at, n) for at, n in state["admissions"] if at >= window_start]
+            state["departures"] = [(at, n) for at, n in state["departures"] if at >= window_start]
+            num_shopping = max(0, sum(n for _, n in state["admissions"]) - sum(n for _, n in state["departures"]))
+
+            num_by_rate = int((t - state["last_admission"]) * config.admission_rate / 60)
+            num_to_admit = min(tail - state["admitted"], config.max_shoppers - num_shopping, num_by_rate)
+
+            if num_to_admit > 0:
+                state["admitted"] += num_to_admit
+                state["admissions"].append((t, num_to_admit))
+
+            if num_to_admit < num_by_rate:
+                # do not let unused admissions pile up into a burst
+                state["last_admission"] = t
+            elif num_to_admit > 0:
+                state["last_admission"] += num_to_admit * 60 / config.admission_rate
+
+            cache.set(self.get_cache_key("state"), state, QUEUE_STATE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+
+    def get_status(self, token: QueueToken, t: float | None = None) -> QueueStatus:
+        if t is None:
+            t = time.time()
+
+        self.advance(t)
+
+        config = self.get_config()
+        if config is None:
+            # the queue has been disabled or has expired
+            return QueueStatus(admitted=True, position=0, eta_seconds=0)
+
+        admitted = self.get_state(t)["admitted"]
+        if token.number <= admitted:
+            return QueueStatus(admitted=True, position=0, eta_seconds=0)
+
+        position = token.number - admitted
+        eta_seconds = int(position * 60 / config.admission_rate) if config.admission_rate > 0 else 0
+        return QueueStatus(admitted=False, position=position, eta_seconds=eta_seconds)